@@ -0,0 +1,257 @@
+"""This module contains the shared HTTP client every NHL API and asset request goes through"""
+
+import email.utils
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+import requests as r
+import metrics as mt
+
+# (connect, read) seconds before a request is abandoned
+REQUEST_TIMEOUT: tuple[float, float] = (5, 30)
+# Host -> (requests per second, burst). The API has no published limit; these stay well under where it starts answering 429
+RATE_LIMITS: dict[str, tuple[float, int]] = {
+    "api-web.nhle.com": (20, 20),
+    "assets.nhle.com": (50, 50),
+}
+# Limit of hosts missing from RATE_LIMITS (ex. `stand_in_server.py`). `None` means unthrottled
+DEFAULT_RATE_LIMIT: tuple[float, int] | None = None
+# Attempts after the first before giving up on a request
+MAX_RETRIES: int = 4
+# Backoff before retry n is uniformly random in [0, min(BACKOFF_MAX, BACKOFF_BASE * 2**n)] seconds
+BACKOFF_BASE: float = 0.5
+BACKOFF_MAX: float = 30.0
+RETRY_STATUSES: frozenset[int] = frozenset({429, 500, 502, 503, 504})
+# Consecutive failed requests to a host (each counted once, after its retries) before its circuit opens
+BREAKER_THRESHOLD: int = 5
+# Seconds an open circuit fails requests immediately before letting a trial request through
+BREAKER_COOLDOWN: float = 30.0
+
+
+class CircuitOpen(r.RequestException):
+    """`CircuitOpen` raised instead of requesting a host that has been failing"""
+
+
+class TokenBucket:
+    """Class for spacing requests to `rate` per second on average, allowing bursts of `burst`\n
+    Thread-safe; callers sleep outside the lock until their token is due.
+    """
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Takes a token, waiting for one if the bucket is empty
+
+        Returns:
+            float: seconds spent waiting
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Tokens may go negative: each caller reserves its slot and waits for it
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class CircuitBreaker:
+    """Class for failing fast while a host is down\n
+    After `threshold` consecutive failed requests (each counted once, after its retries) the
+    circuit opens and requests raise `CircuitOpen`. Once `cooldown` has passed a single trial
+    request is let through: success closes the circuit, failure opens it for another `cooldown`.
+    """
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    def check(self, host: str) -> bool:
+        """Raises `CircuitOpen` unless a request to the host may be made now
+
+        Returns:
+            bool: `True` if the request is the trial of a half-open circuit. It must end in
+            `record_success()` or `record_failure()`, or the circuit stays open
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return False
+            remaining = self.opened_at + self.cooldown - time.monotonic()
+            if remaining <= 0 and not self.trial_running:
+                self.trial_running = True
+                return True
+        raise CircuitOpen(f"{host} failed {self.failures} times in a row, retrying in {max(remaining, 0):.0f}s")
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+
+def backoff_delay(retry: int, response: r.Response | None = None) -> float:
+    """Seconds to wait before a retry, honouring the server's `Retry-After` if it sent one
+
+    Args:
+        retry (int): retries made so far
+        response (r.Response | None, optional): the failed response, if there was one. Defaults to None.
+
+    Returns:
+        float: full-jitter exponential backoff, or `Retry-After` capped at BACKOFF_MAX
+    """
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+        # Retry-After may also be an HTTP date
+        try:
+            when = email.utils.parsedate_to_datetime(retry_after)
+            return min(max(when.timestamp() - time.time(), 0.0), BACKOFF_MAX)
+        except (TypeError, ValueError):
+            pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** retry))
+
+
+class ApiClient:
+    """Class for making GET requests with per-host rate limits, timeouts, retries and circuit breakers\n
+    Every thread gets its own `requests.Session` so concurrent workers reuse their connections,
+    while the rate limit and circuit of a host are shared by all of them.
+    """
+
+    def __init__(self, rate_limits: dict[str, tuple[float, int]] | None = None,
+                 default_rate_limit: tuple[float, int] | None = DEFAULT_RATE_LIMIT,
+                 timeout: tuple[float, float] = REQUEST_TIMEOUT, max_retries: int = MAX_RETRIES) -> None:
+        self.rate_limits = dict(RATE_LIMITS if rate_limits is None else rate_limits)
+        self.default_rate_limit = default_rate_limit
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.lock = threading.Lock()
+        self.buckets: dict[str, TokenBucket | None] = {}
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self.local = threading.local()
+
+    def set_rate_limit(self, host: str, rate: float | None, burst: int = 1) -> None:
+        """Changes how fast a host may be requested
+
+        Args:
+            host (str): host name, with the port if not the default (ex. "127.0.0.1:8765")
+            rate (float | None): requests per second, `None` for unthrottled
+            burst (int, optional): requests allowed back to back after an idle period. Defaults to 1.
+        """
+        with self.lock:
+            if rate is None:
+                self.rate_limits.pop(host, None)
+            else:
+                self.rate_limits[host] = (rate, burst)
+            self.buckets.pop(host, None)
+
+    def session(self) -> r.Session:
+        """Returns the calling thread's `requests.Session`"""
+        if not hasattr(self.local, "session"):
+            self.local.session = r.Session()
+        return self.local.session
+
+    def host_state(self, host: str) -> tuple[TokenBucket | None, CircuitBreaker]:
+        """Returns the rate limiter (if the host is throttled) and circuit breaker of a host"""
+        with self.lock:
+            if host not in self.buckets:
+                limit = self.rate_limits.get(host, self.default_rate_limit)
+                self.buckets[host] = TokenBucket(*limit) if limit is not None else None
+            breaker = self.breakers.get(host)
+            if breaker is None:
+                breaker = self.breakers[host] = CircuitBreaker()
+            return self.buckets[host], breaker
+
+    def get(self, url: str, headers: dict[str, str] | None = None) -> r.Response:
+        """Requests a URL, retrying timeouts, connection errors and `RETRY_STATUSES` with backoff\n
+        The host's circuit breaker counts the request once, after its last attempt, so one bad URL
+        can't open the circuit for every other request. Retries are recorded in the `http_retry`
+        metric by endpoint and reason.
+
+        Args:
+            url (str): full URL
+            headers (dict[str, str] | None, optional): request headers. Defaults to None.
+
+        Raises:
+            CircuitOpen: the host has been failing and its cooldown hasn't passed
+            r.RequestException: the last attempt timed out or couldn't connect
+
+        Returns:
+            r.Response: the first response not worth retrying, or the last one once retries run out
+        """
+        host = urlsplit(url).netloc
+        bucket, breaker = self.host_state(host)
+        retry = 0
+        while True:
+            trial = breaker.check(host)
+            # Cleared only when the attempt ends in a success or a retry; anything else, including
+            # an unexpected exception, counts against the host and releases a half-open trial
+            failed = True
+            try:
+                if bucket is not None:
+                    bucket.acquire()
+                try:
+                    response = self.session().get(url, headers=headers, timeout=self.timeout)
+                except (r.ConnectionError, r.Timeout) as e:
+                    # A failed trial reopens the circuit straight away rather than retrying
+                    if trial or retry >= self.max_retries:
+                        raise
+                    reason, delay = type(e).__name__, backoff_delay(retry)
+                else:
+                    if response.status_code not in RETRY_STATUSES:
+                        breaker.record_success()
+                        failed = False
+                        return response
+                    if trial or retry >= self.max_retries:
+                        return response
+                    reason, delay = str(response.status_code), backoff_delay(retry, response)
+                failed = False
+            finally:
+                if failed:
+                    breaker.record_failure()
+            mt.record("http_retry", {"endpoint": mt.endpoint_template(url), "reason": reason}, delay)
+            time.sleep(delay)
+            retry += 1
+
+
+_client: ApiClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> ApiClient:
+    """Returns the shared `ApiClient`, creating it on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ApiClient()
+        return _client
+
+
+def get(url: str, headers: dict[str, str] | None = None) -> r.Response:
+    """Requests a URL through the shared client (see `ApiClient.get()`)"""
+    return get_client().get(url, headers)
+
+
+if __name__ == '__main__':
+    ...
@@ -1,28 +1,75 @@
 import os
+import sys
+import threading
+import time
 import pandas as pd
-import requests as r
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import api_client as ac
 import database as d
+import season_model as sm
+import http_cache as h
+import metrics as mt
+import teams as t
 
 ACTIVE_DB: str = "data/stats_2425.db"
-roster_api: str = "https://api-web.nhle.com/v1/club-stats/WSH/now"
-player_api_head: str = "https://api-web.nhle.com/v1/player/"
+# Override with the `NHL_API_BASE` env var or `set_api_base()` (e.g. for `stand_in_server.py`)
+API_BASE: str = os.environ.get("NHL_API_BASE", "https://api-web.nhle.com/v1")
+roster_api: str = f"{API_BASE}/club-stats/WSH/now"
+player_api_head: str = f"{API_BASE}/player/"
 player_api_tail: str = "/landing"
-game_api_head: str = "https://api-web.nhle.com/v1/score/"
-schedule_api: str = "https://api-web.nhle.com/v1/club-schedule-season/WSH/now"
-landing_api_head: str = "https://api-web.nhle.com/v1/gamecenter/"
+game_api_head: str = f"{API_BASE}/score/"
+schedule_api: str = f"{API_BASE}/club-schedule-season/WSH/now"
+landing_api_head: str = f"{API_BASE}/gamecenter/"
 landing_api_tail: str = "/landing"
-box_score_api_head: str = "https://api-web.nhle.com/v1/gamecenter/"
+box_score_api_head: str = f"{API_BASE}/gamecenter/"
 box_score_api_tail: str = "/boxscore"
+game_story_api_head: str = f"{API_BASE}/wsc/game-story/"
+# Maximum number of requests in flight at once when pulling player data
+MAX_WORKERS: int = 8
+# Serve responses from the on-disk cache in `http_cache.CACHE_DB`
+USE_HTTP_CACHE: bool = True
+# Also write every pulled table to `to_load/*.csv` for debugging (not used for loading)
+STAGE_CSV: bool = False
+LEAGUE_DB: str = "data/league_2425.db"
+# A league update makes about 4,000 requests, so it keeps more of them in flight
+LEAGUE_MAX_WORKERS: int = 16
+# Seconds a league update may run before it stops pulling games; the rest stay pending for the next run
+LEAGUE_TIME_BUDGET: float = 10 * 60
+# Games fetched and saved between time budget checks
+LEAGUE_GAME_BATCH: int = 200
+
+
+class UpdateCancelled(Exception):
+    """`UpdateCancelled` raised inside a pull when its run has been cancelled"""
+
+
+def set_api_base(base: str) -> None:
+    """Points every API endpoint at a different host
+
+    Args:
+        base (str): API root without a trailing slash (ex. "http://127.0.0.1:8765/v1")
+    """
+    global API_BASE, roster_api, player_api_head, game_api_head, schedule_api
+    global landing_api_head, box_score_api_head, game_story_api_head
+    API_BASE = base.rstrip("/")
+    roster_api = f"{API_BASE}/club-stats/WSH/now"
+    player_api_head = f"{API_BASE}/player/"
+    game_api_head = f"{API_BASE}/score/"
+    schedule_api = f"{API_BASE}/club-schedule-season/WSH/now"
+    landing_api_head = f"{API_BASE}/gamecenter/"
+    box_score_api_head = f"{API_BASE}/gamecenter/"
+    game_story_api_head = f"{API_BASE}/wsc/game-story/"
 
 
 def check_folder(func):
     """Wrapper function used to check for the `to_load` folder in the directory\n
-    If it does not exist, this function will create it.
+    If it does not exist and `STAGE_CSV` is enabled, this function will create it.
     """
     def wrap(*args, **kwargs):
         load_folder = "to_load"
         to_load_exists = os.path.exists(load_folder)
-        if not to_load_exists:
+        if STAGE_CSV and not to_load_exists:
             os.mkdir(load_folder)
 
         result = func(*args, **kwargs)
@@ -31,18 +78,224 @@ def check_folder(func):
     return wrap
 
 
+def get_json(url: str) -> dict:
+    """Requests a single URL and returns the decoded JSON body\n
+    Goes through the on-disk response cache unless `USE_HTTP_CACHE` is `False`. Either way the
+    request is made by `api_client`, which rate limits, retries and times it out.
+    Requests are recorded in the `http_request` metric by endpoint.
+
+    Args:
+        url (str): full URL of the API endpoint
+
+    Returns:
+        dict: the decoded JSON payload
+    """
+    if USE_HTTP_CACHE:
+        return h.get_json(url)
+    with mt.timer("http_request", endpoint=mt.endpoint_template(url), source="network") as measurement:
+        response = ac.get(url)
+        response.raise_for_status()
+        measurement.bytes = len(response.content)
+        return response.json()
+
+
+def get_json_many(urls: list[str], max_workers: int = MAX_WORKERS, on_result: Callable[[int, int], None] | None = None) -> list[dict]:
+    """Requests multiple URLs concurrently, with at most `max_workers` requests in flight\n
+    Results are returned in the same order as `urls`
+
+    Args:
+        urls (list[str]): full URLs of the API endpoints
+        max_workers (int, optional): maximum concurrent requests. Defaults to MAX_WORKERS.
+        on_result (Callable[[int, int], None] | None, optional): called with the number of finished requests
+            and the index in `urls` of the one that just completed. Raising from it abandons the requests
+            not yet started. Defaults to None.
+
+    Returns:
+        list[dict]: the decoded JSON payloads
+    """
+    if max_workers <= 1 or len(urls) <= 1:
+        results = []
+        for url in urls:
+            results.append(get_json(url))
+            if on_result is not None:
+                on_result(len(results), len(results) - 1)
+        return results
+
+    results = [None] * len(urls)
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(urls)))
+    try:
+        # Workers carry the caller's context so their requests count toward its metrics run
+        fetch = mt.carry_context(get_json)
+        futures = {pool.submit(fetch, url): i for i, url in enumerate(urls)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            results[futures[future]] = future.result()
+            if on_result is not None:
+                on_result(done, futures[future])
+    finally:
+        pool.shutdown(cancel_futures=True)
+    return results
+
+
+class PayloadStore:
+    """Class for sharing decoded API payloads across the pull functions of a single run\n
+    Each distinct URL is requested at most once; repeat lookups are served from memory.
+    The store also carries the run's progress callback and cancellation flag.
+    """
+
+    def __init__(self, max_workers: int = MAX_WORKERS, progress: Callable[[str, int, int], None] | None = None,
+                 cancel: threading.Event | None = None) -> None:
+        self.max_workers = max_workers
+        self.progress = progress
+        self.cancel = cancel
+        self.payloads: dict[str, dict] = {}
+        self.lock = threading.Lock()
+
+    def check_cancelled(self) -> None:
+        """Raises `UpdateCancelled` if the run has been cancelled"""
+        if self.cancel is not None and self.cancel.is_set():
+            raise UpdateCancelled()
+
+    def report(self, stage: str, done: int, total: int) -> None:
+        """Reports progress of a stage (ex. "players", 12, 26) and stops the run if it was cancelled"""
+        self.check_cancelled()
+        if self.progress is not None:
+            self.progress(stage, done, total)
+
+    def get(self, url: str) -> dict:
+        """Returns the payload for `url`, requesting it only if it hasn't been fetched this run
+
+        Args:
+            url (str): full URL of the API endpoint
+
+        Returns:
+            dict: the decoded JSON payload
+        """
+        if url not in self.payloads:
+            self.check_cancelled()
+            payload = get_json(url)
+            with self.lock:
+                self.payloads.setdefault(url, payload)
+        return self.payloads[url]
+
+    def get_many(self, urls: list[str], stage: str | None = None) -> list[dict]:
+        """Returns the payloads for `urls`, concurrently requesting any that haven't been fetched
+
+        Args:
+            urls (list[str]): full URLs of the API endpoints
+            stage (str | None, optional): stage name to report progress under. Defaults to None.
+
+        Returns:
+            list[dict]: the decoded JSON payloads, in the same order as `urls`
+        """
+        self.check_cancelled()
+        missing = list(dict.fromkeys(
+            url for url in urls if url not in self.payloads))
+        on_result = None
+        if stage is not None:
+            cached = len(urls) - len(missing)
+            def on_result(done, _): return self.report(
+                stage, cached + done, len(urls))
+        fetched = get_json_many(missing, self.max_workers, on_result)
+        with self.lock:
+            for url, payload in zip(missing, fetched):
+                self.payloads.setdefault(url, payload)
+        return [self.payloads[url] for url in urls]
+
+    def get_groups(self, groups: list[list[str]], stage: str) -> None:
+        """Fetches the payloads of several items at once (ex. the three endpoints of each game), reporting per item\n
+        Every missing URL shares one worker pool; an item counts as done once all of its payloads have arrived.
+
+        Args:
+            groups (list[list[str]]): the URLs of each item
+            stage (str): stage name to report progress under, with the number of items as total
+        """
+        self.check_cancelled()
+        missing = list(dict.fromkeys(
+            url for urls in groups for url in urls if url not in self.payloads))
+        # URL -> items still waiting on it
+        waiting: dict[str, list[int]] = {}
+        remaining = []
+        for i, urls in enumerate(groups):
+            pending = {url for url in urls if url not in self.payloads}
+            remaining.append(len(pending))
+            for url in pending:
+                waiting.setdefault(url, []).append(i)
+        done = remaining.count(0)
+        self.report(stage, done, len(groups))
+
+        def on_result(_, index):
+            nonlocal done
+            for i in waiting[missing[index]]:
+                remaining[i] -= 1
+                if remaining[i] == 0:
+                    done += 1
+                    self.report(stage, done, len(groups))
+        fetched = get_json_many(missing, self.max_workers, on_result)
+        with self.lock:
+            for url, payload in zip(missing, fetched):
+                self.payloads.setdefault(url, payload)
+
+    def discard(self, urls: list[str]) -> None:
+        """Drops payloads that are no longer needed, keeping long runs from holding every response"""
+        with self.lock:
+            for url in urls:
+                self.payloads.pop(url, None)
+
+
+def player_landing_url(player_id: str | int) -> str:
+    """Builds the landing page URL for a single player
+
+    Args:
+        player_id (str | int): NHL API ID of the player
+
+    Returns:
+        str: URL of the player's landing page
+    """
+    return f"{player_api_head}{player_id}{player_api_tail}"
+
+
+def club_stats_url(team: str = t.DEFAULT_TEAM) -> str:
+    """URL of a club's current skater and goalie stats (ex. `club_stats_url("WSH") == roster_api`)"""
+    return f"{API_BASE}/club-stats/{team}/now"
+
+
+def club_schedule_url(team: str = t.DEFAULT_TEAM) -> str:
+    """URL of a club's current season schedule (ex. `club_schedule_url("WSH") == schedule_api`)"""
+    return f"{API_BASE}/club-schedule-season/{team}/now"
+
+
+def game_urls(game_id: str | int) -> list[str]:
+    """Builds the URLs of every endpoint `pull_game_by_id()` reads for a single game
+
+    Args:
+        game_id (str | int): NHL API ID of the game
+
+    Returns:
+        list[str]: URLs of the game's landing page, game story and boxscore
+    """
+    return [f"{landing_api_head}{game_id}{landing_api_tail}", f"{game_story_api_head}{game_id}",
+            f"{box_score_api_head}{game_id}{box_score_api_tail}"]
+
+
 @check_folder
-def pull_roster() -> None:
-    """Pulls the current Roster from the NHL API and saves to .csv file
+def pull_roster(store: PayloadStore | None = None, team: str = t.DEFAULT_TEAM) -> pd.DataFrame:
+    """Pulls a club's current Roster from the NHL API
+
+    Args:
+        store (PayloadStore | None, optional): payloads shared with the rest of the run. Defaults to None.
+        team (str, optional): team abbreviation. Defaults to t.DEFAULT_TEAM.
+
+    Returns:
+        pd.DataFrame: one row per player, ready for the `roster` table
     """
-    team = r.get(roster_api).json()
-    skaters = team["skaters"]
-    goalies = team["goalies"]
+    store = store or PayloadStore()
+    club = store.get(club_stats_url(team))
+    players = club["skaters"] + club["goalies"]
     roster_data = []
 
-    for sk in skaters:
-        data = r.get(f"{player_api_head}{sk["playerId"]}{
-                     player_api_tail}").json()
+    landings = store.get_many(
+        [player_landing_url(p["playerId"]) for p in players])
+    for data in landings:
         player_id = data["playerId"]
         name = f"{data["firstName"]["default"]} {data["lastName"]["default"]}"
         jersey = data["sweaterNumber"]
@@ -65,47 +318,32 @@ def pull_roster() -> None:
         roster_data.append((player_id, headshot, name, jersey,
                             s_c, pos, height_str, weight, birth_date, birthplace))
 
-    for go in goalies:
-        data = r.get(f"{player_api_head}{go["playerId"]}{
-                     player_api_tail}").json()
-        player_id = data["playerId"]
-        name = f"{data["firstName"]["default"]} {data["lastName"]["default"]}"
-        headshot = data["headshot"]
-        jersey = data["sweaterNumber"]
-        s_c = data["shootsCatches"]
-        pos = data["position"]
-        height_in_inches = data["heightInInches"]
-        height_in_feet = height_in_inches // 12
-        height_str = f"{height_in_feet}'{
-            height_in_inches-(height_in_feet*12)}\""
-        weight = data["weightInPounds"]
-        birth_date = d.reformat_date(data["birthDate"])
-        if "birthStateProvince" in data:
-            birthplace = f"{data["birthCity"]["default"]}, {
-                data["birthStateProvince"]["default"]}, {data["birthCountry"]}"
-        else:
-            birthplace = f"{data["birthCity"]["default"]}, {
-                data["birthCountry"]}"
-
-        roster_data.append((player_id, headshot, name, jersey,
-                            s_c, pos, height_str, weight, birth_date, birthplace))
-
     roster_cols = ["player_id", "headshot", "name", "jersey", "s/c", "pos", "ht", "wt",
                    "born", "birthplace"]
     roster_df = pd.DataFrame(roster_data, columns=roster_cols)
-    roster_df.to_csv("to_load/roster_from_api.csv", index=False)
+    if STAGE_CSV:
+        roster_df.to_csv("to_load/roster_from_api.csv", index=False)
+    return roster_df
 
 
 @check_folder
-def pull_skaters() -> None:
-    """Pulls all Washington Skaters stats from the NHL API and saves to .csv file
+def pull_skaters(store: PayloadStore | None = None, team: str = t.DEFAULT_TEAM) -> pd.DataFrame:
+    """Pulls all of a club's Skaters stats from the NHL API
+
+    Args:
+        store (PayloadStore | None, optional): payloads shared with the rest of the run. Defaults to None.
+        team (str, optional): team abbreviation. Defaults to t.DEFAULT_TEAM.
+
+    Returns:
+        pd.DataFrame: one row per skater, ready for the `skaters` table
     """
-    team = r.get(roster_api).json()
-    skaters = team["skaters"]
+    store = store or PayloadStore()
+    club = store.get(club_stats_url(team))
+    skaters = club["skaters"]
     skater_data = []
-    for sk in skaters:
-        data = r.get(f"{player_api_head}{sk["playerId"]}{
-                     player_api_tail}").json()
+    landings = store.get_many(
+        [player_landing_url(sk["playerId"]) for sk in skaters])
+    for sk, data in zip(skaters, landings):
         player_id = data["playerId"]
         name = f"{data["firstName"]["default"]} {data["lastName"]["default"]}"
         jersey = data["sweaterNumber"]
@@ -142,21 +380,33 @@ def pull_skaters() -> None:
     skater_cols = ["player_id", "headshot", "name", "jersey", "s/c", "pos", "gp", "g",
                    "a", "p", "+/-", "pim", "p/gp", "evg", "evp", "ppg", "ppp",
                    "shg", "shp", "otg", "gwg", "s", "s%", "toi/gp", "fow%"]
-    skater_df = pd.DataFrame(skater_data, columns=skater_cols)
-    skater_df.to_csv("to_load/skaters_from_api.csv", index=False)
+    # Percentages/rates are formatted for display but stored as REAL, as in existing seasons
+    skater_df = pd.DataFrame(skater_data, columns=skater_cols).astype(
+        {"p/gp": float, "s%": float, "fow%": float})
+    if STAGE_CSV:
+        skater_df.to_csv("to_load/skaters_from_api.csv", index=False)
+    return skater_df
 
 
 @check_folder
-def pull_goalies() -> None:
-    """Pulls all Washington Goalies stats from the NHL API and saves to .csv file
+def pull_goalies(store: PayloadStore | None = None, team: str = t.DEFAULT_TEAM) -> pd.DataFrame:
+    """Pulls all of a club's Goalies stats from the NHL API
+
+    Args:
+        store (PayloadStore | None, optional): payloads shared with the rest of the run. Defaults to None.
+        team (str, optional): team abbreviation. Defaults to t.DEFAULT_TEAM.
+
+    Returns:
+        pd.DataFrame: one row per goalie, ready for the `goalies` table
     """
-    team = r.get(roster_api).json()
-    goalies = team["goalies"]
+    store = store or PayloadStore()
+    club = store.get(club_stats_url(team))
+    goalies = club["goalies"]
 
     goalie_data = []
-    for go in goalies:
-        data = r.get(f"{player_api_head}{go["playerId"]}{
-                     player_api_tail}").json()
+    landings = store.get_many(
+        [player_landing_url(go["playerId"]) for go in goalies])
+    for go, data in zip(goalies, landings):
         player_id = data["playerId"]
         name = f"{data["firstName"]["default"]} {data["lastName"]["default"]}"
         headshot = data["headshot"]
@@ -190,58 +440,253 @@ def pull_goalies() -> None:
     goalie_cols = ["player_id", "headshot", "name", "jersey", "s/c", "gp", "gs", "w",
                    "l", "otl", "sa", "svs", "ga", "sv%", "gaa", "toi", "so", "g", "a",
                    "p", "pim"]
-    goalie_df = pd.DataFrame(goalie_data, columns=goalie_cols)
-    goalie_df.to_csv("to_load/goalies_from_api.csv", index=False)
+    goalie_df = pd.DataFrame(goalie_data, columns=goalie_cols).astype(
+        {"sv%": float, "gaa": float})
+    if STAGE_CSV:
+        goalie_df.to_csv("to_load/goalies_from_api.csv", index=False)
+    return goalie_df
 
 
 @check_folder
-def pull_all_player_data() -> None:
-    """Pulls goalie, skater, and roster data from the NHL API and saves to .csv files
+def pull_all_player_data(store: PayloadStore | None = None, team: str = t.DEFAULT_TEAM) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Pulls a club's goalie, skater, and roster data from the NHL API\n
+    The club stats and every player's landing page are requested once and shared by all three tables.
+
+    Args:
+        store (PayloadStore | None, optional): payloads shared with the rest of the run. Defaults to None.
+        team (str, optional): team abbreviation. Defaults to t.DEFAULT_TEAM.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]: roster, skater and goalie rows
     """
-    pull_roster()
-    pull_skaters()
-    pull_goalies()
+    store = store or PayloadStore()
+    club = store.get(club_stats_url(team))
+    store.get_many([player_landing_url(p["playerId"])
+                   for p in club["skaters"] + club["goalies"]], "players")
+    return pull_roster(store, team), pull_skaters(store, team), pull_goalies(store, team)
 
 
 @check_folder
-def bulk_update(db_path: str) -> None:
+def bulk_update(db_path: str, write_type: str = "upsert", progress: Callable[[str, int, int], None] | None = None,
+                cancel: threading.Event | None = None, print_metrics: bool = False) -> dict[str, dict[str, int]]:
     """Updates all tables using the NHL API except `seasons`\n
-    *Note: This is only for use in the `stats_YYYY.db` dbs*
+    *Note: This is only for use in the `stats_YYYY.db` dbs*\n
+    Setting `cancel` stops the run at the next request or table; nothing is written unless every table saves.
 
     Args:
         db_path (str): path to desired db (ex. 'data/stats_2425.db')
+        write_type (str, optional): "upsert" writes only changed rows, "replace" rebuilds each table. Defaults to "upsert".
+        progress (Callable[[str, int, int], None] | None, optional): called as `progress(stage, done, total)`
+            for the "players", "schedule", "games", "events" and "saving" stages. "games" counts finished
+            games, "events" the games loaded before the event tables existed. Defaults to None.
+        cancel (threading.Event | None, optional): set from another thread to stop the run. Defaults to None.
+        print_metrics (bool, optional): print the run's metrics table when it ends. Defaults to False.
+
+    Raises:
+        UpdateCancelled: if `cancel` was set before the run finished
+
+    Returns:
+        dict[str, dict[str, int]]: per table counts of "inserted", "updated", "unchanged" and "deleted" rows
     """
-    pull_all_player_data()
-    pull_current_schedule()
-    pull_all_completed_games()
-    d.load_file("to_load/skaters_from_api.csv",
-                "skaters", [], "replace", db_path)
-    d.load_file("to_load/goalies_from_api.csv",
-                "goalies", [], "replace", db_path)
-    d.load_file("to_load/roster_from_api.csv", "roster",
-                [], "replace", db_path)
-    d.load_file("to_load/schedule_from_api.csv",
-                "schedule", [], "replace", db_path)
-
-    all_files = os.listdir("to_load")
-    games_to_load = [file for file in all_files if file.startswith("game_")]
-    for game in games_to_load:
-        d.load_file(f"to_load/{game}", "games", [], "append", db_path)
-
-    for file in all_files:
-        os.remove(f"to_load/{file}")
+    # The run's metrics are collected apart from the shared totals and written to `metrics/bulk_update.prom`
+    with mt.registry.collect() as run:
+        try:
+            with mt.timer("bulk_update"):
+                return _bulk_update(db_path, write_type, progress, cancel)
+        finally:
+            summary = mt.dump_run("bulk_update", source=run)
+            if print_metrics:
+                print(summary)
+
+
+def _bulk_update(db_path: str, write_type: str, progress: Callable[[str, int, int], None] | None,
+                 cancel: threading.Event | None) -> dict[str, dict[str, int]]:
+    """Body of `bulk_update()`"""
+    store = PayloadStore(progress=progress, cancel=cancel)
+    roster_df, skater_df, goalie_df = pull_all_player_data(store)
+    store.report("schedule", 0, 1)
+    schedule_df = pull_current_schedule(store)
+    store.report("schedule", 1, 1)
+
+    tables = [(skater_df, "skaters", ["player_id"]), (goalie_df, "goalies", ["player_id"]),
+              (roster_df, "roster", ["player_id"]), (schedule_df, "schedule", ["date"])]
+    # Games are fetched before the transaction opens, so the write lock is only held while saving
+    game_ids, legacy_ids = planned_game_ids(schedule_df, db_path)
+    fetch_game_payloads(store, game_ids, legacy_ids)
+
+    results = {}
+    # All writes land in one transaction: readers see the old or the new season, never a mix
+    with d.transaction(db_path):
+        d.migrate_schema(db_path)
+        for i, (df, table_name, key_columns) in enumerate(tables):
+            store.report("saving", i, len(tables))
+            if write_type == "upsert":
+                results[table_name] = d.sync_dataframe(
+                    df, table_name, key_columns, db_path)
+            else:
+                results[table_name] = {"inserted": d.load_dataframe(df, table_name, "replace", db_path),
+                                       "updated": 0, "unchanged": 0, "deleted": 0}
+        store.report("saving", len(tables), len(tables))
+
+        # Re-read under the lock in case another writer loaded games since the plan; only games
+        # it didn't cover (normally none) are fetched here
+        d.backfill_game_ids(db_path)
+        game_tables = completed_game_tables(d.pending_game_ids(db_path),
+                                            d.legacy_event_game_ids(db_path), store)
+        for table_name, df in game_tables.items():
+            results[table_name] = {"inserted": 0, "updated": 0,
+                                   "unchanged": 0, "deleted": 0}
+            if not df.empty:
+                results[table_name]["inserted"] = d.load_dataframe(
+                    df, table_name, "append", db_path)
+        d.clear_legacy_events(db_path)
+        d.create_lookup_indexes(db_path)
+    sm.invalidate(db_path)
+    return results
+
+
+def league_update(db_path: str = LEAGUE_DB, teams: list[str] = t.LEAGUE_TEAMS, time_budget: float = LEAGUE_TIME_BUDGET,
+                  progress: Callable[[str, int, int], None] | None = None,
+                  cancel: threading.Event | None = None, print_metrics: bool = False) -> dict[str, dict[str, int]]:
+    """Updates a league database with every club's roster, skaters, goalies, schedule and games\n
+    Tables have the same columns as in `stats_YYYY.db` plus a `team` column. A game between two
+    clubs is fetched once and saved as one `games` row per club, with its events saved once.
+    Games still pending when `time_budget` runs out are left for the next run.
+
+    Args:
+        db_path (str, optional): path to the league db. Defaults to LEAGUE_DB.
+        teams (list[str], optional): team abbreviations to pull. Defaults to t.LEAGUE_TEAMS.
+        time_budget (float, optional): seconds after which no more games are pulled. Defaults to LEAGUE_TIME_BUDGET.
+        progress (Callable[[str, int, int], None] | None, optional): called as `progress(stage, done, total)`
+            for the "teams", "players", "saving" and "games" stages. Defaults to None.
+        cancel (threading.Event | None, optional): set from another thread to stop the run. Defaults to None.
+        print_metrics (bool, optional): print the run's metrics table when it ends. Defaults to False.
+
+    Raises:
+        UpdateCancelled: if `cancel` was set before the run finished
+
+    Returns:
+        dict[str, dict[str, int]]: per table counts of "inserted", "updated", "unchanged" and "deleted" rows,
+        and `"games_pending": {"pending": n}` for games left for the next run
+    """
+    with mt.registry.collect() as run:
+        try:
+            with mt.timer("league_update", teams=str(len(teams))):
+                return _league_update(db_path, teams, time_budget, progress, cancel)
+        finally:
+            summary = mt.dump_run("league_update", source=run)
+            if print_metrics:
+                print(summary)
+
+
+def _league_update(db_path: str, teams: list[str], time_budget: float,
+                   progress: Callable[[str, int, int], None] | None,
+                   cancel: threading.Event | None) -> dict[str, dict[str, int]]:
+    """Body of `league_update()`"""
+    deadline = time.monotonic() + time_budget
+    store = PayloadStore(LEAGUE_MAX_WORKERS, progress, cancel)
+    clubs = store.get_many([club_stats_url(team)
+                           for team in teams] + [club_schedule_url(team) for team in teams], "teams")
+    # Players traded during the season are listed by both clubs but their landing page is fetched once
+    store.get_many([player_landing_url(p["playerId"]) for club in clubs[:len(teams)]
+                    for p in club["skaters"] + club["goalies"]], "players")
+
+    frames = {"skaters": [], "goalies": [], "roster": [], "schedule": []}
+    for team in teams:
+        roster_df, skater_df, goalie_df = pull_all_player_data(store, team)
+        frames["roster"].append(roster_df.assign(team=team))
+        frames["skaters"].append(skater_df.assign(team=team))
+        frames["goalies"].append(goalie_df.assign(team=team))
+        frames["schedule"].append(
+            pull_current_schedule(store, team).assign(team=team))
+    key_columns = {"skaters": ["team", "player_id"], "goalies": ["team", "player_id"],
+                   "roster": ["team", "player_id"], "schedule": ["team", "date"]}
+
+    results = {}
+    with d.transaction(db_path):
+        d.migrate_schema(db_path)
+        for i, (table_name, dfs) in enumerate(frames.items()):
+            store.report("saving", i, len(frames))
+            results[table_name] = d.sync_dataframe(pd.concat(dfs, ignore_index=True), table_name,
+                                                   key_columns[table_name], db_path)
+        store.report("saving", len(frames), len(frames))
+
+    # Each game is on both clubs' schedules but pending once
+    game_ids = d.pending_game_ids(db_path)
+    for table_name in ["games", "game_goals", "game_penalties", "game_stars"]:
+        results[table_name] = {"inserted": 0, "updated": 0,
+                               "unchanged": 0, "deleted": 0}
+    done = 0
+    while done < len(game_ids) and time.monotonic() < deadline:
+        batch = game_ids[done:done + LEAGUE_GAME_BATCH]
+        urls = [url for game_id in batch for url in game_urls(game_id)]
+        store.get_many(urls)
+        tables = league_game_tables(batch, store, teams)
+        # A short transaction per batch, so readers and other writers only wait while rows are saved
+        with d.transaction(db_path):
+            # Skip games another writer saved while this batch was being fetched
+            still_pending = set(d.pending_game_ids(db_path))
+            for table_name, df in tables.items():
+                if not df.empty:
+                    results[table_name]["inserted"] += d.load_dataframe(
+                        df[df["game_id"].isin(still_pending)], table_name, "append", db_path)
+        store.discard(urls)
+        done += len(batch)
+        store.report("games", done, len(game_ids))
+    if done < len(game_ids):
+        print(f"ERROR: time budget of {time_budget:.0f}s used up, "
+              f"{len(game_ids) - done} games left for the next run")
+    results["games_pending"] = {"pending": len(game_ids) - done}
+    d.create_lookup_indexes(db_path)
+    sm.invalidate(db_path)
+    return results
+
+
+def league_game_tables(game_ids: list[int], store: PayloadStore, teams: list[str]) -> dict[str, pd.DataFrame]:
+    """Builds the rows of several games from payloads already in the store
+
+    Args:
+        game_ids (list[int]): NHL API IDs of the games
+        store (PayloadStore): payloads of the games
+        teams (list[str]): clubs that get a `games` row when they play
+
+    Returns:
+        dict[str, pd.DataFrame]: rows for the `games` (with a `team` column), `game_goals`, `game_penalties`
+        and `game_stars` tables
+    """
+    tables = {"games": [], "game_goals": [],
+              "game_penalties": [], "game_stars": []}
+    for game_id in game_ids:
+        landing = store.get(game_urls(game_id)[0])
+        for side in ("homeTeam", "awayTeam"):
+            team = landing[side]["abbrev"]
+            if team in teams:
+                tables["games"].append(
+                    pull_game_by_id(game_id, store, team).assign(team=team))
+        for table_name, df in pull_game_events(game_id, store).items():
+            tables[table_name].append(df)
+    return {table_name: pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
+            for table_name, dfs in tables.items()}
 
 
 @check_folder
-def pull_game_by_id(game_id: str | int) -> None:
-    """Pulls a single game by NHL API ID
+def pull_game_by_id(game_id: str | int, store: PayloadStore | None = None, team: str = t.DEFAULT_TEAM) -> pd.DataFrame:
+    """Pulls a single game by NHL API ID, from one club's side
 
     Args:
         game_id (str | int): ID of the desired game
+        store (PayloadStore | None, optional): payloads shared with the rest of the run. Defaults to None.
+        team (str, optional): abbreviation of the club the row describes. Defaults to t.DEFAULT_TEAM.
+
+    Returns:
+        pd.DataFrame: a single row, ready for the `games` table. Goals, penalties and stars are left
+        empty, they are stored in their own tables by `pull_game_events()`
     """
-    data = r.get(f"{landing_api_head}{game_id}{landing_api_tail}").json()
+    store = store or PayloadStore()
+    # Fetch all three endpoints at once; the reads below are served from the store
+    data, game_story, box_score_data = store.get_many(game_urls(game_id))
 
-    if data["awayTeam"]["id"] == 15:
+    if data["awayTeam"]["abbrev"] == team:
         home_away = "away"
         opp_home_away = "home"
     else:
@@ -253,87 +698,7 @@ def pull_game_by_id(game_id: str | int) -> None:
     summary_data = data["summary"]
     scoring_data = summary_data["scoring"]
 
-    # Get goals
-    caps_goals = []
-    opp_goals = []
-    for period in scoring_data:
-        period_descriptor = period["periodDescriptor"]["number"]
-        period_goals_data = period["goals"]
-
-        for goal in period_goals_data:
-            scorer = f"{goal["firstName"]["default"]} {
-                goal["lastName"]["default"]} ({goal["goalsToDate"]})"
-
-            if goal["strength"] != "ev":
-                scorer += f" {goal["strength"].upper()}"
-
-            if goal["goalModifier"] == "empty-net":
-                scorer += " EN"
-
-            time_in_period = goal["timeInPeriod"]
-
-            assists = []
-            for assist in goal["assists"]:
-                assister = f"{assist["name"]["default"]
-                              } ({assist["assistsToDate"]})"
-                assists.append(assister)
-
-            if len(assists) == 0:
-                assists.append("Unassisted")
-
-            goal_str = f"{
-                scorer} - P{period_descriptor} {time_in_period} ({", ".join(assists)})"
-
-            if goal["teamAbbrev"]["default"] == "WSH":
-                caps_goals.append(goal_str)
-            else:
-                opp_goals.append(goal_str)
-
-    if len(caps_goals) == 0:
-        caps_goals.append("None")
-    if len(opp_goals) == 0:
-        opp_goals.append("None")
-
-    # Get penalties
-    if "penalties" in summary_data:
-        penalty_data = summary_data["penalties"]
-
-        caps_penalties = []
-        opp_penalties = []
-        for period in penalty_data:
-            period_descriptor = period["periodDescriptor"]["number"]
-            period_penalties_data = period["penalties"]
-
-            for penalty in period_penalties_data:
-                duration = f"{penalty["duration"]}min"
-                infraction = penalty["descKey"]
-                committed_by = penalty["committedByPlayer"] if penalty["type"] != "BEN" else "Bench"
-                time_in_period = penalty["timeInPeriod"]
-
-                penalty_str = f"{
-                    committed_by} - {infraction} ({duration}) P{period_descriptor} {time_in_period}"
-
-                if penalty["teamAbbrev"]["default"] == "WSH":
-                    caps_penalties.append(penalty_str)
-                else:
-                    opp_penalties.append(penalty_str)
-
-        if len(caps_penalties) == 0:
-            caps_penalties.append("None")
-        if len(opp_penalties) == 0:
-            opp_penalties.append("None")
-
-    # Get three stars
-    stars_data = summary_data["threeStars"]
-
-    stars = []
-    for star in stars_data:
-        stars.append(f"{star["name"]["default"]} {star["position"]}{
-                     star["sweaterNo"]} ({star["teamAbbrev"]})")
-
     # Get team stats
-    game_story = r.get(
-        f"https://api-web.nhle.com/v1/wsc/game-story/{game_id}").json()
     game_date = game_story["gameDate"]
     team_stats_data = game_story["summary"]["teamGameStats"]
 
@@ -388,8 +753,6 @@ def pull_game_by_id(game_id: str | int) -> None:
     elif len(scoring_data) > 4:
         result += " (OT+)"
 
-    box_score_data = r.get(f"{box_score_api_head}{game_id}{
-                           box_score_api_tail}").json()
     caps_goalie = ""
     opp_goalie = ""
 
@@ -418,63 +781,203 @@ def pull_game_by_id(game_id: str | int) -> None:
     game_columns = ["opponent", "home_away", "date", "goalie", "opp_goalie", "sog", "opp_sog",
                     "fop", "opp_fop", "pp", "ppp", "opp_pp", "opp_ppp", "pim", "opp_pim", "hits", "opp_hits",
                     "bs", "opp_bs", "gv", "opp_gv", "tk", "opp_tk", "goals", "opp_goals", "penalties",
-                    "opp_penalties", "stars", "result"]
+                    "opp_penalties", "stars", "result", "game_id"]
 
     game_df = pd.DataFrame([(opponent, home_away, game_date, caps_goalie, opp_goalie, caps_sog, opp_sog,
                             caps_fop, opp_fop, caps_ppn, caps_ppp, opp_ppn, opp_ppp, caps_pim, opp_pim, caps_hits,
-                            opp_hits, caps_bs, opp_bs, caps_gv, opp_gv, caps_tk, opp_tk, caps_goals, opp_goals,
-                            caps_penalties, opp_penalties, stars, result)], columns=game_columns)
-    game_df.to_csv(f"to_load/game_{game_date}.csv", index=False)
+                            opp_hits, caps_bs, opp_bs, caps_gv, opp_gv, caps_tk, opp_tk, None, None,
+                            None, None, None, result, int(game_id))], columns=game_columns)
+    if STAGE_CSV:
+        game_df.to_csv(f"to_load/game_{game_date}.csv", index=False)
+    return game_df
+
+
+def pull_game_events(game_id: str | int, store: PayloadStore | None = None) -> dict[str, pd.DataFrame]:
+    """Pulls the goals, penalties and three stars of a single game by NHL API ID
+
+    Args:
+        game_id (str | int): ID of the desired game
+        store (PayloadStore | None, optional): payloads shared with the rest of the run. Defaults to None.
+
+    Returns:
+        dict[str, pd.DataFrame]: rows for the `game_goals`, `game_penalties` and `game_stars` tables
+    """
+    store = store or PayloadStore()
+    data = store.get(game_urls(game_id)[0])
+    summary_data = data["summary"]
+    game_id = int(game_id)
+
+    goals = []
+    for period in summary_data["scoring"]:
+        period_number = period["periodDescriptor"]["number"]
+        for goal in period["goals"]:
+            assists = [(a["playerId"], a["name"]["default"], a["assistsToDate"])
+                       for a in goal["assists"]] + [(None, None, None)] * 2
+            goals.append((game_id, period_number, goal["timeInPeriod"], goal["teamAbbrev"]["default"],
+                          goal["playerId"], f"{goal["firstName"]["default"]} {
+                              goal["lastName"]["default"]}", goal["goalsToDate"],
+                          *assists[0], *assists[1], goal["strength"], goal["goalModifier"]))
+
+    penalties = []
+    for period in summary_data.get("penalties", []):
+        period_number = period["periodDescriptor"]["number"]
+        for penalty in period["penalties"]:
+            committed_by = penalty["committedByPlayer"] if penalty["type"] != "BEN" else "Bench"
+            penalties.append((game_id, period_number, penalty["timeInPeriod"], penalty["teamAbbrev"]["default"],
+                              committed_by, penalty["descKey"], penalty["duration"], penalty["type"]))
+
+    stars = []
+    for star in summary_data["threeStars"]:
+        stars.append((game_id, star["star"], star["playerId"], star["name"]["default"],
+                      star["position"], star["sweaterNo"], star["teamAbbrev"]))
+
+    goal_columns = ["game_id", "period", "time", "team", "scorer_id", "scorer", "goals_to_date",
+                    "assist1_id", "assist1", "assists_to_date1", "assist2_id", "assist2", "assists_to_date2",
+                    "strength", "modifier"]
+    penalty_columns = ["game_id", "period", "time", "team",
+                       "committed_by", "infraction", "duration", "penalty_type"]
+    star_columns = ["game_id", "star", "player_id",
+                    "name", "position", "sweater_no", "team"]
+    # Nullable ints keep unassisted goals from turning the id columns into REAL
+    nullable = {col: "Int64" for col in ("assist1_id", "assists_to_date1",
+                                         "assist2_id", "assists_to_date2")}
+    return {"game_goals": pd.DataFrame(goals, columns=goal_columns).astype(nullable),
+            "game_penalties": pd.DataFrame(penalties, columns=penalty_columns),
+            "game_stars": pd.DataFrame(stars, columns=star_columns)}
 
 
 @check_folder
-def pull_game_by_date(date: str = "now") -> None:
+def pull_game_by_date(date: str = "now", store: PayloadStore | None = None, team: str = t.DEFAULT_TEAM) -> list[pd.DataFrame]:
     """Pulls a game by date for when `game_id` is unknown
 
     Args:
         date (str, optional): date in `YYYY-MM-DD` format. Defaults to "now".
+        store (PayloadStore | None, optional): payloads shared with the rest of the run. Defaults to None.
+        team (str, optional): team abbreviation. Defaults to t.DEFAULT_TEAM.
+
+    Returns:
+        list[pd.DataFrame]: one single-row frame per game of `team` on that date
     """
-    data = r.get(f"{game_api_head}{date}").json()
+    store = store or PayloadStore()
+    data = store.get(f"{game_api_head}{date}")
+    games = []
     for game in data["games"]:
-        if game["awayTeam"]["id"] == 15 or game["homeTeam"]["id"] == 15:
-            pull_game_by_id(game["id"])
+        if team in (game["awayTeam"]["abbrev"], game["homeTeam"]["abbrev"]):
+            games.append(pull_game_by_id(game["id"], store, team))
+    return games
 
 
 @check_folder
-def pull_all_completed_games(db_path: str = ACTIVE_DB) -> None:
-    """Pulls game data for all games on the schedule up to **but not including** today
+def pull_all_completed_games(db_path: str = ACTIVE_DB, store: PayloadStore | None = None,
+                             sync_schedule: bool = True) -> dict[str, pd.DataFrame]:
+    """Pulls game data for every finished game on the schedule that isn't in the `games` table yet\n
+    Games are picked by ID and state from the `schedule` table, so no score lookups are needed.
+    Events are also pulled for games loaded before the event tables existed; clear their old
+    string columns with `database.clear_legacy_events()` once the events are saved.
 
     Args:
         db_path (str, optional): db to query (ex. "data/stats_2425.db"). Defaults to ACTIVE_DB.
+        store (PayloadStore | None, optional): payloads shared with the rest of the run. Defaults to None.
+        sync_schedule (bool, optional): refresh the `schedule` table from the API first, so game states
+            are current. Defaults to True.
+
+    Returns:
+        dict[str, pd.DataFrame]: new rows (may be empty) for the `games`, `game_goals`, `game_penalties`
+        and `game_stars` tables
     """
-    today = pd.Timestamp.now()
-    # Prevents pulling today's game in case it hasn't happened yet
-    today_str = f"{today.year}-{today.month}-{today.day:02}"
-    schedule = d.fetch_all("schedule", db_path)
-    if schedule is None:
-        pull_current_schedule()
-        d.load_file("to_load/schedule_from_api.csv",
-                    "schedule", [], "replace", db_path)
-        schedule = d.fetch_all("schedule", db_path)
-    games = d.fetch_all("games", db_path)
-    all_dates = [g[0] for g in schedule]
-    if games is None:
-        completed_dates = []
-    else:
-        completed_dates = [g[2] for g in games]
-    dates_to_pull = [
-        date for date in all_dates if date not in completed_dates and date < today_str]
-    if len(dates_to_pull) == 0:
-        return
-    for date in dates_to_pull:
-        pull_game_by_date(date)
+    store = store or PayloadStore()
+    d.migrate_schema(db_path)
+    if sync_schedule:
+        d.sync_dataframe(pull_current_schedule(store),
+                         "schedule", ["date"], db_path)
+    d.backfill_game_ids(db_path)
+
+    game_ids = d.pending_game_ids(db_path)
+    legacy_ids = d.legacy_event_game_ids(db_path)
+    fetch_game_payloads(store, game_ids, legacy_ids)
+    return completed_game_tables(game_ids, legacy_ids, store)
+
+
+def planned_game_ids(schedule_df: pd.DataFrame, db_path: str = ACTIVE_DB) -> tuple[list[int], list[int]]:
+    """Works out which games `pull_all_completed_games()` will need once `schedule_df` is synced, without writing
+
+    Mirrors `database.backfill_game_ids()`, `pending_game_ids()` and `legacy_event_game_ids()` on the
+    stored games and the pulled schedule, so the games can be fetched before a transaction opens.
+
+    Args:
+        schedule_df (pd.DataFrame): the pulled schedule, as returned by `pull_current_schedule()`
+        db_path (str, optional): db to read the `games` table of. Defaults to ACTIVE_DB.
+
+    Returns:
+        tuple[list[int], list[int]]: IDs of finished games not loaded yet (schedule order), and of
+        loaded games whose events are still in the legacy columns
+    """
+    id_by_date = dict(zip(schedule_df["date"], schedule_df["game_id"]))
+    loaded_ids, legacy_ids = set(), []
+    for date, game_id, has_legacy_events in d.loaded_games(db_path):
+        game_id = game_id if game_id is not None else id_by_date.get(date)
+        loaded_ids.add(game_id)
+        if has_legacy_events and game_id is not None:
+            legacy_ids.append(game_id)
+
+    finished = schedule_df[schedule_df["game_state"].isin(d.FINAL_GAME_STATES)]
+    pending = [int(game_id) for game_id in dict.fromkeys(finished.sort_values("date")["game_id"])
+               if game_id not in loaded_ids]
+    return pending, legacy_ids
+
+
+def fetch_game_payloads(store: PayloadStore, game_ids: list[int], legacy_ids: list[int] | None = None) -> None:
+    """Requests every payload `completed_game_tables()` reads into the store\n
+    Progress is reported once per game: "games" counts the new games, "events" the legacy games.
+
+    Args:
+        store (PayloadStore): payloads shared with the rest of the run
+        game_ids (list[int]): games that need all three endpoints
+        legacy_ids (list[int] | None, optional): games that only need their landing page for events. Defaults to None.
+    """
+    # Every request of every game shares the store's worker pool, which caps the requests in flight
+    store.get_groups([game_urls(game_id) for game_id in game_ids], "games")
+    if legacy_ids:
+        store.get_groups([game_urls(game_id)[:1] for game_id in legacy_ids], "events")
+
+
+def completed_game_tables(game_ids: list[int], legacy_ids: list[int], store: PayloadStore) -> dict[str, pd.DataFrame]:
+    """Builds the rows of new games, and the events of legacy games, from the store
+
+    Payloads missing from the store are requested, so call `fetch_game_payloads()` first to keep
+    the network out of any open transaction.
+
+    Args:
+        game_ids (list[int]): games to build `games` and event rows for
+        legacy_ids (list[int]): loaded games to build only event rows for
+        store (PayloadStore): payloads shared with the rest of the run
+
+    Returns:
+        dict[str, pd.DataFrame]: new rows (may be empty) for the `games`, `game_goals`, `game_penalties`
+        and `game_stars` tables
+    """
+    tables = {"games": [pull_game_by_id(game_id, store) for game_id in game_ids],
+              "game_goals": [], "game_penalties": [], "game_stars": []}
+    for game_id in game_ids + legacy_ids:
+        for table_name, df in pull_game_events(game_id, store).items():
+            tables[table_name].append(df)
+    return {table_name: pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
+            for table_name, dfs in tables.items()}
 
 
 @check_folder
-def pull_current_schedule() -> None:
-    """Pulls the current schedule from the NHL API and saves to .csv file
+def pull_current_schedule(store: PayloadStore | None = None, team: str = t.DEFAULT_TEAM) -> pd.DataFrame:
+    """Pulls a club's current schedule from the NHL API
+
+    Args:
+        store (PayloadStore | None, optional): payloads shared with the rest of the run. Defaults to None.
+        team (str, optional): team abbreviation. Defaults to t.DEFAULT_TEAM.
+
+    Returns:
+        pd.DataFrame: one row per regular season/playoff game, ready for the `schedule` table
     """
-    data = r.get(schedule_api).json()
+    store = store or PayloadStore()
+    data = store.get(club_schedule_url(team))
     game_data = data["games"]
 
     season_games = []
@@ -493,14 +996,20 @@ def pull_current_schedule() -> None:
             game["homeTeam"]["commonName"]["default"]}"
         away_team = f"{game["awayTeam"]["placeName"]["default"]} {
             game["awayTeam"]["commonName"]["default"]}"
-        is_home = home_team == "Washington Capitals"
-        season_games.append(
-            (date, start_timestamp_est.strftime("%I:%M %p"), home_team, away_team, is_home))
+        is_home = game["homeTeam"]["abbrev"] == team
+        season_games.append((date, start_timestamp_est.strftime("%I:%M %p"), home_team, away_team, is_home,
+                             game["id"], game["gameState"]))
 
-    schedule_columns = ["date", "time", "home_team", "away_team", "is_home"]
+    schedule_columns = ["date", "time", "home_team",
+                        "away_team", "is_home", "game_id", "game_state"]
     schedule_df = pd.DataFrame(season_games, columns=schedule_columns)
-    schedule_df.to_csv("to_load/schedule_from_api.csv", index=False)
+    if STAGE_CSV:
+        schedule_df.to_csv("to_load/schedule_from_api.csv", index=False)
+    return schedule_df
 
 
 if __name__ == '__main__':
-    bulk_update("data/stats_2425.db")
+    if sys.argv[1:2] == ["league"]:
+        league_update(print_metrics=True)
+    else:
+        bulk_update("data/stats_2425.db", print_metrics=True)
@@ -1,26 +1,29 @@
+import datetime as dt
 import os
 import sys
-import api_pull as a
+import threading
+import time
 import database as d
-from PyQt6.QtGui import QFont, QIcon, QPixmap
-from PyQt6.QtCore import QSize, Qt
+import image_cache as ic
+import lazy_imports as li
+import metrics as mt
+import player_index as pi
+import season_catalog as sc
+import season_model as sm
+from teams import TEAMS_DICT
+from PyQt6.QtGui import QFont, QIcon
+from PyQt6.QtCore import (
+    QAbstractTableModel, QFileSystemWatcher, QModelIndex, QObject, QSize,
+    QSortFilterProxyModel, Qt, QThread, QTimer, pyqtSignal
+)
 from PyQt6.QtWidgets import (
-    QApplication, QComboBox, QHBoxLayout, QLineEdit,
-    QLabel, QListWidget, QPlainTextEdit, QPushButton,
-    QSpacerItem, QSizePolicy, QVBoxLayout, QWidget
+    QAbstractItemView, QApplication, QComboBox, QHBoxLayout, QHeaderView, QLineEdit,
+    QLabel, QListWidget, QListWidgetItem, QPlainTextEdit, QProgressBar, QPushButton,
+    QSpacerItem, QSizePolicy, QTableView, QVBoxLayout, QWidget
 )
 
 CAPS_ICON = "assets/caps_icon.ico"
 CURRENT_SEASON = "2425"
-TEAMS_DICT = {
-    "Anaheim Ducks": "ANA", "Boston Bruins": "BOS", "Buffalo Sabres": "BUF", "Calgary Flames": "CGY", "Carolina Hurricanes": "CAR", "Chicago Blackhawks": "CHI",
-    "Colorado Avalanche": "COL", "Columbus Blue Jackets": "CBJ", "Dallas Stars": "DAL", "Detroit Red Wings": "DET", "Edmonton Oilers": "EDM",
-    "Florida Panthers": "FLA", "Los Angeles Kings": "LAK", "Minnesota Wild": "MIN", "Montreal Canadiens": "MTL", "Montréal Canadiens": "MTL",
-    "Nashville Predators": "NSH", "New Jersey Devils": "NJD", "New York Islanders": "NYI", "New York Rangers": "NYR", "Ottawa Senators": "OTT",
-    "Philadelphia Flyers": "PHI", "Pittsburgh Penguins": "PIT", "San Jose Sharks": "SJS", "Seattle Kraken": "SEA", "St. Louis Blues": "STL",
-    "Tampa Bay Lightning": "TBL", "Toronto Maple Leafs": "TOR", "Utah Hockey Club": "UTA", "Vancouver Canucks": "VAN", "Vegas Golden Knights": "VGK",
-    "Washington Capitals": "WSH", "Winnipeg Jets": "WPG"
-}
 
 # Alignments and fonts
 LEFT = Qt.AlignmentFlag.AlignLeft
@@ -31,6 +34,161 @@ LABEL_FONT = QFont("Segoe UI Semibold", 10)
 FIELD_FONT = QFont("Segoue UI", 9)
 BTN_FONT = QFont("Segoe UI", 14)
 BTN_SIZE = QSize(90, 30)
+UPDATE_STAGES = {"players": "Players", "schedule": "Schedule",
+                 "games": "Games", "events": "Game events", "saving": "Saving"}
+# Item data role holding a search result's `player_id`
+SEARCH_PLAYER_ID_ROLE = Qt.ItemDataRole.UserRole + 1
+# Time from `QApplication` creation to the main menu being painted
+FIRST_WINDOW_BUDGET_MS = 500
+
+
+class UpdateWorker(QObject):
+    """Class for running `api_pull.bulk_update` off the UI thread\n
+    Move it to a `QThread` and connect `run` to the thread's `started` signal.
+    """
+    progress = pyqtSignal(str, int, int)
+    finished = pyqtSignal(dict)
+    cancelled = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    def __init__(self, db_path: str) -> None:
+        super().__init__()
+        self.db_path = db_path
+        self.cancel_event = threading.Event()
+
+    def run(self) -> None:
+        # Deferred so pandas and requests stay off the startup path
+        import api_pull as a
+        try:
+            results = a.bulk_update(
+                self.db_path, progress=self.progress.emit, cancel=self.cancel_event)
+        except a.UpdateCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            print(f"ERROR: {e}")
+            self.failed.emit(str(e))
+        else:
+            self.finished.emit(results)
+
+    def cancel(self) -> None:
+        self.cancel_event.set()
+
+
+class SeasonWatcher(QObject):
+    """Class for refreshing the shared `SeasonCatalog` when files in its folder change\n
+    Watches the folder for added or removed seasons, and each season's `.db` and `-wal` files
+    for writes made in place by another process. Bursts of changes (ex. the WAL files of an
+    update) are coalesced into one rescan.
+    """
+    changed = pyqtSignal()
+
+    def __init__(self, catalog: sc.SeasonCatalog) -> None:
+        super().__init__()
+        self.catalog = catalog
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(500)
+        self.timer.timeout.connect(self.refresh)
+        self.watcher = QFileSystemWatcher([catalog.data_dir])
+        self.watcher.directoryChanged.connect(lambda path: self.timer.start())
+        self.watcher.fileChanged.connect(lambda path: self.timer.start())
+        self.watch_files()
+
+    def watch_files(self) -> None:
+        """Watches the database and WAL file of every season\n
+        A file that was replaced or deleted drops off the watcher, so this re-adds it once it exists again.
+        """
+        wanted = set()
+        for label in self.catalog.labels():
+            info = self.catalog.get(label)
+            if info is not None:
+                wanted.update(path for path in (info.db_path, f"{info.db_path}-wal") if os.path.exists(path))
+        watched = set(self.watcher.files())
+        if wanted - watched:
+            self.watcher.addPaths(sorted(wanted - watched))
+        if watched - wanted:
+            self.watcher.removePaths(sorted(watched - wanted))
+
+    def refresh(self) -> None:
+        changed = self.catalog.refresh()
+        # Picks up new seasons and WAL files, and re-adds files that were replaced
+        self.watch_files()
+        if changed:
+            sm.invalidate()
+            global player_index
+            if player_index is not None:
+                player_index.refresh()
+            self.changed.emit()
+
+
+class SeasonWindow(QWidget):
+    """Base class for windows with a season dropdown filled from the shared season catalog
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.season_list = QComboBox()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search all seasons")
+        global season_watcher
+        season_watcher.changed.connect(self.populate_seasons_combobox)
+
+    def populate_seasons_combobox(self) -> None:
+        """Fills the season list from the catalog, keeping the selected season if it still exists"""
+        global seasons
+        selected = self.season_list.currentText()
+        self.season_list.blockSignals(True)
+        self.season_list.clear()
+        self.season_list.addItems(["-Seasons-"] + seasons.labels())
+        index = max(self.season_list.findText(selected), 0)
+        self.season_list.setCurrentIndex(index)
+        self.season_list.blockSignals(False)
+        if self.season_list.currentText() != selected:
+            self.season_list.currentIndexChanged.emit(index)
+
+    def season_db_path(self) -> str:
+        """Path of the database for the selected season (ex. "data/stats_2425.db")"""
+        global seasons
+        return seasons.get(self.season_list.currentText()).db_path
+
+    def season_model(self) -> sm.SeasonModel:
+        """In-memory tables of the selected season, loaded on first use"""
+        return sm.get_model(self.season_db_path())
+
+    def show_search_results(self, list_widget: QListWidget, table_name: str) -> None:
+        """Lists the players of `table_name` matching the search box, from every season
+
+        Args:
+            list_widget (QListWidget): list to fill
+            table_name (str): "skaters" or "goalies"
+        """
+        global player_index
+        if player_index is None:
+            player_index = pi.PlayerIndex(seasons)
+        for entry in player_index.search(self.search_input.text(), table_name):
+            item = QListWidgetItem(entry.name)
+            item.setData(Qt.ItemDataRole.UserRole, entry.seasons)
+            item.setData(SEARCH_PLAYER_ID_ROLE, entry.player_id)
+            item.setToolTip(", ".join(entry.seasons))
+            list_widget.addItem(item)
+
+    def player_row(self, item: QListWidgetItem, table_name: str) -> tuple | None:
+        """Row of a listed player in the selected season, by `player_id` for search results (their
+        name may be spelled differently in older seasons) else by name"""
+        player_id = item.data(SEARCH_PLAYER_ID_ROLE)
+        if player_id is not None:
+            return self.season_model().row(table_name, "player_id", player_id)
+        return self.season_model().row(table_name, "name", item.text())
+
+    def select_search_season(self, item: QListWidgetItem | None) -> None:
+        """Switches to the newest season of a search result if the player isn't in the selected one"""
+        player_seasons = item.data(Qt.ItemDataRole.UserRole) if item is not None else None
+        if not player_seasons or self.season_list.currentText() in player_seasons:
+            return
+        # The list keeps showing the search results, so it doesn't need repopulating
+        self.season_list.blockSignals(True)
+        self.season_list.setCurrentText(player_seasons[0])
+        self.season_list.blockSignals(False)
 
 
 class MainWindow(QWidget):
@@ -45,6 +203,8 @@ class MainWindow(QWidget):
         self.game_window = None
         self.schedule_window = None
         self.seasons_window = None
+        self.update_thread = None
+        self.update_worker = None
 
         # Create widgets
         self.header = QLabel("Please select an option")
@@ -56,6 +216,7 @@ class MainWindow(QWidget):
         self.seasons_button = QPushButton("Seasons")
         self.update_button = QPushButton("Update")
         self.exit_button = QPushButton("Exit")
+        self.update_progress = QProgressBar()
 
         # Widget groups
         btns = [
@@ -70,6 +231,8 @@ class MainWindow(QWidget):
         for btn in btns:
             btn.setFont(BTN_FONT)
             btn.setFixedSize(120, 50)
+        self.update_progress.setFixedWidth(360)
+        self.update_progress.hide()
 
         # Connect buttons
         self.skaters_button.clicked.connect(self.show_skater_window)
@@ -78,8 +241,7 @@ class MainWindow(QWidget):
         self.games_button.clicked.connect(self.show_game_window)
         self.schedule_button.clicked.connect(self.show_schedule_window)
         self.seasons_button.clicked.connect(self.show_seasons_window)
-        self.update_button.clicked.connect(
-            lambda: a.bulk_update(f"data/stats_{CURRENT_SEASON}.db"))
+        self.update_button.clicked.connect(self.toggle_update)
         self.exit_button.clicked.connect(self.exit)
 
         # Set layout
@@ -101,11 +263,12 @@ class MainWindow(QWidget):
         main_layout.addLayout(btn_row1)
         main_layout.addLayout(btn_row2)
         main_layout.addLayout(btn_row3)
+        main_layout.addWidget(self.update_progress, alignment=CENTER)
 
         self.setWindowTitle("Washington Capitals Stats")
         self.setWindowIcon(QIcon(CAPS_ICON))
         self.setLayout(main_layout)
-        self.setFixedSize(400, 300)
+        self.setFixedSize(400, 330)
 
     def show_skater_window(self) -> None:
         if self.skater_window is None:
@@ -143,11 +306,71 @@ class MainWindow(QWidget):
         self.seasons_window.show()
         self.hide()
 
+    def toggle_update(self) -> None:
+        if self.update_worker is not None:
+            self.update_worker.cancel()
+            self.update_button.setEnabled(False)
+            self.header.setText("Cancelling...")
+            return
+
+        self.update_thread = QThread()
+        self.update_worker = UpdateWorker(f"data/stats_{CURRENT_SEASON}.db")
+        self.update_worker.moveToThread(self.update_thread)
+        self.update_thread.started.connect(self.update_worker.run)
+        self.update_worker.progress.connect(self.show_update_progress)
+        self.update_worker.finished.connect(self.update_finished)
+        self.update_worker.cancelled.connect(
+            lambda: self.end_update("Update cancelled"))
+        self.update_worker.failed.connect(
+            lambda e: self.end_update("Update failed"))
+        self.update_thread.start()
+
+        self.update_button.setText("Cancel")
+        self.header.setText("Updating...")
+        self.update_progress.setRange(0, 0)
+        self.update_progress.show()
+
+    def show_update_progress(self, stage: str, done: int, total: int) -> None:
+        self.header.setText(
+            f"Updating {UPDATE_STAGES.get(stage, stage).lower()}...")
+        self.update_progress.setRange(0, max(total, 1))
+        self.update_progress.setValue(done)
+        self.update_progress.setFormat(
+            f"{UPDATE_STAGES.get(stage, stage)} {done}/{total}")
+
+    def update_finished(self, results: dict) -> None:
+        changed = sum(counts["inserted"] + counts["updated"] + counts["deleted"]
+                      for counts in results.values())
+        self.end_update(f"Updated {changed} rows")
+        global season_watcher
+        season_watcher.refresh()
+        for window in (self.skater_window, self.goalie_window, self.roster_window, self.game_window):
+            if window is not None:
+                window.refresh()
+
+    def end_update(self, message: str) -> None:
+        self.update_thread.quit()
+        self.update_thread.wait()
+        self.update_thread = None
+        self.update_worker = None
+        self.header.setText(message)
+        self.update_button.setText("Update")
+        self.update_button.setEnabled(True)
+        self.update_progress.hide()
+
     def exit(self) -> None:
         self.close()
 
+    def closeEvent(self, event) -> None:
+        # Stop a running update so its transaction rolls back before the app quits
+        if self.update_worker is not None:
+            self.update_worker.cancel()
+            self.update_thread.quit()
+            self.update_thread.wait()
+        super().closeEvent(event)
 
-class SkaterWindow(QWidget):
+
+class SkaterWindow(SeasonWindow):
     """Class for building the skater menu window
     """
 
@@ -155,12 +378,11 @@ class SkaterWindow(QWidget):
         super().__init__()
         # Create widgets
         # Col 1
-        self.season_list = QComboBox()
         self.player_list = QListWidget()
         # Col2
         self.headshot = QLabel()
-        self.headshot_pixmap = QPixmap("assets/team_logos/WSH.png")
-        self.headshot.setPixmap(self.headshot_pixmap.scaledToWidth(200))
+        self.headshot.setPixmap(
+            ic.scaled_pixmap("assets/team_logos/WSH.png", 200))
         # Col 3
         self.name_label = QLabel("Name")
         self.name_input = QLineEdit()
@@ -229,7 +451,7 @@ class SkaterWindow(QWidget):
                   self.pts_per_game_input, self.evg_input, self.evp_input, self.ppg_input, self.ppp_input,
                   self.shg_input, self.shp_input, self.otg_input, self.gwg_input, self.toi_input,
                   self.shots_input, self.shot_pctg_input, self.fow_input]
-        lists = [self.season_list, self.player_list]
+        lists = [self.search_input, self.season_list, self.player_list]
         btns = [self.back_btn]
 
         # Configure Widgets
@@ -255,12 +477,14 @@ class SkaterWindow(QWidget):
         self.back_btn.clicked.connect(self.go_back)
         self.player_list.currentItemChanged.connect(self.load_player_from_list)
         self.season_list.currentIndexChanged.connect(self.populate_player_list)
+        self.search_input.textChanged.connect(self.populate_player_list)
 
         # Set layout
         layout = QVBoxLayout()
         horiz_layout = QHBoxLayout()
 
         list_layout = QVBoxLayout()
+        list_layout.addWidget(self.search_input)
         list_layout.addWidget(self.season_list)
         list_layout.addWidget(self.player_list)
 
@@ -342,43 +566,39 @@ class SkaterWindow(QWidget):
         global w
         w.show()
 
-    def populate_seasons_combobox(self) -> None:
-        data_files = os.listdir("data")
-        db_files = [db for db in data_files if db.startswith("stats_")]
-        seasons_raw = [s[s.index("_")+1:s.index(".db")] for s in db_files]
-        seasons_fmt = [f"20{s[:2]}-20{s[2:]}" for s in seasons_raw]
-        self.season_list.addItems(["-Seasons-"] + seasons_fmt)
-        # Add seasons to dict for easier conversion later
-        self.season_dict = {}
-        for i in range(len(db_files)):
-            self.season_dict[seasons_fmt[i]] = db_files[i]
-
     def populate_player_list(self) -> None:
         self.player_list.clear()
+        if self.search_input.text():
+            self.show_search_results(self.player_list, "skaters")
+            return
         curr_season = self.season_list.currentText()
         if curr_season == "-Seasons-":
             self.player_list.addItem("Please select a season")
             return
-        players = d.fetch_all(
-            "skaters", f"data/{self.season_dict[curr_season]}")
-        names = []
-        for player in players:
-            names.append(player[2])
-        self.player_list.addItems(names)
+        self.player_list.addItems(
+            self.season_model().values("skaters", "name"))
+
+    def refresh(self) -> None:
+        """Reloads the player list after an update, keeping the selected player"""
+        selected = self.player_list.currentItem()
+        name = selected.text() if selected is not None else None
+        self.populate_player_list()
+        matches = self.player_list.findItems(
+            name, Qt.MatchFlag.MatchExactly) if name else []
+        if matches:
+            self.player_list.setCurrentItem(matches[0])
 
     def load_player_from_list(self) -> None:
         try:
+            self.select_search_season(self.player_list.currentItem())
             curr_season = self.season_list.currentText()
             if curr_season == "-Seasons-":
                 return
-            name = self.player_list.currentItem().text()
-            player_data = d.fetch_one(
-                "skaters", "name = '" + name + "'", f"data/{self.season_dict[curr_season]}")
+            player_data = self.player_row(self.player_list.currentItem(), "skaters")
 
             # Insert the data into the correct fields
-            player_headshot = QPixmap(
-                f"assets/headshots/{player_data[2].lower().replace(" ", "_")}.png")
-            self.headshot.setPixmap(player_headshot.scaledToWidth(200))
+            self.headshot.setPixmap(ic.scaled_pixmap(
+                f"assets/headshots/{player_data[2].lower().replace(" ", "_")}.png", 200))
             self.name_input.setText(player_data[2])
             self.jersey_input.setText(str(player_data[3]))
             self.shoots_input.setText(player_data[4])
@@ -406,7 +626,7 @@ class SkaterWindow(QWidget):
             print(e)
 
 
-class GoalieWindow(QWidget):
+class GoalieWindow(SeasonWindow):
     """Class for building the goalie menu window
     """
 
@@ -415,12 +635,11 @@ class GoalieWindow(QWidget):
 
         # Create widgets
         # Col 1
-        self.season_list = QComboBox()
         self.player_list = QListWidget()
         # Col 2
         self.headshot = QLabel()
-        self.headshot_pixmap = QPixmap("assets/team_logos/WSH.png")
-        self.headshot.setPixmap(self.headshot_pixmap.scaledToWidth(200))
+        self.headshot.setPixmap(
+            ic.scaled_pixmap("assets/team_logos/WSH.png", 200))
         # Col 3
         self.name_label = QLabel("Name")
         self.name_input = QLineEdit()
@@ -481,7 +700,7 @@ class GoalieWindow(QWidget):
                   self.gp_input, self.gs_input, self.wins_input, self.losses_input, self.otl_input,
                   self.sa_input, self.svs_input, self.ga_input, self.sv_pctg_input, self.gaa_input,
                   self.so_input, self.goals_input, self.assists_input, self.points_input, self.pim_input]
-        lists = [self.season_list, self.player_list]
+        lists = [self.search_input, self.season_list, self.player_list]
         btns = [self.back_btn]
 
         # Configure widgets
@@ -507,12 +726,14 @@ class GoalieWindow(QWidget):
         self.back_btn.clicked.connect(self.go_back)
         self.player_list.currentItemChanged.connect(self.load_goalie_from_list)
         self.season_list.currentIndexChanged.connect(self.populate_goalie_list)
+        self.search_input.textChanged.connect(self.populate_goalie_list)
 
         # Set layout
         layout = QVBoxLayout()
         horiz_layout = QHBoxLayout()
 
         list_layout = QVBoxLayout()
+        list_layout.addWidget(self.search_input)
         list_layout.addWidget(self.season_list)
         list_layout.addWidget(self.player_list)
 
@@ -589,17 +810,15 @@ class GoalieWindow(QWidget):
 
     def load_goalie_from_list(self) -> None:
         try:
+            self.select_search_season(self.player_list.currentItem())
             curr_season = self.season_list.currentText()
             if curr_season == "-Seasons-":
                 return
-            name = self.player_list.currentItem().text()
-            player_data = d.fetch_one(
-                "goalies", "name = '" + name + "'", f"data/{self.season_dict[curr_season]}")
+            player_data = self.player_row(self.player_list.currentItem(), "goalies")
 
             # Insert data into correct fields
-            player_headshot = QPixmap(
-                f"assets/headshots/{player_data[2].lower().replace(" ", "_")}.png")
-            self.headshot.setPixmap(player_headshot.scaledToWidth(200))
+            self.headshot.setPixmap(ic.scaled_pixmap(
+                f"assets/headshots/{player_data[2].lower().replace(" ", "_")}.png", 200))
             self.name_input.setText(player_data[2])
             self.jersey_input.setText(str(player_data[3]))
             self.catches_input.setText(player_data[4])
@@ -623,60 +842,134 @@ class GoalieWindow(QWidget):
         except AttributeError as e:
             print(e)
 
-    def populate_seasons_combobox(self) -> None:
-        data_files = os.listdir("data")
-        db_files = [db for db in data_files if db.startswith("stats_")]
-        seasons_raw = [s[s.index("_")+1:s.index(".db")] for s in db_files]
-        seasons_fmt = [f"20{s[:2]}-20{s[2:]}" for s in seasons_raw]
-        self.season_list.addItems(["-Seasons-"] + seasons_fmt)
-        # Add seasons to dict for easier conversion later
-        self.season_dict = {}
-        for i in range(len(db_files)):
-            self.season_dict[seasons_fmt[i]] = db_files[i]
-
     def populate_goalie_list(self) -> None:
         self.player_list.clear()
+        if self.search_input.text():
+            self.show_search_results(self.player_list, "goalies")
+            return
         curr_season = self.season_list.currentText()
         if curr_season == "-Seasons-":
             self.player_list.addItem("Please select a season")
             return
-        goalies = d.fetch_all(
-            "goalies", f"data/{self.season_dict[curr_season]}")
-        names = []
-        for goalie in goalies:
-            names.append(goalie[2])
-        self.player_list.addItems(names)
-
+        self.player_list.addItems(
+            self.season_model().values("goalies", "name"))
+
+    def refresh(self) -> None:
+        """Reloads the goalie list after an update, keeping the selected goalie"""
+        selected = self.player_list.currentItem()
+        name = selected.text() if selected is not None else None
+        self.populate_goalie_list()
+        matches = self.player_list.findItems(
+            name, Qt.MatchFlag.MatchExactly) if name else []
+        if matches:
+            self.player_list.setCurrentItem(matches[0])
+
+
+class RosterTableModel(QAbstractTableModel):
+    """Class for exposing a season's roster rows to a `QTableView`\n
+    Switching seasons swaps the rows with `set_rows()`; the view only paints the rows on screen.
+    """
+    # (header, column of the `roster` table)
+    COLUMNS: tuple[tuple[str, int], ...] = (("Name", 2), ("#", 3), ("S/C", 4), ("Pos", 5),
+                                            ("Ht", 6), ("Wt", 7), ("Born", 8), ("Birthplace", 9))
+    # Headers that sort as numbers, every other column sorts as text
+    NUMERIC_COLUMNS: tuple[str, ...] = ("#", "Ht", "Wt")
 
-class RosterWindow(QWidget):
+    def __init__(self) -> None:
+        super().__init__()
+        self.rows: list[tuple] = []
+
+    def set_rows(self, rows: list[tuple]) -> None:
+        self.beginResetModel()
+        self.rows = rows
+        self.endResetModel()
+
+    def rowCount(self, parent: QModelIndex | None = None) -> int:
+        return 0 if parent is not None and parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent: QModelIndex | None = None) -> int:
+        return 0 if parent is not None and parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        header, col = self.COLUMNS[index.column()]
+        val = self.rows[index.row()][col]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return "" if val is None else str(val)
+        if role == Qt.ItemDataRole.UserRole:
+            return self.sort_key(header, val)
+        return None
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.COLUMNS[section][0]
+        return None
+
+    @classmethod
+    def sort_key(cls, header: str, val) -> float | str:
+        """Value a column sorts by, a float for `NUMERIC_COLUMNS` and a str for the rest\n
+        Heights sort in inches and birthdays as dates instead of their display text. Missing values sort first.
+        """
+        if header in cls.NUMERIC_COLUMNS:
+            try:
+                if header == "Ht":
+                    feet, inches = str(val).rstrip('"').split("'")
+                    return int(feet) * 12 + float(inches)
+                return float(val)
+            except (TypeError, ValueError):
+                return -1.0
+        if val is None:
+            return ""
+        if header == "Born":
+            try:
+                return dt.datetime.strptime(val, "%b %d, %Y").date().isoformat()
+            except ValueError:
+                pass
+        return str(val)
+
+
+class RosterWindow(SeasonWindow):
     """Class for building the roster menu window
     """
 
     def __init__(self) -> None:
         super().__init__()
         # Create widgets
-        self.season_list = QComboBox()
-        self.name_label = QLabel("Name")
-        self.jersey_label = QLabel("#")
-        self.sc_label = QLabel("S/C")
-        self.pos_label = QLabel("Pos")
-        self.ht_label = QLabel("Ht")
-        self.wt_label = QLabel("Wt")
-        self.born_label = QLabel("Born")
-        self.bp_label = QLabel("Birthplace")
+        self.filter_input = QLineEdit()
+        self.roster_table = QTableView()
+        self.roster_model = RosterTableModel()
+        self.roster_proxy = QSortFilterProxyModel()
         self.back_btn = QPushButton("Back")
 
         # Widget groups
-        labels = [
-            self.name_label, self.jersey_label, self.sc_label, self.pos_label,
-            self.ht_label, self.wt_label, self.born_label, self.bp_label]
         btns = [self.back_btn]
 
         # Configure widgets
-        for lbl in labels:
-            lbl.setFont(LABEL_FONT)
-
         self.season_list.setMaximumWidth(125)
+        self.filter_input.setPlaceholderText("Filter")
+        self.filter_input.setMaximumWidth(200)
+        self.filter_input.setFont(LABEL_FONT)
+
+        # Sorting and filtering happen in the proxy, the table only renders visible rows
+        self.roster_proxy.setSourceModel(self.roster_model)
+        self.roster_proxy.setSortRole(Qt.ItemDataRole.UserRole)
+        self.roster_proxy.setFilterKeyColumn(-1)
+        self.roster_proxy.setFilterCaseSensitivity(
+            Qt.CaseSensitivity.CaseInsensitive)
+        self.roster_table.setModel(self.roster_proxy)
+        self.roster_table.setSortingEnabled(True)
+        self.roster_table.sortByColumn(-1, Qt.SortOrder.AscendingOrder)
+        self.roster_table.setFont(LABEL_FONT)
+        self.roster_table.verticalHeader().hide()
+        self.roster_table.setEditTriggers(
+            QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.roster_table.setSelectionBehavior(
+            QAbstractItemView.SelectionBehavior.SelectRows)
+        self.roster_table.horizontalHeader().setSectionResizeMode(
+            QHeaderView.ResizeMode.ResizeToContents)
+        self.roster_table.horizontalHeader().setStretchLastSection(True)
+
         self.populate_seasons_combobox()
 
         for b in btns:
@@ -686,43 +979,21 @@ class RosterWindow(QWidget):
         # Connect events
         self.back_btn.clicked.connect(self.go_back)
         self.season_list.currentIndexChanged.connect(self.show_roster)
+        self.filter_input.textChanged.connect(
+            self.roster_proxy.setFilterFixedString)
 
         # Set layout
         layout = QVBoxLayout()
 
-        self.name_col = QVBoxLayout()
-        self.jersey_col = QVBoxLayout()
-        self.sc_col = QVBoxLayout()
-        self.pos_col = QVBoxLayout()
-        self.ht_col = QVBoxLayout()
-        self.wt_col = QVBoxLayout()
-        self.bday_col = QVBoxLayout()
-        self.bplace_col = QVBoxLayout()
-
-        self.name_col.addWidget(self.name_label)
-        self.jersey_col.addWidget(self.jersey_label)
-        self.sc_col.addWidget(self.sc_label)
-        self.pos_col.addWidget(self.pos_label)
-        self.ht_col.addWidget(self.ht_label)
-        self.wt_col.addWidget(self.wt_label)
-        self.bday_col.addWidget(self.born_label)
-        self.bplace_col.addWidget(self.bp_label)
-
-        table_layout = QHBoxLayout()
-        table_layout.addLayout(self.name_col)
-        table_layout.addLayout(self.jersey_col)
-        table_layout.addLayout(self.sc_col)
-        table_layout.addLayout(self.pos_col)
-        table_layout.addLayout(self.ht_col)
-        table_layout.addLayout(self.wt_col)
-        table_layout.addLayout(self.bday_col)
-        table_layout.addLayout(self.bplace_col)
+        top_row = QHBoxLayout()
+        top_row.addWidget(self.season_list, alignment=LEFT)
+        top_row.addWidget(self.filter_input, alignment=RIGHT)
 
         btn_row = QHBoxLayout()
         btn_row.addWidget(self.back_btn)
 
-        layout.addWidget(self.season_list, alignment=LEFT)
-        layout.addLayout(table_layout)
+        layout.addLayout(top_row)
+        layout.addWidget(self.roster_table)
         layout.addLayout(btn_row)
         self.setWindowTitle("Washington Capitals Roster")
         self.setWindowIcon(QIcon(CAPS_ICON))
@@ -735,114 +1006,32 @@ class RosterWindow(QWidget):
         global w
         w.show()
 
-    def populate_seasons_combobox(self) -> None:
-        data_files = os.listdir("data")
-        db_files = [db for db in data_files if db.startswith("stats_")]
-        seasons_raw = [s[s.index("_")+1:s.index(".db")] for s in db_files]
-        seasons_fmt = [f"20{s[:2]}-20{s[2:]}" for s in seasons_raw]
-        self.season_list.addItems(["-Seasons-"] + seasons_fmt)
-        # Add seasons to dict for easier conversion later
-        self.season_dict = {}
-        for i in range(len(db_files)):
-            self.season_dict[seasons_fmt[i]] = db_files[i]
-
     def show_roster(self) -> None:
-        self.clear_roster()
-        try:
-            curr_season = self.season_list.currentText()
-            if curr_season == "-Seasons-":
-                return
-            roster_data = d.fetch_all(
-                "roster", f"data/{self.season_dict[curr_season]}")
-
-            # Insert the data into new fields
-            names = []
-            jerseys = []
-            shoots_catches = []
-            positions = []
-            hts = []
-            wts = []
-            bdays = []
-            bplaces = []
-            for player in roster_data:
-                names.append(player[2])
-                jerseys.append(player[3])
-                shoots_catches.append(player[4])
-                positions.append(player[5])
-                hts.append(player[6])
-                wts.append(player[7])
-                bdays.append(player[8])
-                bplaces.append(player[9])
-
-            for i in range(len(names)):
-                self.name_col.insertWidget(-1, QLabel(names[i]))
-                self.jersey_col.insertWidget(-1, QLabel(str(jerseys[i])))
-                self.sc_col.insertWidget(-1, QLabel(shoots_catches[i]))
-                self.pos_col.insertWidget(-1, QLabel(positions[i]))
-                self.ht_col.insertWidget(-1, QLabel(hts[i]))
-                self.wt_col.insertWidget(-1, QLabel(str(wts[i])))
-                self.bday_col.insertWidget(-1, QLabel(bdays[i]))
-                self.bplace_col.insertWidget(-1, QLabel(bplaces[i]))
-        except AttributeError as e:
-            print(e)
-
-    def clear_roster(self) -> None:
-        cols = [
-            self.name_col, self.jersey_col, self.sc_col, self.pos_col,
-            self.ht_col, self.wt_col, self.bday_col, self.bplace_col
-        ]
-        for col in cols:
-            while col.count():
-                item = col.takeAt(0)
-                widget = item.widget()
-                if widget is not None:
-                    widget.deleteLater()
-                elif item.layout() is not None:
-                    self.clear_roster(item.layout())
-
-        self.name_label = QLabel("Name")
-        self.jersey_label = QLabel("#")
-        self.sc_label = QLabel("S/C")
-        self.pos_label = QLabel("Pos")
-        self.ht_label = QLabel("Ht")
-        self.wt_label = QLabel("Wt")
-        self.born_label = QLabel("Born")
-        self.bp_label = QLabel("Birthplace")
-
-        labels = [
-            self.name_label, self.jersey_label, self.sc_label, self.pos_label,
-            self.ht_label, self.wt_label, self.born_label, self.bp_label
-        ]
-        for lbl in labels:
-            lbl.setFont(LABEL_FONT)
+        curr_season = self.season_list.currentText()
+        if curr_season == "-Seasons-":
+            self.roster_model.set_rows([])
+            return
+        self.roster_model.set_rows(self.season_model().rows("roster"))
 
-        self.name_col.addWidget(self.name_label)
-        self.jersey_col.addWidget(self.jersey_label)
-        self.sc_col.addWidget(self.sc_label)
-        self.pos_col.addWidget(self.pos_label)
-        self.ht_col.addWidget(self.ht_label)
-        self.wt_col.addWidget(self.wt_label)
-        self.bday_col.addWidget(self.born_label)
-        self.bplace_col.addWidget(self.bp_label)
+    def refresh(self) -> None:
+        """Reloads the roster after an update"""
+        self.show_roster()
 
 
-class GameWindow(QWidget):
+class GameWindow(SeasonWindow):
     """Class for building the game menu window
     """
 
     def __init__(self) -> None:
         super().__init__()
         # Create widgets
-        self.season_list = QComboBox()
         self.date_list = QComboBox()
         self.result_text_label = QLabel("Result:")
         self.result_label = QLabel("Tie")
         self.wsh_logo = QLabel()
-        self.wsh_logo_pixmap = QPixmap("assets/team_logos/WSH.png")
         self.wsh_label = QLabel("WSH")
         self.home_away_label = QLabel("vs.")
         self.opp_logo = QLabel()
-        self.opp_logo_pixmap = QPixmap("assets/team_logos/NHL.png")
         self.opp_label = QLabel("OPP")
         self.score_label = QLabel("Score")
         self.wsh_score_label = QLabel("0")
@@ -909,8 +1098,10 @@ class GameWindow(QWidget):
         self.btns = [self.back_btn]
 
         # Configure widgets
-        self.wsh_logo.setPixmap(self.wsh_logo_pixmap.scaledToWidth(100))
-        self.opp_logo.setPixmap(self.opp_logo_pixmap.scaledToWidth(100))
+        self.wsh_logo.setPixmap(
+            ic.scaled_pixmap("assets/team_logos/WSH.png", 100))
+        self.opp_logo.setPixmap(
+            ic.scaled_pixmap("assets/team_logos/NHL.png", 100))
         self.result_label.setFont(QFont("Segoe UI", 14))
 
         for lbl in self.headers:
@@ -1054,28 +1245,21 @@ class GameWindow(QWidget):
         global w
         w.show()
 
-    def populate_seasons_combobox(self):
-        data_files = os.listdir("data")
-        db_files = [db for db in data_files if db.startswith("stats_")]
-        seasons_raw = [s[s.index("_")+1:s.index(".db")] for s in db_files]
-        seasons_fmt = [f"20{s[:2]}-20{s[2:]}" for s in seasons_raw]
-        self.season_list.addItems(["-Seasons-"] + seasons_fmt)
-        # Add seasons to dict for easier conversion later
-        self.season_dict = {}
-        for i in range(len(db_files)):
-            self.season_dict[seasons_fmt[i]] = db_files[i]
-
     def populate_date_list(self):
         self.date_list.clear()
         curr_season = self.season_list.currentText()
         if curr_season == "-Seasons-":
             self.date_list.addItem("Select a season")
             return
-        games = d.fetch_all("games", f"data/{self.season_dict[curr_season]}")
-        dates = []
-        for game in games:
-            dates.append(game[2])
-        self.date_list.addItems(dates)
+        self.date_list.addItems(self.season_model().values("games", "date"))
+
+    def refresh(self) -> None:
+        """Reloads the game dates after an update, keeping the selected date"""
+        date = self.date_list.currentText()
+        self.populate_date_list()
+        index = self.date_list.findText(date)
+        if index >= 0:
+            self.date_list.setCurrentIndex(index)
 
     def load_game_from_list(self):
         try:
@@ -1085,15 +1269,14 @@ class GameWindow(QWidget):
             date = self.date_list.currentText()
             if date in ("Select a season", None, ""):
                 return
-            game_data = d.fetch_one(
-                "games", "date = '" + date + "'", f"data/{self.season_dict[curr_season]}")
+            model = self.season_model()
+            game_data = model.row("games", "date", date)
 
             # Insert data into correct fields
             opp_name_abbr = TEAMS_DICT[game_data[0]]
             self.opp_label.setText(opp_name_abbr)
-            self.opp_logo_pixmap = QPixmap(
-                f"assets/team_logos/{opp_name_abbr}.png")
-            self.opp_logo.setPixmap(self.opp_logo_pixmap.scaledToWidth(100))
+            self.opp_logo.setPixmap(ic.scaled_pixmap(
+                f"assets/team_logos/{opp_name_abbr}.png", 100))
             self.home_away_label.setText(
                 "vs." if game_data[1] == "home" else "@")
             self.wsh_goalie_label.setText(game_data[3])
@@ -1116,22 +1299,19 @@ class GameWindow(QWidget):
             self.opp_gv_label.setText(str(game_data[20]))
             self.wsh_tk_label.setText(str(game_data[21]))
             self.opp_tk_label.setText(str(game_data[22]))
-            wsh_goals = game_data[23].replace(
-                "['", "").replace("']", "").split("', '")
-            opp_goals = game_data[24].replace(
-                "['", "").replace("']", "").split("', '")
+            if game_data[27] is None:
+                wsh_goals, opp_goals, wsh_penalties, opp_penalties, stars = self.render_events(
+                    game_data[29], model)
+            else:
+                # Games loaded before the event tables existed keep their strings in the games table
+                wsh_goals, opp_goals, wsh_penalties, opp_penalties, stars = [
+                    col.replace("['", "").replace("']", "").split("', '") for col in game_data[23:28]]
             self.wsh_goals_box.setPlainText("\n".join(wsh_goals))
             self.opp_goals_box.setPlainText("\n".join(opp_goals))
-            wsh_penalties = game_data[25].replace(
-                "['", "").replace("']", "").split("', '")
-            opp_penalties = game_data[26].replace(
-                "['", "").replace("']", "").split("', '")
             self.wsh_penalties_box.setPlainText("\n".join(wsh_penalties))
             self.opp_penalties_box.setPlainText("\n".join(opp_penalties))
-            stars = game_data[27].replace(
-                "['", "").replace("']", "").split("', '")
             self.stars_names_label.setText(
-                f"#1 - {stars[0]}, #2 - {stars[1]}, #3 - {stars[2]}")
+                ", ".join(f"#{i} - {star}" for i, star in enumerate(stars, start=1)))
             self.result_label.setText(game_data[28])
             self.wsh_score_label.setText(
                 "0" if wsh_goals[0] == "None" else str(len(wsh_goals)))
@@ -1140,6 +1320,39 @@ class GameWindow(QWidget):
         except AttributeError as e:
             print(e)
 
+    def render_events(self, game_id: int, model: sm.SeasonModel) -> list[list[str]]:
+        """Builds the display strings for a game from the `game_goals`, `game_penalties` and `game_stars` tables
+
+        Args:
+            game_id (int): NHL API ID of the game
+            model (sm.SeasonModel): season the game is in
+
+        Returns:
+            list[list[str]]: WSH goals, opponent goals, WSH penalties, opponent penalties and stars.
+            Goal and penalty lists are `["None"]` when empty
+        """
+        wsh_goals, opp_goals, wsh_penalties, opp_penalties = [], [], [], []
+        for goal in model.game_events("game_goals", game_id):
+            scorer = f"{goal[5]} ({goal[6]})"
+            if goal[13] != "ev":
+                scorer += f" {goal[13].upper()}"
+            if goal[14] == "empty-net":
+                scorer += " EN"
+            assists = [f"{goal[i]} ({goal[i + 1]})" for i in (8, 11)
+                       if goal[i] is not None] or ["Unassisted"]
+            goal_str = f"{scorer} - P{goal[1]} {goal[2]} ({", ".join(assists)})"
+            (wsh_goals if goal[3] == "WSH" else opp_goals).append(goal_str)
+
+        for penalty in model.game_events("game_penalties", game_id):
+            penalty_str = f"{penalty[4]} - {penalty[5]} ({penalty[6]}min) P{
+                penalty[1]} {penalty[2]}"
+            (wsh_penalties if penalty[3] == "WSH" else opp_penalties).append(
+                penalty_str)
+
+        stars = [f"{star[3]} {star[4]}{star[5]} ({star[6]})" for star in sorted(
+            model.game_events("game_stars", game_id), key=lambda star: star[1])]
+        return [events or ["None"] for events in (wsh_goals, opp_goals, wsh_penalties, opp_penalties)] + [stars]
+
 
 class ScheduleWindow(QWidget):
     """Class for building the schedule window
@@ -1183,8 +1396,31 @@ class SeasonsWindow(QWidget):
         w.show()
 
 
+def report_startup(started_at: float) -> None:
+    """Prints how long the main menu took to appear and the slowest imports of `app` (`--startup-report`)"""
+    window_ms = (time.perf_counter() - started_at) * 1000
+    import_ms, slowest = li.import_report("app", top=5)
+    for ms, name in slowest:
+        print(f"{ms:9.1f} ms  import {name}")
+    print(f"imports: {import_ms:.1f} ms of {li.STARTUP_IMPORT_BUDGET_MS:.0f} ms budget, "
+          f"first window: {window_ms:.1f} ms of {FIRST_WINDOW_BUDGET_MS} ms budget")
+
+
 if __name__ == '__main__':
+    started_at = time.perf_counter()
     app = QApplication(sys.argv)
+    app.aboutToQuit.connect(d.close_connections)
+    if "--metrics" in sys.argv:
+        # Database calls made by the windows, summed over the session
+        app.aboutToQuit.connect(lambda: print(mt.dump_run("app")))
+    seasons = sc.SeasonCatalog()
+    season_watcher = SeasonWatcher(seasons)
+    # Built on the first search
+    player_index = None
     w = MainWindow()
     w.show()
+    # Both run once the event loop has painted the menu
+    if "--startup-report" in sys.argv:
+        QTimer.singleShot(0, lambda: report_startup(started_at))
+    QTimer.singleShot(0, li.warm_up)
     app.exec()
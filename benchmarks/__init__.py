@@ -0,0 +1,8 @@
+"""Benchmarks of the API transforms, file loading, date helpers and lookups on generated data
+
+Usage (from the repository root):
+    python -m benchmarks                         # every case at "team" scale, compared with baseline.json
+    python -m benchmarks --scale league          # 32 teams x 20 seasons
+    python -m benchmarks --save-baseline         # record the current results as the baseline
+    python -m benchmarks --rounds 3              # best of 3 fresh processes per case, for noisy machines
+"""
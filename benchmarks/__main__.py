@@ -0,0 +1,125 @@
+"""Runs the benchmark cases and compares them with the stored baseline\n
+Fails on a regression and on any case without a baseline entry, until one is recorded with `--save-baseline`.
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from benchmarks import cases as c
+from benchmarks import synthetic as s
+
+BASELINE_FILE: str = os.path.join(os.path.dirname(__file__), "baseline.json")
+# Allowed drop in throughput, and rise in added memory, before a result counts as a regression
+TOLERANCE: float = 0.25
+# Added memory below this is noise and never a regression
+MEMORY_SLACK_MB: float = 8.0
+
+
+def run_isolated(name: str, scale_name: str, seed: int, rounds: int = 1) -> dict[str, float]:
+    """Runs a case in freshly spawned interpreters so earlier cases don't affect its time or memory peak
+
+    Args:
+        name (str): key of `cases.CASES`
+        scale_name (str): key of `synthetic.SCALES`
+        seed (int): seed of the generated data
+        rounds (int, optional): interpreters to run it in; the fastest is kept. Defaults to 1.
+
+    Returns:
+        dict[str, float]: what `cases.run_case()` returned
+    """
+    results = []
+    for _ in range(rounds):
+        with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as pool:
+            results.append(pool.submit(
+                c.run_case, name, scale_name, seed).result())
+    return max(results, key=lambda result: result["items_per_s"])
+
+
+def load_baseline(path: str = BASELINE_FILE) -> dict[str, dict[str, float]]:
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(results: dict[str, dict[str, float]], path: str = BASELINE_FILE) -> None:
+    """Merges `results` into the baseline file, keeping entries of cases and scales that weren't run"""
+    baseline = load_baseline(path)
+    baseline.update(results)
+    with open(path, "w") as handle:
+        json.dump(baseline, handle, indent=1, sort_keys=True)
+        handle.write("\n")
+
+
+def regressions(key: str, result: dict[str, float], baseline: dict[str, dict[str, float]],
+                tolerance: float = TOLERANCE) -> list[str]:
+    """Compares one result with its baseline entry
+
+    Args:
+        key (str): "[case]@[scale]"
+        result (dict[str, float]): what `cases.run_case()` returned
+        baseline (dict[str, dict[str, float]]): stored results by key
+        tolerance (float, optional): allowed relative change. Defaults to TOLERANCE.
+
+    Returns:
+        list[str]: a message per regression (empty if none or if there is no baseline entry)
+    """
+    previous = baseline.get(key)
+    if previous is None:
+        return []
+    found = []
+    if result["items_per_s"] < previous["items_per_s"] * (1 - tolerance):
+        found.append(f"{key}: {result["items_per_s"]:,.0f}/s, baseline {previous["items_per_s"]:,.0f}/s")
+    if result["added_mb"] > max(previous["added_mb"] * (1 + tolerance), MEMORY_SLACK_MB):
+        found.append(f"{key}: +{result["added_mb"]:.1f} MB, baseline +{previous["added_mb"]:.1f} MB")
+    return found
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("--scale", choices=[*s.SCALES, "all"], default="team")
+    parser.add_argument("--case", action="append", choices=list(c.CASES),
+                        help="run only this case (repeatable)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--rounds", type=int, default=1,
+                        help="run each case in this many fresh processes and keep the fastest (steadier on noisy machines)")
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    scale_names = list(s.SCALES) if args.scale == "all" else [args.scale]
+    baseline = load_baseline()
+    results = {}
+    found = []
+    missing = []
+    print(f"{"case":<32} {"items":>9} {"seconds":>9} {"items/s":>12} {"peak MB":>8} {"added MB":>9}  vs baseline")
+    for scale_name in scale_names:
+        for name in args.case or c.CASES:
+            key = f"{name}@{scale_name}"
+            result = run_isolated(name, scale_name, args.seed, args.rounds)
+            results[key] = result
+            previous = baseline.get(key)
+            change = f"{result["items_per_s"] / previous["items_per_s"] - 1:+.0%}" if previous else "-"
+            print(f"{key:<32} {result["items"]:>9,} {result["seconds"]:>9.3f} {result["items_per_s"]:>12,.0f} "
+                  f"{result["peak_mb"]:>8.0f} {result["added_mb"]:>9.1f}  {change}")
+            found += regressions(key, result, baseline, args.tolerance)
+            if previous is None:
+                missing.append(key)
+
+    if args.save_baseline:
+        save_baseline(results)
+        print(f"Saved {len(results)} results to {BASELINE_FILE}")
+        return 0
+    for message in found:
+        print(f"REGRESSION {message}")
+    for key in missing:
+        print(f"MISSING {key}: no baseline entry, record one with --save-baseline")
+    return 1 if found or missing else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""This module contains the benchmark cases and runs one of them in isolation"""
+
+import os
+import random
+import resource
+import tempfile
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+import pandas as pd
+import api_pull as a
+import database as d
+from benchmarks import synthetic as s
+
+# Cases are repeated until they have run this long, and the fastest run is kept
+MIN_SECONDS: float = 2.0
+MAX_REPEATS: int = 5000
+# Index lookups timed per run, at most
+MAX_LOOKUPS: int = 5000
+
+
+@dataclass
+class Case:
+    """A benchmark: `prepare` builds the inputs (untimed), `run` processes them and returns how many items it handled"""
+    name: str
+    unit: str
+    prepare: Callable[[random.Random, s.Scale, str], object]
+    run: Callable[[object], int]
+
+
+def prepare_players(rng: random.Random, scale: s.Scale, tmp_dir: str) -> list[a.PayloadStore]:
+    return [s.team_store(rng, scale, 8000000 + i * 100) for i in range(scale.team_seasons)]
+
+
+def run_players(stores: list[a.PayloadStore]) -> int:
+    rows = 0
+    for store in stores:
+        roster_df, _, _ = a.pull_all_player_data(store)
+        rows += len(roster_df)
+    return rows
+
+
+def prepare_games(rng: random.Random, scale: s.Scale, tmp_dir: str) -> tuple[a.PayloadStore, list[int]]:
+    return s.games_store(rng, scale)
+
+
+def run_games(inputs: tuple[a.PayloadStore, list[int]]) -> int:
+    """Same work as `pull_all_completed_games()` once the payloads are in the store"""
+    store, game_ids = inputs
+    a.completed_game_tables(game_ids, [], store)
+    return len(game_ids)
+
+
+def prepare_reformat_date(rng: random.Random, scale: s.Scale, tmp_dir: str) -> list[str]:
+    return s.birth_dates(rng, scale.players)
+
+
+def run_reformat_date(dates: list[str]) -> int:
+    for date in dates:
+        d.reformat_date(date)
+    return len(dates)
+
+
+def prepare_datestr_column(rng: random.Random, scale: s.Scale, tmp_dir: str) -> pd.DataFrame:
+    return s.game_dates(rng, scale.team_seasons * scale.games)
+
+
+def run_datestr_column(df: pd.DataFrame) -> int:
+    return len(d.update_datestr_column(df, "Date"))
+
+
+def prepare_load_file(rng: random.Random, scale: s.Scale, tmp_dir: str) -> tuple[str, str, int]:
+    rows = scale.team_seasons * scale.skaters
+    csv_path = os.path.join(tmp_dir, "skaters.csv")
+    s.skater_frame(rng, rows).to_csv(csv_path, index=False)
+    return csv_path, os.path.join(tmp_dir, "load_file.db"), rows
+
+
+def run_load_file(inputs: tuple[str, str, int]) -> int:
+    csv_path, db_path, rows = inputs
+    d.load_file(csv_path, "skaters", [], "replace", db_path)
+    return rows
+
+
+def prepare_season_db(rng: random.Random, scale: s.Scale, tmp_dir: str) -> tuple[str, list[str]]:
+    """A season database with `skaters` at scale and its lookup indexes, plus the names to look up"""
+    db_path = os.path.join(tmp_dir, "season.db")
+    df = s.skater_frame(rng, scale.team_seasons * scale.skaters)
+    d.load_dataframe(df, "skaters", "replace", db_path)
+    d.create_lookup_indexes(db_path)
+    names = list(df["name"])
+    return db_path, [rng.choice(names) for _ in range(min(len(names), MAX_LOOKUPS))]
+
+
+def run_fetch_all(inputs: tuple[str, list[str]]) -> int:
+    db_path, _ = inputs
+    return len(d.fetch_all("skaters", db_path))
+
+
+def run_fetch_one(inputs: tuple[str, list[str]]) -> int:
+    db_path, names = inputs
+    for name in names:
+        d.fetch_one("skaters", f"name = '{name}'", db_path)
+    return len(names)
+
+
+CASES: dict[str, Case] = {case.name: case for case in [
+    Case("pull_players", "players", prepare_players, run_players),
+    Case("pull_games", "games", prepare_games, run_games),
+    Case("reformat_date", "dates", prepare_reformat_date, run_reformat_date),
+    Case("update_datestr_column", "rows", prepare_datestr_column, run_datestr_column),
+    Case("load_file", "rows", prepare_load_file, run_load_file),
+    Case("fetch_all", "rows", prepare_season_db, run_fetch_all),
+    Case("fetch_one", "lookups", prepare_season_db, run_fetch_one),
+]}
+
+
+def peak_rss_mb() -> float:
+    """High-water mark of this process's resident memory"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_case(name: str, scale_name: str, seed: int = 0) -> dict[str, float]:
+    """Prepares and times one case. Meant to run in a fresh process so its memory peak is its own
+
+    Args:
+        name (str): key of `CASES`
+        scale_name (str): key of `synthetic.SCALES`
+        seed (int, optional): seed of the generated data. Defaults to 0.
+
+    Returns:
+        dict[str, float]: "items", "seconds" (fastest run), "items_per_s", "peak_mb" (process high-water
+        mark) and "added_mb" (how far the runs raised it above the prepared inputs)
+    """
+    case = CASES[name]
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        inputs = case.prepare(rng, s.SCALES[scale_name], tmp_dir)
+        before_mb = peak_rss_mb()
+        times = []
+        while not times or (sum(times) < MIN_SECONDS and len(times) < MAX_REPEATS):
+            start = time.perf_counter()
+            items = case.run(inputs)
+            times.append(time.perf_counter() - start)
+        d.close_connections()
+
+    seconds = min(times)
+    return {"items": items, "seconds": seconds, "items_per_s": items / seconds,
+            "peak_mb": peak_rss_mb(), "added_mb": peak_rss_mb() - before_mb}
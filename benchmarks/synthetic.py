@@ -0,0 +1,93 @@
+"""This module generates NHL API payloads and season tables shaped like the real ones, at any scale"""
+
+import datetime as dt
+import random
+from dataclasses import dataclass
+import pandas as pd
+import api_pull as a
+import stand_in_server as ss
+
+# Distinct game payloads generated; larger schedules reuse them under new game ids
+GAME_POOL_SIZE: int = 82
+
+
+@dataclass(frozen=True)
+class Scale:
+    """Size of the data a benchmark runs on"""
+    name: str
+    teams: int
+    seasons: int
+    skaters: int = 28
+    goalies: int = 3
+    games: int = 82
+
+    @property
+    def team_seasons(self) -> int:
+        return self.teams * self.seasons
+
+    @property
+    def players(self) -> int:
+        """Player rows across every team and season"""
+        return self.team_seasons * (self.skaters + self.goalies)
+
+    @property
+    def unique_games(self) -> int:
+        """Games across every season, each counted once although two teams play it"""
+        return max(self.team_seasons * self.games // 2, self.games)
+
+
+SCALES: dict[str, Scale] = {
+    "team": Scale("team", teams=1, seasons=1),
+    "league": Scale("league", teams=32, seasons=20),
+}
+
+
+def team_store(rng: random.Random, scale: Scale, first_player_id: int) -> a.PayloadStore:
+    """A `PayloadStore` already holding one team-season's club stats and player landings, so no request is made"""
+    store = a.PayloadStore()
+    club, landings = ss.synthetic_club(rng, first_player_id, scale.skaters, scale.goalies)
+    for player_id, landing in landings.items():
+        store.payloads[a.player_landing_url(player_id)] = landing
+    store.payloads[a.roster_api] = club
+    return store
+
+
+def games_store(rng: random.Random, scale: Scale) -> tuple[a.PayloadStore, list[int]]:
+    """A `PayloadStore` holding the three payloads of every game at `scale`
+
+    Returns:
+        tuple[a.PayloadStore, list[int]]: the store and the game ids it serves
+    """
+    start = dt.date(2024, 10, 8)
+    pool = [ss.synthetic_game(rng, 2024020001 + i, (start + dt.timedelta(days=2 * i)).isoformat())
+            for i in range(min(GAME_POOL_SIZE, scale.unique_games))]
+    store = a.PayloadStore()
+    game_ids = []
+    for i in range(scale.unique_games):
+        game_id = 2000020001 + i
+        for url, payload in zip(a.game_urls(game_id), pool[i % len(pool)]):
+            store.payloads[url] = payload
+        game_ids.append(game_id)
+    return store, game_ids
+
+
+def skater_frame(rng: random.Random, rows: int) -> pd.DataFrame:
+    """`skaters` table rows, as `pull_skaters()` builds them"""
+    store = team_store(rng, Scale("frame", 1, 1, skaters=28, goalies=0), 8470000)
+    template = a.pull_skaters(store)
+    df = pd.concat([template] * (rows // len(template) + 1),
+                   ignore_index=True).iloc[:rows].copy()
+    df["player_id"] = range(8400000, 8400000 + rows)
+    df["name"] = [f"First{i % 997} Last{i}" for i in range(rows)]
+    return df
+
+
+def game_dates(rng: random.Random, rows: int) -> pd.DataFrame:
+    """A `Date` column of timestamps, like a game log read from `.xlsx`"""
+    start = pd.Timestamp(2005, 10, 5)
+    return pd.DataFrame({"Date": [start + pd.Timedelta(days=rng.randint(0, 7300)) for _ in range(rows)]})
+
+
+def birth_dates(rng: random.Random, count: int) -> list[str]:
+    """API formatted birth dates (ex. "1985-09-17")"""
+    return [f"{rng.randint(1970, 2006)}-{rng.randint(1, 12):02}-{rng.randint(1, 28):02}" for _ in range(count)]
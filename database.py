@@ -1,12 +1,51 @@
 """This module contains functions for interacting with databases"""
 
+from __future__ import annotations
+import atexit
+import contextlib
+import datetime as dt
+import functools
+import hashlib
 import sqlite3 as sq
-import pandas as pd
+import threading
+import time
 import os
+import lazy_imports as li
+import metrics as mt
+
+# Only loaded once a DataFrame is read or written, keeping pandas off the GUI's startup path
+pd = li.lazy_import("pandas")
 
-conn: sq.Connection | None = None
-c: sq.Cursor | None = None
 active_db: str | None = None
+# Connection and cursor used by the decorated function running on each thread
+_local = threading.local()
+# Open connections keyed by (absolute db path, thread id)
+_pool: dict[tuple[str, int], "PooledConnection"] = {}
+_pool_lock = threading.Lock()
+# Compiled statements kept per connection, reused whenever the same SQL text is executed
+STATEMENT_CACHE_SIZE: int = 256
+# Lookup columns indexed by `create_lookup_indexes()` (`team` only exists in the league database)
+INDEXED_COLUMNS: dict[str, list[str]] = {
+    "skaters": ["player_id", "name", "team"],
+    "goalies": ["player_id", "name", "team"],
+    "roster": ["player_id", "name", "team"],
+    "games": ["date", "game_id", "team"],
+    "schedule": ["date", "game_id", "team"],
+    "game_goals": ["game_id", "scorer_id", "assist1_id", "assist2_id"],
+    "game_penalties": ["game_id"],
+    "game_stars": ["game_id", "player_id"],
+}
+# `games` columns that held stringified lists before goals, penalties and stars got their own tables
+LEGACY_EVENT_COLUMNS: list[str] = [
+    "goals", "opp_goals", "penalties", "opp_penalties", "stars"]
+# Stored in `PRAGMA user_version`; `migrate_schema()` applies every step above a database's version
+SCHEMA_VERSION: int = 1
+# Columns added by each schema step as (table, column, type). Step `i` upgrades version `i` to `i + 1`
+SCHEMA_MIGRATIONS: list[list[tuple[str, str, str]]] = [
+    [("schedule", "game_id", "INTEGER"), ("schedule", "game_state", "TEXT"),
+     ("games", "game_id", "INTEGER")],
+]
+FINAL_GAME_STATES: tuple[str, ...] = ("OFF", "FINAL")
 
 
 class FileTypeError(Exception):
@@ -21,33 +60,142 @@ class FileTypeError(Exception):
         return f"FileTypeError: {self.message}"
 
 
+class PooledConnection(sq.Connection):
+    """`sqlite3` connection that defers commits while a `transaction()` block is open\n
+    Lets the decorated functions keep committing their own writes when called on their own,
+    while joining the caller's transaction when they are part of a larger update.
+    """
+    held: bool = False
+
+    def commit(self) -> None:
+        if not self.held:
+            super().commit()
+
+
 def change_active_db(db_path: str) -> None:
-    """Changes `global active_db` to be used by `sqlite3.connect()`"""
+    """Changes `global active_db`. Kept for callers that read it; decorated functions don't use it"""
     global active_db
     active_db = db_path
 
 
+def get_connection(db_path: str) -> PooledConnection:
+    """Returns the calling thread's pooled connection to a database, opening it on first use\n
+    Connections are never shared between threads and stay open until `close_connections()`.
+    Databases are switched to WAL journaling so readers are never blocked by an update.
+
+    Args:
+        db_path (str): `[path]/[filename].db`
+
+    Returns:
+        PooledConnection: connection owned by the calling thread
+    """
+    key = (os.path.abspath(db_path), threading.get_ident())
+    with _pool_lock:
+        conn = _pool.get(key)
+        if conn is None:
+            _prune_dead_threads()
+            conn = sq.connect(db_path, check_same_thread=False,
+                              cached_statements=STATEMENT_CACHE_SIZE, factory=PooledConnection)
+            conn.execute("PRAGMA journal_mode=WAL")
+            _pool[key] = conn
+    return conn
+
+
+@contextlib.contextmanager
+def transaction(db_path: str):
+    """Runs every database call made for `db_path` on this thread inside the block as one transaction\n
+    Commits once on exit, or rolls everything back if the block raises. Nested blocks join the outer one.
+
+    Args:
+        db_path (str): `[path]/[filename].db`
+
+    Yields:
+        PooledConnection: the connection the transaction is open on
+    """
+    conn = get_connection(db_path)
+    if conn.held:
+        yield conn
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    conn.held = True
+    try:
+        yield conn
+    except BaseException:
+        conn.held = False
+        conn.rollback()
+        raise
+    conn.held = False
+    conn.commit()
+
+
+def _prune_dead_threads() -> None:
+    """Closes pooled connections whose owning thread has exited. Caller must hold `_pool_lock`"""
+    alive = {t.ident for t in threading.enumerate()}
+    for key in [key for key in _pool if key[1] not in alive]:
+        _pool.pop(key).close()
+
+
+def close_connections(db_path: str | None = None) -> None:
+    """Closes pooled connections. Registered to run at interpreter exit
+
+    Args:
+        db_path (str | None, optional): only close connections to this database. Defaults to None (all).
+    """
+    target = None if db_path is None else os.path.abspath(db_path)
+    with _pool_lock:
+        for key in [key for key in _pool if target in (None, key[0])]:
+            _pool.pop(key).close()
+
+
+atexit.register(close_connections)
+
+
 def connect_to_db(func):
     """Wrapper function for any function that needs to access the database.\n
-    Contains the `sqlite3` connection and cursor objects."""
-    def wrap(*args, **kwargs):
-        global conn, c
+    Provides the calling thread's pooled `sqlite3` connection and a fresh cursor.
+    Each outermost call is recorded in the `db_call` metric by function and table, with the rows
+    it returned plus the rows it and the decorated functions it called inserted, updated or deleted.
+    Nested calls (ex. `load_dataframe()` inside `sync_dataframe()`) aren't recorded on their own,
+    so a run's rows and time are only counted once."""
+    params = func.__code__.co_varnames[:func.__code__.co_argcount]
+    table_arg = params.index("table_name") if "table_name" in params else None
 
-        # Change database before cursor
-        if args[-1].endswith(".db"):
-            change_active_db(args[-1])
+    def wrap(*args, **kwargs):
+        # Resolved per call: a shared global would let another thread switch this call's database
+        if "db_path" in kwargs:
+            db_path = kwargs["db_path"]
+        elif args and isinstance(args[-1], str) and args[-1].endswith(".db"):
+            db_path = args[-1]
         else:
-            change_active_db("data/capitals.db")
+            db_path = "data/capitals.db"
 
         if not os.path.exists("data"):
             os.mkdir("data")
 
-        conn = sq.connect(active_db)
-        c = conn.cursor()
-        result = func(*args, **kwargs)
-        conn.close()
-
-        return result
+        conn = get_connection(db_path)
+        outer = (getattr(_local, "conn", None), getattr(_local, "c", None))
+        _local.conn, _local.c = conn, conn.cursor()
+        table_name = kwargs.get("table_name", "")
+        if table_arg is not None and len(args) > table_arg:
+            table_name = args[table_arg]
+        result = None
+        changes = conn.total_changes
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+            return result
+        finally:
+            if outer[0] is None:
+                rows = conn.total_changes - changes
+                if isinstance(result, list):
+                    rows += len(result)
+                elif isinstance(result, tuple):
+                    rows += 1
+                mt.record("db_call", {"function": func.__name__, "table": table_name},
+                          time.perf_counter() - start, rows=rows)
+            _local.c.close()
+            _local.conn, _local.c = outer
     return wrap
 
 
@@ -71,10 +219,10 @@ def create_table(table_name: str, columns: list[str] | dict[str, str], db_path:
         table_name = table_name.lower()
         if isinstance(columns, dict):
             to_list = [f"{k} {v}" for k, v in columns.items()]
-            c.execute(f"CREATE TABLE IF NOT EXISTS {
+            _local.c.execute(f"CREATE TABLE IF NOT EXISTS {
                       table_name} ({", ".join(to_list)})")
         elif isinstance(columns, list):
-            c.execute(f"CREATE TABLE IF NOT EXISTS {
+            _local.c.execute(f"CREATE TABLE IF NOT EXISTS {
                       table_name} ({", ".join(columns)})")
         else:
             raise TypeError("Columns must be of type 'dict' or 'list'")
@@ -99,8 +247,8 @@ def fetch_one(table_name: str, criteria: str, db_path: str = "data/capitals.db")
     """
     try:
         table_name = table_name.lower()
-        c.execute(f"SELECT * FROM {table_name} WHERE {criteria}")
-        row = c.fetchone()
+        _local.c.execute(f"SELECT * FROM {table_name} WHERE {criteria}")
+        row = _local.c.fetchone()
         return row
     except sq.OperationalError as e:
         print(f"ERROR: {e}")
@@ -131,8 +279,8 @@ def fetch_many(table_name: str, criteria: str, num_rows: int, db_path: str = "da
             raise ValueError("num_rows must be of type 'int'")
 
         table_name = table_name.lower()
-        c.execute(f"SELECT * FROM {table_name} WHERE {criteria}")
-        rows = c.fetchmany(num_rows)
+        _local.c.execute(f"SELECT * FROM {table_name} WHERE {criteria}")
+        rows = _local.c.fetchmany(num_rows)
         return rows
     except sq.OperationalError as e:
         print(f"ERROR: {e}")
@@ -155,13 +303,156 @@ def fetch_all(table_name: str, db_path: str = "data/capitals.db") -> list[tuple]
     """
     try:
         table_name = table_name.lower()
-        c.execute(f"SELECT * FROM {table_name}")
-        rows = c.fetchall()
+        _local.c.execute(f"SELECT * FROM {table_name}")
+        rows = _local.c.fetchall()
         return rows
     except sq.OperationalError as e:
         print(f"ERROR: {e}")
 
 
+def quote_identifier(name: str) -> str:
+    """Quotes a table or column name for use in SQL (e.g. `s/c` -> `"s/c"`)"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+@functools.lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def _select_sql(table_name: str, columns: tuple[str, ...]) -> str:
+    """Builds the parameterized `SELECT` for a table and a set of equality predicates\n
+    Identical lookups produce identical SQL text, so SQLite reuses the compiled statement.
+    """
+    sql = f"SELECT * FROM {quote_identifier(table_name)}"
+    if columns:
+        sql += " WHERE " + \
+            " AND ".join(f"{quote_identifier(col)} = ?" for col in columns)
+    return sql
+
+
+@connect_to_db
+def select_one(table_name: str, where: dict[str, str | int | float], db_path: str = "data/capitals.db") -> tuple | None:
+    """Fetches a single row matching every `column = value` pair, with values bound as parameters
+
+    Args:
+        table_name (str): table to be queried
+        where (dict[str, str | int | float]): dictionary of {`column: value`, ...} pairs (e.g. `{"name": "Tom Wilson"}`)
+        db_path (str, optional): `[path]/[filename].db`. Defaults to "data/capitals.db".
+
+    Returns:
+        tuple|None: returns a tuple of the row data if exists else `None`
+    """
+    try:
+        columns = tuple(where)
+        _local.c.execute(_select_sql(table_name.lower(), columns),
+                         tuple(where[col] for col in columns))
+        return _local.c.fetchone()
+    except sq.OperationalError as e:
+        print(f"ERROR: {e}")
+
+
+@connect_to_db
+def select_all(table_name: str, where: dict[str, str | int | float] | None = None, db_path: str = "data/capitals.db") -> list[tuple] | None:
+    """Fetches every row matching all `column = value` pairs, with values bound as parameters
+
+    Args:
+        table_name (str): table to be queried
+        where (dict[str, str | int | float] | None, optional): dictionary of {`column: value`, ...} pairs. Defaults to None (all rows).
+        db_path (str, optional): `[path]/[filename].db`. Defaults to "data/capitals.db".
+
+    Returns:
+        list[tuple]|None: returns a list of row tuples if table exists else `None`
+    """
+    try:
+        where = where or {}
+        columns = tuple(where)
+        _local.c.execute(_select_sql(table_name.lower(), columns),
+                         tuple(where[col] for col in columns))
+        return _local.c.fetchall()
+    except sq.OperationalError as e:
+        print(f"ERROR: {e}")
+
+
+@connect_to_db
+def fetch_columns(table_name: str, db_path: str = "data/capitals.db") -> list[str]:
+    """Lists the column names of a table in order
+
+    Args:
+        table_name (str): table to be described
+        db_path (str, optional): `[path]/[filename].db`. Defaults to "data/capitals.db".
+
+    Returns:
+        list[str]: column names (empty if the table doesn't exist)
+    """
+    return _table_columns(table_name)
+
+
+@connect_to_db
+def pending_game_ids(db_path: str = "data/capitals.db") -> list[int]:
+    """Lists the IDs of finished games on the schedule that aren't in the `games` table yet\n
+    A game on several clubs' schedules (in the league database) is listed once.
+
+    Args:
+        db_path (str, optional): `[path]/[filename].db`. Defaults to "data/capitals.db".
+
+    Returns:
+        list[int]: game IDs in schedule order (empty if the tables don't exist)
+    """
+    # Every finished game is pending until the first games have been loaded
+    not_loaded = "AND NOT EXISTS (SELECT 1 FROM games AS g WHERE g.game_id = s.game_id)" \
+        if _table_columns("games") else ""
+    try:
+        _local.c.execute(f"""SELECT s.game_id FROM schedule AS s
+            WHERE s.game_state IN ({", ".join("?" * len(FINAL_GAME_STATES))}) {not_loaded}
+            GROUP BY s.game_id ORDER BY MIN(s.date)""", FINAL_GAME_STATES)
+        return [row[0] for row in _local.c.fetchall()]
+    except sq.OperationalError as e:
+        print(f"ERROR: {e}")
+        return []
+
+
+@connect_to_db
+def legacy_event_game_ids(db_path: str = "data/capitals.db") -> list[int]:
+    """Lists the IDs of games whose goals, penalties and stars are still only in `LEGACY_EVENT_COLUMNS`
+
+    Args:
+        db_path (str, optional): `[path]/[filename].db`. Defaults to "data/capitals.db".
+
+    Returns:
+        list[int]: game IDs (empty if the `games` table doesn't exist)
+    """
+    if "stars" not in _table_columns("games"):
+        return []
+    try:
+        _local.c.execute(
+            "SELECT game_id FROM games WHERE game_id IS NOT NULL AND stars IS NOT NULL ORDER BY date")
+        return [row[0] for row in _local.c.fetchall()]
+    except sq.OperationalError as e:
+        print(f"ERROR: {e}")
+        return []
+
+
+@connect_to_db
+def loaded_games(db_path: str = "data/capitals.db") -> list[tuple[str, int | None, bool]]:
+    """Lists every row of the `games` table without writing, whatever schema version the database is at
+
+    Args:
+        db_path (str, optional): `[path]/[filename].db`. Defaults to "data/capitals.db".
+
+    Returns:
+        list[tuple[str, int | None, bool]]: `(date, game_id, has legacy events)` per game (empty if the table
+        doesn't exist). `game_id` is `None` on rows loaded before the column existed
+    """
+    existing = _table_columns("games")
+    if not existing:
+        return []
+    game_id = "game_id" if "game_id" in existing else "NULL"
+    legacy = "stars IS NOT NULL" if "stars" in existing else "0"
+    try:
+        _local.c.execute(f"SELECT date, {game_id}, {legacy} FROM games")
+        return [(date, game_id, bool(legacy)) for date, game_id, legacy in _local.c.fetchall()]
+    except sq.OperationalError as e:
+        print(f"ERROR: {e}")
+        return []
+
+
 # INSERT functions
 @connect_to_db
 def insert_row(table_name: str, row_data: tuple, db_path: str = "data/capitals.db") -> bool:
@@ -177,8 +468,8 @@ def insert_row(table_name: str, row_data: tuple, db_path: str = "data/capitals.d
     """
     try:
         table_name = table_name.lower()
-        c.execute(f"INSERT INTO {table_name} VALUES {row_data}")
-        conn.commit()
+        _local.c.execute(f"INSERT INTO {table_name} VALUES {row_data}")
+        _local.conn.commit()
         return True
     except sq.OperationalError as e:
         print(f"ERROR: {e}")
@@ -203,9 +494,9 @@ def insert_rows(table_name: str, rows_data: list[tuple], db_path: str = "data/ca
     try:
         table_name = table_name.lower()
         qmarks = len(rows_data[0])
-        c.executemany(f"INSERT INTO {table_name} VALUES ({
+        _local.c.executemany(f"INSERT INTO {table_name} VALUES ({
                       ", ".join(qmarks)})", rows_data)
-        conn.commit()
+        _local.conn.commit()
         return True
     except sq.OperationalError as e:
         print(f"ERROR: {e}")
@@ -237,9 +528,9 @@ def update_row(table_name: str, criteria: str, updates: dict[str, str | int | fl
                 updates_list.append(f"{col} = '{val}'")
             else:
                 updates_list.append(f"{col} = {val}")
-        c.execute(f"UPDATE {table_name} SET {
+        _local.c.execute(f"UPDATE {table_name} SET {
                   ", ".join(updates_list)} WHERE {criteria}")
-        conn.commit()
+        _local.conn.commit()
         return True
     except sq.OperationalError as e:
         print(f"ERROR: {e}")
@@ -261,8 +552,8 @@ def delete_row(table_name: str, criteria: str, db_path: str = "data/capitals.db"
     """
     try:
         table_name = table_name.lower()
-        c.execute(f"DELETE FROM {table_name} WHERE {criteria}")
-        conn.commit()
+        _local.c.execute(f"DELETE FROM {table_name} WHERE {criteria}")
+        _local.conn.commit()
         return True
     except sq.OperationalError as e:
         print(f"ERROR: {e}")
@@ -281,14 +572,121 @@ def drop_table(table_name: str, db_path: str = "data/capitals.db") -> bool:
         bool: `True` if successful else `False`
     """
     try:
-        c.execute(f"DROP TABLE IF EXISTS {table_name}")
-        conn.commit()
+        _local.c.execute(f"DROP TABLE IF EXISTS {table_name}")
+        _local.conn.commit()
         return True
     except sq.OperationalError as e:
         print(f"ERROR: {e}")
         return False
 
 
+# INDEX functions
+@connect_to_db
+def create_lookup_indexes(db_path: str = "data/capitals.db") -> bool:
+    """Creates the indexes in `INDEXED_COLUMNS` on every table of the database that has those columns\n
+    Tables rebuilt with `write_type="replace"` lose their indexes, so call this after loading.
+
+    Args:
+        db_path (str, optional): `[path]/[filename].db`. Defaults to "data/capitals.db".
+
+    Returns:
+        bool: `True` if successful else `False`
+    """
+    try:
+        for table_name, columns in INDEXED_COLUMNS.items():
+            existing = [row[1] for row in _local.c.execute(
+                f"PRAGMA table_info({quote_identifier(table_name)})")]
+            for col in columns:
+                if col not in existing:
+                    continue
+                _local.c.execute(f"CREATE INDEX IF NOT EXISTS {quote_identifier(f"idx_{table_name}_{col}")} "
+                                 f"ON {quote_identifier(table_name)} ({quote_identifier(col)})")
+        _local.conn.commit()
+        return True
+    except sq.OperationalError as e:
+        print(f"ERROR: {e}")
+        return False
+
+
+# SCHEMA functions
+@connect_to_db
+def migrate_schema(db_path: str = "data/capitals.db") -> int:
+    """Brings a database up to `SCHEMA_VERSION` by applying the pending `SCHEMA_MIGRATIONS`\n
+    Columns are only added to tables that already exist; tables created later get them from their first load.
+
+    Args:
+        db_path (str, optional): `[path]/[filename].db`. Defaults to "data/capitals.db".
+
+    Returns:
+        int: the database's schema version after migrating
+    """
+    version = _local.c.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return version
+    try:
+        for step in SCHEMA_MIGRATIONS[version:SCHEMA_VERSION]:
+            for table_name, col, col_type in step:
+                existing = _table_columns(table_name)
+                if existing and col not in existing:
+                    _local.c.execute(f"ALTER TABLE {quote_identifier(table_name)} "
+                                     f"ADD COLUMN {quote_identifier(col)} {col_type}")
+        _local.c.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        _local.conn.commit()
+        return SCHEMA_VERSION
+    except sq.OperationalError as e:
+        print(f"ERROR: {e}")
+        return version
+
+
+@connect_to_db
+def backfill_game_ids(db_path: str = "data/capitals.db") -> int:
+    """Copies schedule game IDs onto `games` rows loaded before the column existed, matching on date
+
+    Args:
+        db_path (str, optional): `[path]/[filename].db`. Defaults to "data/capitals.db".
+
+    Returns:
+        int: number of games updated
+    """
+    if not _table_columns("games"):
+        return 0
+    try:
+        _local.c.execute("""UPDATE games SET game_id = (
+            SELECT s.game_id FROM schedule AS s WHERE s.date = games.date)
+            WHERE game_id IS NULL AND EXISTS (
+            SELECT 1 FROM schedule AS s WHERE s.date = games.date AND s.game_id IS NOT NULL)""")
+        _local.conn.commit()
+        return _local.c.rowcount
+    except sq.OperationalError as e:
+        print(f"ERROR: {e}")
+        return 0
+
+
+@connect_to_db
+def clear_legacy_events(db_path: str = "data/capitals.db") -> int:
+    """Empties `LEGACY_EVENT_COLUMNS` on every game listed by `legacy_event_game_ids()`\n
+    Call this in the same transaction that saves those games' rows in the event tables.
+
+    Args:
+        db_path (str, optional): `[path]/[filename].db`. Defaults to "data/capitals.db".
+
+    Returns:
+        int: number of games cleared
+    """
+    if "stars" not in _table_columns("games"):
+        return 0
+    try:
+        set_cols = ", ".join(
+            f"{quote_identifier(col)} = NULL" for col in LEGACY_EVENT_COLUMNS)
+        _local.c.execute(
+            f"UPDATE games SET {set_cols} WHERE game_id IS NOT NULL AND stars IS NOT NULL")
+        _local.conn.commit()
+        return _local.c.rowcount
+    except sq.OperationalError as e:
+        print(f"ERROR: {e}")
+        return 0
+
+
 # LOAD functions
 def date_to_string(serial_date: pd.Timestamp) -> str:
     """Used for converting from `timestamp` to formatted string
@@ -360,8 +758,8 @@ def update_date_column(df: pd.DataFrame) -> pd.Series:
         pd.Series: list of new column values to be added to dataframe
     """
     new_vals = []
-    for dt in df["Date"]:
-        new_vals.append(dt.date())
+    for stamp in df["Date"]:
+        new_vals.append(stamp.date())
     return new_vals
 
 
@@ -379,6 +777,14 @@ def load_file(file_to_load: str, table_name: str, drop_columns: list[str], write
     Raises:
         FileTypeError: raised when trying to use a file format other than `.xlsx` or `.csv`
     """
+    with mt.timer("load_file", table=table_name) as measurement:
+        _load_file(file_to_load, table_name, drop_columns,
+                   write_type, db_path, measurement)
+
+
+def _load_file(file_to_load: str, table_name: str, drop_columns: list[str], write_type: str, db_path: str,
+               measurement: mt.Measurement) -> None:
+    """Body of `load_file()`, filling in the file size and rows written as it goes"""
     # read the file
     try:
         if file_to_load.endswith(".xlsx"):
@@ -393,6 +799,7 @@ def load_file(file_to_load: str, table_name: str, drop_columns: list[str], write
     except Exception as e:
         print(f"ERROR: {e}")
         return
+    measurement.bytes = os.path.getsize(file_to_load)
 
     # drop columns
     if isinstance(drop_columns, list) and len(drop_columns) >= 1:
@@ -414,9 +821,199 @@ def load_file(file_to_load: str, table_name: str, drop_columns: list[str], write
         df["Start_Time"] = pd.Series(times)
 
     # write to db
+    measurement.rows = load_dataframe(df, table_name, write_type, db_path)
+
+
+def sqlite_type(dtype) -> str:
+    """Maps a pandas dtype to the SQLite column type used when creating tables
+
+    Args:
+        dtype: dtype of a DataFrame column
+
+    Returns:
+        str: "INTEGER", "REAL", "TIMESTAMP" or "TEXT"
+    """
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "TIMESTAMP"
+    return "TEXT"
+
+
+def to_sql_value(val):
+    """Converts a DataFrame cell to a value `sqlite3` can bind\n
+    Lists and dicts are stored as their `str()` form, matching what a `.csv` round-trip produced.
+    """
+    if val is None:
+        return None
+    if isinstance(val, (list, tuple, dict)):
+        return str(val)
+    if isinstance(val, pd.Timestamp):
+        return str(val)
+    if isinstance(val, (dt.date, dt.time)):
+        return val.isoformat()
+    if pd.isna(val):
+        return None
+    if hasattr(val, "item"):
+        # numpy scalar -> python scalar
+        val = val.item()
+    if isinstance(val, bool):
+        return int(val)
+    return val
+
+
+def dataframe_rows(df: pd.DataFrame) -> list[tuple]:
+    """Converts every row of a DataFrame to a tuple of bindable values"""
+    return [tuple(to_sql_value(val) for val in row) for row in df.itertuples(index=False, name=None)]
+
+
+@connect_to_db
+def load_dataframe(df: pd.DataFrame, table_name: str, write_type: str = "replace", db_path: str = "data/capitals.db") -> int:
+    """Writes a DataFrame straight into a database table with `executemany` in a single transaction
+
+    Args:
+        df (pd.DataFrame): rows to be written. column names become table columns
+        table_name (str): table to add data to. will be created if not exists
+        write_type (str, optional): "replace", "append", "fail". Defaults to "replace".
+        db_path (str, optional): `[path]/[filename].db`. Defaults to "data/capitals.db".
+
+    Returns:
+        int: number of rows written
+    """
     if write_type not in ("fail", "replace", "append"):
         write_type = "replace"
-    df.to_sql(table_name, conn, if_exists=write_type, index=False)
+
+    table = quote_identifier(table_name)
+    columns = [quote_identifier(str(col)) for col in df.columns]
+    # Join the caller's transaction if one is open, otherwise make this write atomic on its own
+    owns_transaction = not _local.conn.in_transaction
+    try:
+        if owns_transaction:
+            _local.c.execute("BEGIN")
+        exists = _local.c.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone() is not None
+        if exists and write_type == "fail":
+            raise ValueError(f"Table '{table_name}' already exists.")
+
+        if exists and write_type == "replace":
+            _local.c.execute(f"DROP TABLE {table}")
+            exists = False
+
+        if not exists:
+            col_defs = [f"{col} {sqlite_type(dtype)}" for col,
+                        dtype in zip(columns, df.dtypes)]
+            _local.c.execute(f"CREATE TABLE {table} ({", ".join(col_defs)})")
+
+        rows = dataframe_rows(df)
+        _local.c.executemany(f"INSERT INTO {table} ({", ".join(columns)}) VALUES ({
+            ", ".join("?" * len(columns))})", rows)
+        if owns_transaction:
+            _local.conn.commit()
+        return len(rows)
+    except (sq.OperationalError, sq.IntegrityError, ValueError) as e:
+        if not owns_transaction:
+            raise
+        _local.conn.rollback()
+        print(f"ERROR: {e}")
+        return 0
+
+
+def row_hash(row: tuple) -> str:
+    """Hashes a row of bindable values so stored and incoming rows can be compared cheaply\n
+    Numbers are hashed as floats so `5` read back from a REAL column matches an incoming `5.0`.
+    """
+    normalized = tuple(float(val) if isinstance(val, (int, float)) and not isinstance(val, bool) else val
+                       for val in row)
+    return hashlib.blake2b(repr(normalized).encode(), digest_size=16).hexdigest()
+
+
+def _table_columns(table_name: str) -> list[str]:
+    """Lists the columns of a table on the current connection (empty if the table doesn't exist)"""
+    return [row[1] for row in _local.c.execute(f"PRAGMA table_info({quote_identifier(table_name)})")]
+
+
+@connect_to_db
+def sync_dataframe(df: pd.DataFrame, table_name: str, key_columns: list[str], db_path: str = "data/capitals.db") -> dict[str, int]:
+    """Upserts a DataFrame into a table, writing only the rows that changed\n
+    Rows are matched on `key_columns` and compared by `row_hash()`. Stored rows whose key is
+    no longer in `df` are deleted, so the table ends up with the same contents as a replace.
+    If `df` repeats a key only its last row is kept.
+
+    Args:
+        df (pd.DataFrame): the complete, current contents of the table
+        table_name (str): table to sync. will be created if not exists
+        key_columns (list[str]): columns that identify a row (e.g. `["player_id"]`)
+        db_path (str, optional): `[path]/[filename].db`. Defaults to "data/capitals.db".
+
+    Returns:
+        dict[str, int]: counts of "inserted", "updated", "unchanged" and "deleted" rows
+    """
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+    # A repeated key would be inserted twice and leave the stored hashes out of step with the table
+    df = df.drop_duplicates(subset=key_columns, keep="last")
+    existing_cols = _table_columns(table_name)
+    if not existing_cols:
+        counts["inserted"] = load_dataframe(
+            df, table_name, "replace", db_path)
+        return counts
+
+    table = quote_identifier(table_name)
+    columns = [str(col) for col in df.columns]
+    key_idx = [columns.index(col) for col in key_columns]
+    select_cols = ", ".join(quote_identifier(col) for col in columns)
+    key_where = " AND ".join(
+        f"{quote_identifier(col)} = ?" for col in key_columns)
+
+    owns_transaction = not _local.conn.in_transaction
+    try:
+        if owns_transaction:
+            _local.c.execute("BEGIN")
+        for col, dtype in zip(columns, df.dtypes):
+            if col not in existing_cols:
+                _local.c.execute(
+                    f"ALTER TABLE {table} ADD COLUMN {quote_identifier(col)} {sqlite_type(dtype)}")
+
+        stored = {}
+        for row in _local.c.execute(f"SELECT {select_cols} FROM {table}").fetchall():
+            stored[tuple(row[i] for i in key_idx)] = row_hash(row)
+
+        inserts, updates = [], []
+        for row in dataframe_rows(df):
+            key = tuple(row[i] for i in key_idx)
+            old_hash = stored.pop(key, None)
+            if old_hash is None:
+                inserts.append(row)
+            elif old_hash != row_hash(row):
+                updates.append(row + key)
+            else:
+                counts["unchanged"] += 1
+
+        if inserts:
+            _local.c.executemany(f"INSERT INTO {table} ({select_cols}) VALUES ({
+                ", ".join("?" * len(columns))})", inserts)
+        if updates:
+            set_cols = ", ".join(
+                f"{quote_identifier(col)} = ?" for col in columns)
+            _local.c.executemany(
+                f"UPDATE {table} SET {set_cols} WHERE {key_where}", updates)
+        if stored:
+            _local.c.executemany(
+                f"DELETE FROM {table} WHERE {key_where}", list(stored))
+        if owns_transaction:
+            _local.conn.commit()
+
+        counts["inserted"] = len(inserts)
+        counts["updated"] = len(updates)
+        counts["deleted"] = len(stored)
+        return counts
+    except (sq.OperationalError, sq.IntegrityError, ValueError) as e:
+        if not owns_transaction:
+            raise
+        _local.conn.rollback()
+        print(f"ERROR: {e}")
+        return counts
 
 
 if __name__ == '__main__':
@@ -1,25 +1,212 @@
+"""This module keeps `assets/headshots` in sync with the headshot URLs stored in the rosters"""
+
+import hashlib
+import json
 import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests as r
+import api_client as ac
 import database as d
 
-if __name__ == '__main__':
-    roster = d.fetch_all("roster", "data/stats_2425.db")
-    for p in roster:
-        name = p[2].replace(" ", "_").lower() + ".png"
-        headshot = p[1]
+HEADSHOT_DIR: str = "assets/headshots"
+MANIFEST_NAME: str = "manifest.json"
+MAX_WORKERS: int = 16
+
+
+def headshot_file_name(name: str) -> str:
+    """File a player's headshot is saved as, the name the windows load it by (ex. "alex_ovechkin.png")"""
+    return name.replace(" ", "_").lower() + ".png"
+
+
+def load_manifest(headshot_dir: str = HEADSHOT_DIR) -> dict:
+    """Reads the manifest of a headshot folder
+
+    Args:
+        headshot_dir (str, optional): folder of the headshots. Defaults to HEADSHOT_DIR.
+
+    Returns:
+        dict: `{"files": {file_name: {"url", "etag", "last_modified", "sha256"}}}` (empty if there is none yet)
+    """
+    try:
+        with open(os.path.join(headshot_dir, MANIFEST_NAME)) as handle:
+            return json.load(handle)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"files": {}}
+
+
+def write_atomic(path: str, content: bytes) -> None:
+    """Writes a file through a temporary name so readers never see a partial image"""
+    partial = f"{path}.{threading.get_ident()}.tmp"
+    with open(partial, "wb") as handle:
+        handle.write(content)
+    os.replace(partial, path)
+
+
+def link_atomic(source: str, path: str) -> None:
+    """Hard links `source` to `path` through a temporary name
+
+    Raises:
+        OSError: the file system doesn't support hard links (the caller writes a copy instead)
+    """
+    partial = f"{path}.{threading.get_ident()}.tmp"
+    os.link(source, partial)
+    os.replace(partial, path)
+
+
+def save_manifest(manifest: dict, headshot_dir: str = HEADSHOT_DIR) -> None:
+    write_atomic(os.path.join(headshot_dir, MANIFEST_NAME),
+                 json.dumps(manifest, indent=1, sort_keys=True).encode())
 
-        files = os.listdir("assets/headshots")
-        if name in files:
-            continue
 
-        with open(f"assets/headshots/{name}", 'wb') as handle:
-            response = r.get(headshot, stream=True)
+def fetch_headshot(url: str, entry: dict | None) -> r.Response:
+    """Requests a headshot, conditionally if it has been downloaded before
 
-            if not response.ok:
-                print(response)
+    Args:
+        url (str): headshot URL from the roster
+        entry (dict | None): the file's manifest entry, if any
 
-            for block in response.iter_content(1024):
-                if not block:
-                    break
+    Returns:
+        r.Response: `304` if the stored copy is still current, else the image
+    """
+    headers = {}
+    if entry is not None and entry.get("url") == url:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    return ac.get(url, headers)
 
-                handle.write(block)
+
+def sync_headshots(players: list[tuple[str, str]], headshot_dir: str = HEADSHOT_DIR, max_workers: int = MAX_WORKERS,
+                   revalidate: bool = False) -> dict[str, int]:
+    """Downloads the headshots that are missing or whose URL changed, several at a time\n
+    Files are written atomically and recorded in the folder's manifest with their source URL,
+    validators and SHA-256. Each URL is requested at most once: players sharing one (ex. the
+    placeholder silhouette) and URLs already downloaded under another name are hard linked to the
+    file on disk without a request. An image whose bytes are already on disk under another name is
+    also linked instead of written again.
+
+    Args:
+        players (list[tuple[str, str]]): `(name, headshot URL)` pairs
+        headshot_dir (str, optional): folder of the headshots. Defaults to HEADSHOT_DIR.
+        max_workers (int, optional): maximum concurrent downloads. Defaults to MAX_WORKERS.
+        revalidate (bool, optional): also re-check current files with conditional requests. Defaults to False.
+
+    Returns:
+        dict[str, int]: counts of "downloaded", "linked", "unchanged", "skipped" and "failed" headshots
+    """
+    os.makedirs(headshot_dir, exist_ok=True)
+    manifest = load_manifest(headshot_dir)
+    entries = manifest.setdefault("files", {})
+    on_disk = set(os.listdir(headshot_dir))
+    counts = {"downloaded": 0, "linked": 0,
+              "unchanged": 0, "skipped": 0, "failed": 0}
+    lock = threading.Lock()
+    # Content hash -> a file that already holds those bytes
+    blobs = {entry["sha256"]: file_name for file_name, entry in entries.items()
+             if file_name in on_disk and entry.get("sha256")}
+    # Source URL -> a file already downloaded from it
+    sources = {entry["url"]: file_name for file_name, entry in entries.items()
+               if file_name in on_disk and entry.get("url")}
+
+    to_fetch = {}
+    for name, url in players:
+        file_name = headshot_file_name(name)
+        entry = entries.get(file_name)
+        current = file_name in on_disk and (entry is None or entry.get("url") == url)
+        if current and not revalidate:
+            counts["skipped"] += 1
+        else:
+            to_fetch[file_name] = url
+    by_url: dict[str, list[str]] = {}
+    for file_name, url in to_fetch.items():
+        by_url.setdefault(url, []).append(file_name)
+
+    def place(source: str, file_name: str) -> str:
+        path = os.path.join(headshot_dir, file_name)
+        try:
+            link_atomic(os.path.join(headshot_dir, source), path)
+        except OSError:
+            with open(os.path.join(headshot_dir, source), "rb") as handle:
+                write_atomic(path, handle.read())
+        with lock:
+            entries[file_name] = dict(entries[source])
+        return "linked"
+
+    def sync_one(file_name: str, url: str) -> str:
+        entry = entries.get(file_name) if file_name in on_disk else None
+        try:
+            response = fetch_headshot(url, entry)
+            if response.status_code == 304:
+                return "unchanged"
+            response.raise_for_status()
+        except r.RequestException as e:
+            print(f"ERROR: {file_name}: {e}")
+            return "failed"
+
+        digest = hashlib.sha256(response.content).hexdigest()
+        path = os.path.join(headshot_dir, file_name)
+        new_entry = {"url": url, "etag": response.headers.get("ETag"),
+                     "last_modified": response.headers.get("Last-Modified"), "sha256": digest}
+        with lock:
+            source = blobs.get(digest)
+            if entry is not None and entry.get("sha256") == digest:
+                entries[file_name] = new_entry
+                return "unchanged"
+        status = "downloaded"
+        if source is not None and source != file_name:
+            try:
+                link_atomic(os.path.join(headshot_dir, source), path)
+                status = "linked"
+            except OSError:
+                write_atomic(path, response.content)
+        else:
+            write_atomic(path, response.content)
+        with lock:
+            blobs.setdefault(digest, file_name)
+            entries[file_name] = new_entry
+        return status
+
+    def sync_url(url: str, file_names: list[str]) -> list[str]:
+        source = sources.get(url)
+        if source is not None and not revalidate:
+            return [place(source, file_name) for file_name in file_names]
+        # Revalidate through the file that was downloaded from this URL, if it is one of them
+        primary = source if source in file_names else file_names[0]
+        status = sync_one(primary, url)
+        if status == "failed" or primary not in entries:
+            return [status] * len(file_names)
+        statuses = [status]
+        for file_name in file_names:
+            if file_name == primary:
+                continue
+            if file_name in on_disk and entries.get(file_name, {}).get("sha256") == entries[primary].get("sha256"):
+                with lock:
+                    entries[file_name] = dict(entries[primary])
+                statuses.append("unchanged")
+            else:
+                statuses.append(place(primary, file_name))
+        return statuses
+
+    if by_url:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(by_url))) as pool:
+            for statuses in pool.map(lambda item: sync_url(*item), by_url.items()):
+                for status in statuses:
+                    counts[status] += 1
+    save_manifest(manifest, headshot_dir)
+    return counts
+
+
+def roster_headshots(db_path: str = "data/stats_2425.db") -> list[tuple[str, str]]:
+    """Lists the `(name, headshot URL)` of every player on a season's roster"""
+    return [(player[2], player[1]) for player in d.fetch_all("roster", db_path) or []]
+
+
+if __name__ == '__main__':
+    db_path = sys.argv[1] if len(sys.argv) > 1 else "data/stats_2425.db"
+    start = time.perf_counter()
+    counts = sync_headshots(roster_headshots(db_path))
+    print(f"{counts} in {time.perf_counter() - start:.2f}s")
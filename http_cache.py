@@ -0,0 +1,278 @@
+"""This module contains a persistent, size-bounded cache for NHL API responses"""
+
+import atexit
+import json
+import os
+import re
+import sqlite3 as sq
+import threading
+import time
+import zlib
+import api_client as ac
+import metrics as mt
+
+CACHE_DB: str = "cache/http_cache.db"
+# Least recently used responses are evicted once the stored bodies exceed this size
+MAX_CACHE_BYTES: int = 64 * 1024 * 1024
+DEFAULT_TTL: int = 5 * 60
+# Seconds a response is served without revalidation. First matching pattern wins
+TTL_POLICIES: list[tuple[str, int]] = [
+    (r"/gamecenter/\d+/(landing|boxscore)$", 60),
+    (r"/wsc/game-story/\d+$", 60),
+    (r"/score/\d{4}-\d{2}-\d{2}$", 10 * 60),
+    (r"/club-schedule-season/", 60 * 60),
+    (r"/club-stats/", 15 * 60),
+    (r"/player/\d+/landing$", 15 * 60),
+]
+# Endpoints whose payload never changes again once the game is over
+IMMUTABLE_WHEN_FINAL: list[str] = [
+    r"/gamecenter/\d+/(landing|boxscore)$",
+    r"/wsc/game-story/\d+$",
+]
+FINAL_GAME_STATES: tuple[str, ...] = ("OFF", "FINAL")
+# Cache hits are written back in batches: once this many are pending or the oldest is this many seconds old
+TOUCH_BATCH_SIZE: int = 64
+TOUCH_FLUSH_SECONDS: float = 5.0
+
+
+def ttl_for(url: str) -> int:
+    """Looks up how long a response may be served without revalidation
+
+    Args:
+        url (str): full URL of the API endpoint
+
+    Returns:
+        int: time to live in seconds
+    """
+    for pattern, ttl in TTL_POLICIES:
+        if re.search(pattern, url):
+            return ttl
+    return DEFAULT_TTL
+
+
+def is_immutable(url: str, payload: dict) -> bool:
+    """Checks if a response can be cached forever (e.g. the boxscore of a finished game)
+
+    Args:
+        url (str): full URL of the API endpoint
+        payload (dict): the decoded JSON payload
+
+    Returns:
+        bool: `True` if the payload will never change else `False`
+    """
+    if not any(re.search(pattern, url) for pattern in IMMUTABLE_WHEN_FINAL):
+        return False
+    return payload.get("gameState") in FINAL_GAME_STATES
+
+
+class HttpCache:
+    """Class for caching API responses on disk\n
+    Bodies are stored zlib-compressed and keyed by URL. Expired entries are revalidated
+    with `If-None-Match`/`If-Modified-Since` so unchanged resources only cost a `304`.
+    The stored size is kept as a running total so a write only evicts when over budget, and
+    the access times of cache hits are written back in batches.
+    """
+
+    def __init__(self, db_path: str = CACHE_DB, max_bytes: int = MAX_CACHE_BYTES) -> None:
+        folder = os.path.dirname(db_path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sq.connect(db_path, check_same_thread=False)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+            url TEXT PRIMARY KEY, body BLOB, size INTEGER, etag TEXT, last_modified TEXT,
+            fetched_at REAL, last_access REAL, immutable INTEGER)""")
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)")
+        self.conn.commit()
+        self.total_bytes = self.stored_bytes()
+        # URL -> (last access, fetched at if revalidated) not written yet
+        self.pending_touches: dict[str, tuple[float, float | None]] = {}
+        self.oldest_touch: float | None = None
+        atexit.register(self.flush)
+
+    def stored_bytes(self) -> int:
+        """Sums the stored body sizes (a full scan, only run at startup and when evicting)"""
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def lookup(self, url: str) -> tuple | None:
+        """Fetches the cache entry for `url`
+
+        Args:
+            url (str): full URL of the API endpoint
+
+        Returns:
+            tuple|None: `(body, etag, last_modified, fetched_at, immutable)` if cached else `None`
+        """
+        with self.lock:
+            entry = self.conn.execute(
+                "SELECT body, etag, last_modified, fetched_at, immutable FROM responses WHERE url = ?",
+                (url,)).fetchone()
+            pending = self.pending_touches.get(url)
+        # A revalidation not written back yet still counts
+        if entry is not None and pending is not None and pending[1] is not None:
+            entry = entry[:3] + (pending[1],) + entry[4:]
+        return entry
+
+    def touch(self, url: str, revalidated: bool = False) -> None:
+        """Marks an entry as recently used (and freshly validated if `revalidated`)\n
+        The change is queued and written with the next batch (see `flush()`).
+        """
+        now = time.time()
+        with self.lock:
+            previous = self.pending_touches.get(url)
+            fetched_at = now if revalidated else previous[1] if previous else None
+            self.pending_touches[url] = (now, fetched_at)
+            if self.oldest_touch is None:
+                self.oldest_touch = now
+            due = len(self.pending_touches) >= TOUCH_BATCH_SIZE or now - self.oldest_touch >= TOUCH_FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the queued access and revalidation times in one transaction"""
+        with self.lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        """Body of `flush()`. Caller must hold `lock`"""
+        if not self.pending_touches:
+            return
+        self.conn.executemany(
+            "UPDATE responses SET last_access = ?, fetched_at = COALESCE(?, fetched_at) WHERE url = ?",
+            [(last_access, fetched_at, url) for url, (last_access, fetched_at) in self.pending_touches.items()])
+        self.conn.commit()
+        self.pending_touches.clear()
+        self.oldest_touch = None
+
+    def store(self, url: str, content: bytes, etag: str | None, last_modified: str | None, immutable: bool) -> None:
+        """Saves a response body and its validators, then evicts old entries if over budget"""
+        body = zlib.compress(content)
+        now = time.time()
+        with self.lock:
+            previous = self.conn.execute(
+                "SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                              (url, body, len(body), etag, last_modified, now, now, int(immutable)))
+            self.conn.commit()
+            self.pending_touches.pop(url, None)
+            self.total_bytes += len(body) - (previous[0] if previous else 0)
+            over_budget = self.total_bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def evict(self) -> int:
+        """Deletes least recently used entries until the cache fits in `max_bytes`\n
+        The running total is re-read first, in case another process shares the cache file.
+
+        Returns:
+            int: number of entries deleted
+        """
+        with self.lock:
+            self._flush()
+            total = self.total_bytes = self.stored_bytes()
+            if total <= self.max_bytes:
+                return 0
+
+            to_delete = []
+            for url, size in self.conn.execute("SELECT url, size FROM responses ORDER BY last_access"):
+                if total <= self.max_bytes:
+                    break
+                to_delete.append((url,))
+                total -= size
+            self.conn.executemany(
+                "DELETE FROM responses WHERE url = ?", to_delete)
+            self.conn.commit()
+            self.total_bytes = total
+            return len(to_delete)
+
+    def close(self) -> None:
+        """Writes the queued access times and closes the cache database"""
+        self.flush()
+        atexit.unregister(self.flush)
+        self.conn.close()
+
+    def clear(self) -> None:
+        """Deletes every cached response"""
+        with self.lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+            self.pending_touches.clear()
+            self.oldest_touch = None
+            self.total_bytes = 0
+
+    def get_json(self, url: str) -> dict:
+        """Returns the decoded JSON body for `url`, from the cache when possible
+
+        Args:
+            url (str): full URL of the API endpoint
+
+        Returns:
+            dict: the decoded JSON payload
+        """
+        start = time.perf_counter()
+        source, size = "network", 0
+        try:
+            entry = self.lookup(url)
+            headers = {}
+            if entry is not None:
+                body, etag, last_modified, fetched_at, immutable = entry
+                if immutable or time.time() - fetched_at < ttl_for(url):
+                    self.touch(url)
+                    source, size = "cache", len(body)
+                    return json.loads(zlib.decompress(body))
+                if etag:
+                    headers["If-None-Match"] = etag
+                if last_modified:
+                    headers["If-Modified-Since"] = last_modified
+
+            response = ac.get(url, headers)
+            if response.status_code == 304:
+                if entry is not None:
+                    self.touch(url, revalidated=True)
+                    source, size = "revalidated", len(entry[0])
+                    return json.loads(zlib.decompress(entry[0]))
+                # Nothing to serve the 304 from (ex. the entry was evicted meanwhile): fetch it in full
+                response = ac.get(url)
+
+            response.raise_for_status()
+            size = len(response.content)
+            payload = response.json()
+            self.store(url, response.content, response.headers.get("ETag"),
+                       response.headers.get("Last-Modified"), is_immutable(url, payload))
+            return payload
+        finally:
+            # Bytes are as stored: compressed for cache hits, as sent for downloads
+            mt.record("http_request", {"endpoint": mt.endpoint_template(url), "source": source},
+                      time.perf_counter() - start, bytes=size)
+
+
+_cache: HttpCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> HttpCache:
+    """Returns the shared `HttpCache`, creating it on first use"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = HttpCache()
+        return _cache
+
+
+def get_json(url: str) -> dict:
+    """Returns the decoded JSON body for `url` through the shared cache
+
+    Args:
+        url (str): full URL of the API endpoint
+
+    Returns:
+        dict: the decoded JSON payload
+    """
+    return get_cache().get_json(url)
+
+
+if __name__ == '__main__':
+    ...
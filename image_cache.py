@@ -0,0 +1,129 @@
+"""This module contains a cache of pre-scaled headshots and team logos"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QImage, QPixmap
+
+THUMBNAIL_DIR: str = "cache/thumbnails"
+# Least recently used pixmaps are dropped once the decoded images exceed this size
+MAX_PIXMAP_BYTES: int = 32 * 1024 * 1024
+
+
+def thumbnail_path(image_path: str, width: int, thumbnail_dir: str = THUMBNAIL_DIR) -> str:
+    """Maps a source image and target width to its file in the on-disk thumbnail cache
+
+    Args:
+        image_path (str): path of the full-size image (ex. "assets/team_logos/WSH.png")
+        width (int): target width in pixels
+        thumbnail_dir (str, optional): root folder of the thumbnails. Defaults to THUMBNAIL_DIR.
+
+    Returns:
+        str: `[thumbnail_dir]/[width]/[hash of the source path].png`
+    """
+    digest = hashlib.sha1(os.path.abspath(
+        image_path).encode()).hexdigest()
+    return os.path.join(thumbnail_dir, str(width), f"{digest}.png")
+
+
+class PixmapCache:
+    """Class for handing out pixmaps already scaled to the width they are shown at\n
+    Scaled pixmaps are kept in memory up to `max_bytes`, and written to `thumbnail_dir` so a
+    source image is decoded and resampled once, then only the small thumbnail is read.
+    """
+
+    def __init__(self, max_bytes: int = MAX_PIXMAP_BYTES, thumbnail_dir: str = THUMBNAIL_DIR) -> None:
+        self.max_bytes = max_bytes
+        self.thumbnail_dir = thumbnail_dir
+        self.pixmaps: OrderedDict[tuple[str, int], QPixmap] = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, image_path: str, width: int) -> QPixmap:
+        """Returns `image_path` scaled to `width`
+
+        Args:
+            image_path (str): path of the full-size image
+            width (int): target width in pixels
+
+        Returns:
+            QPixmap: the scaled image (null if the file doesn't exist)
+        """
+        key = (image_path, width)
+        with self.lock:
+            pixmap = self.pixmaps.get(key)
+            if pixmap is not None:
+                self.pixmaps.move_to_end(key)
+                return pixmap
+
+        pixmap = QPixmap.fromImage(self.load_scaled(image_path, width))
+        with self.lock:
+            if key not in self.pixmaps:
+                self.pixmaps[key] = pixmap
+                self.size += pixmap_bytes(pixmap)
+            self.evict()
+        return pixmap
+
+    def load_scaled(self, image_path: str, width: int) -> QImage:
+        """Reads a scaled image from the thumbnail cache, creating the thumbnail if it is missing or stale"""
+        if not os.path.exists(image_path):
+            return QImage()
+
+        thumbnail = thumbnail_path(image_path, width, self.thumbnail_dir)
+        if os.path.exists(thumbnail) and os.path.getmtime(thumbnail) >= os.path.getmtime(image_path):
+            image = QImage(thumbnail)
+            if not image.isNull():
+                return image
+
+        image = QImage(image_path)
+        if image.isNull():
+            return image
+        image = image.scaledToWidth(
+            width, Qt.TransformationMode.SmoothTransformation)
+        os.makedirs(os.path.dirname(thumbnail), exist_ok=True)
+        # Write next to the final name first so a crash never leaves a truncated thumbnail
+        partial = f"{thumbnail}.{threading.get_ident()}.tmp"
+        if image.save(partial, "PNG"):
+            os.replace(partial, thumbnail)
+        return image
+
+    def evict(self) -> None:
+        """Drops least recently used pixmaps until the cache fits in `max_bytes` (call with the lock held)"""
+        while self.size > self.max_bytes and len(self.pixmaps) > 1:
+            _, pixmap = self.pixmaps.popitem(last=False)
+            self.size -= pixmap_bytes(pixmap)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.pixmaps.clear()
+            self.size = 0
+
+
+def pixmap_bytes(pixmap: QPixmap) -> int:
+    """Approximate memory used by a decoded pixmap"""
+    return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+
+_cache: PixmapCache | None = None
+
+
+def scaled_pixmap(image_path: str, width: int) -> QPixmap:
+    """Returns `image_path` scaled to `width` through the shared `PixmapCache`
+
+    Args:
+        image_path (str): path of the full-size image (ex. "assets/team_logos/WSH.png")
+        width (int): target width in pixels
+
+    Returns:
+        QPixmap: the scaled image (null if the file doesn't exist)
+    """
+    global _cache
+    if _cache is None:
+        _cache = PixmapCache()
+    return _cache.get(image_path, width)
+
+
+if __name__ == '__main__':
+    ...
@@ -0,0 +1,99 @@
+"""This module contains helpers for keeping heavy imports (pandas, requests) off the startup path
+
+Usage:
+    python lazy_imports.py app     # import-time report for `app`, checked against STARTUP_IMPORT_BUDGET_MS
+"""
+
+import importlib
+import importlib.util
+import subprocess
+import sys
+import threading
+from types import ModuleType
+
+# Modules the GUI only needs once an update runs or data is loaded
+WARM_UP_MODULES: list[str] = ["pandas", "requests", "api_pull"]
+# Cumulative import time allowed for `app` before the first window can be shown
+STARTUP_IMPORT_BUDGET_MS: float = 400.0
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Returns a module that is only executed when one of its attributes is first used\n
+    Modules that annotate with it (ex. `df: pd.DataFrame`) need `from __future__ import annotations`.
+
+    Args:
+        name (str): absolute module name (ex. "pandas")
+
+    Returns:
+        ModuleType: the module, or a lazy stand-in registered in `sys.modules` until first use
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def warm_up(modules: list[str] = WARM_UP_MODULES) -> threading.Thread:
+    """Imports modules on a daemon thread so they are loaded before they are needed
+
+    Args:
+        modules (list[str], optional): module names, imported in order. Defaults to WARM_UP_MODULES.
+
+    Returns:
+        threading.Thread: the started thread
+    """
+    def run() -> None:
+        for name in modules:
+            # dir() touches the module, which executes it if it was lazily imported
+            dir(importlib.import_module(name))
+
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def import_report(module: str, top: int = 15) -> tuple[float, list[tuple[float, str]]]:
+    """Imports a module in a fresh interpreter with `-X importtime` and collects its slowest imports
+
+    Args:
+        module (str): module to import (ex. "app")
+        top (int, optional): number of slowest imports returned. Defaults to 15.
+
+    Returns:
+        tuple[float, list[tuple[float, str]]]: total milliseconds, and `(cumulative ms, name)` of the slowest imports
+
+    Raises:
+        ImportError: the module failed to import, with the child interpreter's error output
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=False)
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        raise ImportError(f"import {module} failed:\n" + "\n".join(errors), name=module)
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        timings.append((int(cumulative) / 1000, name.rstrip()))
+    total = next((ms for ms, name in timings if name.strip() == module), 0.0)
+    # Only top-level entries: nested imports are already counted in their parent's cumulative time
+    top_level = sorted(((ms, name.strip()) for ms, name in timings if not name[1:].startswith(" ")),
+                       reverse=True)
+    return total, top_level[:top]
+
+
+if __name__ == '__main__':
+    module = sys.argv[1] if len(sys.argv) > 1 else "app"
+    total, slowest = import_report(module)
+    for ms, name in slowest:
+        print(f"{ms:9.1f} ms  {name}")
+    status = "OK" if total <= STARTUP_IMPORT_BUDGET_MS else "OVER BUDGET"
+    print(f"import {module}: {total:.1f} ms of {STARTUP_IMPORT_BUDGET_MS:.0f} ms budget ({status})")
+    sys.exit(0 if total <= STARTUP_IMPORT_BUDGET_MS else 1)
@@ -0,0 +1,244 @@
+"""This module contains an in-process registry of timings and counters for API requests and database calls"""
+
+import contextlib
+import contextvars
+import os
+import re
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+METRICS_DIR: str = "metrics"
+# Prefix of every metric name in the Prometheus dump
+NAMESPACE: str = "caps_stats"
+# URL path segments replaced by placeholders so requests group by endpoint. First matching pattern wins
+ENDPOINT_PLACEHOLDERS: list[tuple[str, str]] = [
+    (r"^\d{4}-\d{2}-\d{2}$", "{date}"),
+    (r"^\d+$", "{id}"),
+]
+# `(source, run)` registries of the `collect()` blocks open in the current thread or task.
+# Worker threads only see them when started through `carry_context()`
+_open_runs: contextvars.ContextVar[tuple[tuple["MetricsRegistry", "MetricsRegistry"], ...]] = \
+    contextvars.ContextVar("open_runs", default=())
+
+
+@dataclass
+class Metric:
+    """Totals of every recorded call with the same name and labels"""
+    count: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    bytes: int = 0
+    rows: int = 0
+
+
+@dataclass
+class Measurement:
+    """Sizes filled in by the block being timed by `MetricsRegistry.timer()`"""
+    bytes: int = 0
+    rows: int = 0
+
+
+def endpoint_template(url: str) -> str:
+    """Groups a URL under its endpoint (ex. ".../v1/gamecenter/2024020001/boxscore" -> "/gamecenter/{id}/boxscore")"""
+    segments = urlsplit(url).path.split("/")
+    # Drop the API version prefix (ex. "/v1")
+    if len(segments) > 1 and re.fullmatch(r"v\d+", segments[1]):
+        segments.pop(1)
+    for i, segment in enumerate(segments):
+        for pattern, placeholder in ENDPOINT_PLACEHOLDERS:
+            if re.match(pattern, segment):
+                segments[i] = placeholder
+                break
+    return "/".join(segments)
+
+
+class MetricsRegistry:
+    """Class for collecting call counts, durations, bytes and rows, keyed by metric name and labels\n
+    Thread-safe; recording only takes a lock around a few additions.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.metrics: dict[tuple[str, tuple[tuple[str, str], ...]], Metric] = {}
+
+    def record(self, name: str, labels: dict[str, str], seconds: float, bytes: int = 0, rows: int = 0) -> None:
+        """Adds one call to a metric
+
+        Args:
+            name (str): metric name (ex. "http_request")
+            labels (dict[str, str]): what the call was (ex. `{"endpoint": "/player/{id}/landing"}`)
+            seconds (float): duration of the call
+            bytes (int, optional): bytes read or written. Defaults to 0.
+            rows (int, optional): rows read or written. Defaults to 0.
+        """
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self.lock:
+            metric = self.metrics.get(key)
+            if metric is None:
+                metric = self.metrics[key] = Metric()
+            metric.count += 1
+            metric.seconds += seconds
+            metric.max_seconds = max(metric.max_seconds, seconds)
+            metric.bytes += bytes
+            metric.rows += rows
+        for source, run in _open_runs.get():
+            if source is self:
+                run.record(name, labels, seconds, bytes, rows)
+
+    @contextlib.contextmanager
+    def collect(self):
+        """Also records the calls made while the block runs into a fresh registry\n
+        Only calls from this thread, and from workers it starts through `carry_context()`, are collected,
+        so a run reports its own metrics without resetting the totals or picking up other threads' calls.
+
+        Yields:
+            MetricsRegistry: the calls recorded during the block
+        """
+        run = MetricsRegistry()
+        token = _open_runs.set(_open_runs.get() + ((self, run),))
+        try:
+            yield run
+        finally:
+            _open_runs.reset(token)
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels: str):
+        """Times the block and records it, even if it raises
+
+        Args:
+            name (str): metric name
+            **labels (str): labels of the call
+
+        Yields:
+            Measurement: set its `bytes` and `rows` inside the block
+        """
+        measurement = Measurement()
+        start = time.perf_counter()
+        try:
+            yield measurement
+        finally:
+            self.record(name, labels, time.perf_counter() - start,
+                        measurement.bytes, measurement.rows)
+
+    def snapshot(self) -> dict[tuple[str, tuple[tuple[str, str], ...]], Metric]:
+        """Copy of every metric, safe to read while calls keep being recorded"""
+        with self.lock:
+            return {key: Metric(**vars(metric)) for key, metric in self.metrics.items()}
+
+    def reset(self) -> None:
+        with self.lock:
+            self.metrics.clear()
+
+    def summary(self) -> str:
+        """Formats every metric as a table, slowest total first
+
+        Returns:
+            str: one line per metric and label set with calls, total/mean/max ms, bytes and rows
+        """
+        lines = [f"{"metric":<56} {"calls":>7} {"total ms":>10} {"mean ms":>9} {"max ms":>9} {"bytes":>12} {"rows":>9}"]
+        ranked = sorted(self.snapshot().items(),
+                        key=lambda item: item[1].seconds, reverse=True)
+        for (name, labels), metric in ranked:
+            label = ",".join(value for _, value in labels)
+            lines.append(f"{f"{name}[{label}]":<56} {metric.count:>7} {metric.seconds * 1000:>10.1f} "
+                         f"{metric.seconds * 1000 / metric.count:>9.2f} {metric.max_seconds * 1000:>9.2f} "
+                         f"{metric.bytes:>12} {metric.rows:>9}")
+        return "\n".join(lines)
+
+    def prometheus(self) -> str:
+        """Formats every metric in the Prometheus text exposition format
+
+        Returns:
+            str: `[NAMESPACE]_[name]_{calls,seconds,bytes,rows}_total` counters and a `_seconds_max` gauge per metric
+        """
+        # (suffix, type, help, field of `Metric`)
+        series = [("calls_total", "counter", "Number of calls", "count"),
+                  ("seconds_total", "counter", "Time spent in calls", "seconds"),
+                  ("seconds_max", "gauge", "Slowest single call", "max_seconds"),
+                  ("bytes_total", "counter", "Bytes read or written", "bytes"),
+                  ("rows_total", "counter", "Rows read or written", "rows")]
+        by_name: dict[str, list] = {}
+        for (name, labels), metric in sorted(self.snapshot().items()):
+            by_name.setdefault(name, []).append((labels, metric))
+
+        lines = []
+        for name, entries in by_name.items():
+            for suffix, kind, description, field_name in series:
+                full_name = f"{NAMESPACE}_{name}_{suffix}"
+                lines.append(f"# HELP {full_name} {description} ({name})")
+                lines.append(f"# TYPE {full_name} {kind}")
+                for labels, metric in entries:
+                    label_text = ",".join(f'{k}="{escape_label(v)}"' for k, v in labels)
+                    if label_text:
+                        label_text = f"{{{label_text}}}"
+                    lines.append(f"{full_name}{label_text} {getattr(metric, field_name)}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """Writes `prometheus()` to a file (ex. for the node exporter's textfile collector)"""
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        partial = f"{path}.tmp"
+        with open(partial, "w") as handle:
+            handle.write(self.prometheus())
+        os.replace(partial, path)
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+registry = MetricsRegistry()
+
+
+def record(name: str, labels: dict[str, str], seconds: float, bytes: int = 0, rows: int = 0) -> None:
+    """Adds one call to a metric of the shared registry (see `MetricsRegistry.record()`)"""
+    registry.record(name, labels, seconds, bytes, rows)
+
+
+def timer(name: str, **labels: str):
+    """Times a block into the shared registry (see `MetricsRegistry.timer()`)"""
+    return registry.timer(name, **labels)
+
+
+def carry_context(fn: Callable) -> Callable:
+    """Wraps `fn` to run in a copy of the caller's context, so the calls it records from a pool's worker threads
+    count toward the caller's `collect()` blocks
+
+    Args:
+        fn (Callable): function handed to the pool (ex. `pool.submit(carry_context(get_json), url)`)
+
+    Returns:
+        Callable: `fn` with the same arguments and return value
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # A context can only be entered by one thread at a time, so every call gets its own copy
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+def dump_run(run_name: str, metrics_dir: str = METRICS_DIR, source: MetricsRegistry | None = None) -> str:
+    """Writes a registry to `[metrics_dir]/[run_name].prom` and returns its summary table
+
+    Args:
+        run_name (str): name of the run (ex. "bulk_update")
+        metrics_dir (str, optional): folder of the dumps. Defaults to METRICS_DIR.
+        source (MetricsRegistry | None, optional): registry to write, ex. one from `collect()`. Defaults to None
+            (the shared registry).
+
+    Returns:
+        str: `MetricsRegistry.summary()`
+    """
+    source = source or registry
+    source.write_prometheus(os.path.join(metrics_dir, f"{run_name}.prom"))
+    return source.summary()
+
+
+if __name__ == '__main__':
+    ...
@@ -0,0 +1,158 @@
+"""This module contains a query layer that sees every season database through one connection"""
+
+from __future__ import annotations
+import os
+import pathlib
+import re
+import sqlite3 as sq
+import threading
+import database as d
+import lazy_imports as li
+
+pd = li.lazy_import("pandas")
+
+DATA_DIR: str = "data"
+SEASON_DB_PATTERN: re.Pattern = re.compile(r"^stats_(\d{2})(\d{2})\.db$")
+TEAM_STATS_DB: str = "team_stats.db"
+# Tables of the `stats_YYYY.db` files exposed as UNION ALL views with a leading `season` column
+SEASON_TABLES: list[str] = ["skaters", "goalies", "roster", "games",
+                            "schedule", "game_goals", "game_penalties", "game_stars"]
+
+
+def season_databases(data_dir: str = DATA_DIR) -> dict[int, str]:
+    """Finds the season databases in a folder
+
+    Args:
+        data_dir (str, optional): folder to search. Defaults to DATA_DIR.
+
+    Returns:
+        dict[int, str]: paths keyed by season in the `team_stats.db` format (ex. 20242025), oldest first
+    """
+    seasons = {}
+    for file_name in os.listdir(data_dir):
+        match = SEASON_DB_PATTERN.match(file_name)
+        if match:
+            start, end = match.groups()
+            seasons[int(f"20{start}20{end}")] = os.path.join(
+                data_dir, file_name)
+    return dict(sorted(seasons.items()))
+
+
+def season_schema(season: int) -> str:
+    """Name a season database is attached under (ex. 20242025 -> "s2425")"""
+    return f"s{str(season)[2:4]}{str(season)[6:8]}"
+
+
+class MultiSeasonDatabase:
+    """Class for running one SQL statement across every season\n
+    Each `stats_YYYY.db` is ATTACHed read-only next to `team_stats.db`, and every table in
+    `SEASON_TABLES` gets a TEMP view of the same name that UNION ALLs the seasons with a `season`
+    column, so career totals are a plain `GROUP BY`:
+
+        SELECT name, SUM(g) FROM skaters GROUP BY player_id ORDER BY 2 DESC
+
+    Columns missing from older seasons read as NULL. Only the newest seasons are attached if
+    there are more files than SQLite's `SQLITE_LIMIT_ATTACHED` allows.
+    """
+
+    def __init__(self, data_dir: str = DATA_DIR) -> None:
+        self.data_dir = data_dir
+        self.lock = threading.Lock()
+        self.conn = sq.connect(
+            ":memory:", check_same_thread=False, uri=True)
+        self.seasons: dict[int, str] = {}
+        self.views: dict[str, list[str]] = {}
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Re-attaches the season databases and rebuilds the views, picking up added or removed files"""
+        with self.lock:
+            self.detach_all()
+            seasons = season_databases(self.data_dir)
+            team_stats = os.path.join(self.data_dir, TEAM_STATS_DB)
+            slots = len(seasons) + os.path.exists(team_stats)
+            # Raises the limit up to SQLite's compile-time maximum; getlimit reports what was granted
+            self.conn.setlimit(sq.SQLITE_LIMIT_ATTACHED, slots)
+            max_attached = self.conn.getlimit(sq.SQLITE_LIMIT_ATTACHED)
+            if slots > max_attached:
+                print(f"ERROR: only {max_attached} databases can be attached, "
+                      f"skipping the {slots - max_attached} oldest seasons")
+                seasons = dict(list(seasons.items())[slots - max_attached:])
+
+            if os.path.exists(team_stats):
+                self.attach(team_stats, "team_stats")
+            for season, db_path in seasons.items():
+                self.attach(db_path, season_schema(season))
+            self.seasons = seasons
+            self.build_views()
+
+    def attach(self, db_path: str, schema: str) -> None:
+        uri = f"{pathlib.Path(db_path).resolve().as_uri()}?mode=ro"
+        self.conn.execute(
+            f"ATTACH DATABASE ? AS {d.quote_identifier(schema)}", (uri,))
+
+    def detach_all(self) -> None:
+        for view in self.views:
+            self.conn.execute(
+                f"DROP VIEW IF EXISTS temp.{d.quote_identifier(view)}")
+        self.views = {}
+        for _, schema, _ in self.conn.execute("PRAGMA database_list").fetchall():
+            if schema not in ("main", "temp"):
+                self.conn.execute(
+                    f"DETACH DATABASE {d.quote_identifier(schema)}")
+
+    def build_views(self) -> None:
+        """Creates one TEMP view per table in `SEASON_TABLES` over every season that has it"""
+        for table_name in SEASON_TABLES:
+            season_columns = {}
+            for season in self.seasons:
+                schema = d.quote_identifier(season_schema(season))
+                columns = [row[1] for row in self.conn.execute(
+                    f"PRAGMA {schema}.table_info({d.quote_identifier(table_name)})")]
+                if columns:
+                    season_columns[season] = columns
+            if not season_columns:
+                continue
+
+            # Union of every season's columns, in first-seen order
+            all_columns = list(dict.fromkeys(
+                col for columns in season_columns.values() for col in columns))
+            selects = []
+            for season, columns in season_columns.items():
+                select_cols = ", ".join(d.quote_identifier(col) if col in columns
+                                        else f"NULL AS {d.quote_identifier(col)}" for col in all_columns)
+                selects.append(f"SELECT {season} AS season, {select_cols} FROM "
+                               f"{d.quote_identifier(season_schema(season))}.{d.quote_identifier(table_name)}")
+            self.conn.execute(f"CREATE TEMP VIEW {d.quote_identifier(table_name)} AS "
+                              f"{" UNION ALL ".join(selects)}")
+            self.views[table_name] = ["season"] + all_columns
+
+    def query(self, sql: str, params: tuple | dict = ()) -> list[tuple] | None:
+        """Runs a read-only statement against the season views
+
+        Args:
+            sql (str): SQL statement (ex. "SELECT season, SUM(g) FROM skaters GROUP BY season")
+            params (tuple | dict, optional): values bound to the statement's placeholders. Defaults to ().
+
+        Returns:
+            list[tuple]|None: returns the result rows if the statement ran else `None`
+        """
+        try:
+            with self.lock:
+                return self.conn.execute(sql, params).fetchall()
+        except sq.OperationalError as e:
+            print(f"ERROR: {e}")
+
+    def query_df(self, sql: str, params: tuple | dict = ()) -> pd.DataFrame:
+        """Runs a read-only statement against the season views and returns the result as a DataFrame"""
+        with self.lock:
+            return pd.read_sql_query(sql, self.conn, params=params)
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+
+if __name__ == '__main__':
+    db = MultiSeasonDatabase()
+    print(db.query("SELECT season, COUNT(*), SUM(g) FROM skaters GROUP BY season"))
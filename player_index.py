@@ -0,0 +1,195 @@
+"""This module contains a fuzzy search index of player names across every season database"""
+
+import heapq
+import sys
+import threading
+import time
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass, field
+import database as d
+import season_catalog as sc
+
+# Tables whose players are indexed
+INDEXED_TABLES: list[str] = ["skaters", "goalies"]
+# Queries shorter than a trigram are answered from the prefix index
+MAX_PREFIX_LENGTH: int = 2
+# Matches sharing less than this share of trigrams with the query are dropped
+MIN_SCORE: float = 0.34
+
+
+@dataclass
+class PlayerEntry:
+    """A player found in one of `INDEXED_TABLES`, with the seasons they appear in (newest first)"""
+    name: str
+    table_name: str
+    player_id: int | None
+    key: str
+    seasons: list[str] = field(default_factory=list)
+
+
+def normalize(name: str) -> str:
+    """Folds a name for matching: accents removed, lower case, punctuation as spaces (ex. "Tim Stützle" -> "tim stutzle")"""
+    folded = unicodedata.normalize("NFKD", name)
+    folded = "".join(c for c in folded if not unicodedata.combining(c)).lower()
+    return " ".join("".join(c if c.isalnum() else " " for c in folded).split())
+
+
+def trigrams(key: str) -> set[str]:
+    """Trigrams of every word of a normalized name, padded so word starts and ends count (ex. " ov", "ovi", ...)"""
+    grams = set()
+    for word in key.split():
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class PlayerIndex:
+    """Class for answering as-you-type player searches over all seasons\n
+    Names are read from the season databases once and indexed by trigram and by short word
+    prefix, so a keystroke only merges a few posting lists. `refresh()` re-reads only the
+    seasons the catalog reports as changed.
+    """
+
+    def __init__(self, catalog: sc.SeasonCatalog) -> None:
+        self.catalog = catalog
+        self.lock = threading.Lock()
+        # db path -> (SeasonInfo it was read from, [(table, player_id, name)])
+        self.season_names: dict[str, tuple[sc.SeasonInfo, list[tuple[str, int | None, str]]]] = {}
+        self.entries: list[PlayerEntry] = []
+        self.grams: list[set[str]] = []
+        self.trigram_postings: dict[str, list[int]] = {}
+        self.prefix_postings: dict[str, list[int]] = {}
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """Rebuilds the index if any season was added, removed or updated
+
+        Returns:
+            bool: `True` if the index was rebuilt else `False`
+        """
+        season_names = {}
+        changed = False
+        for label in self.catalog.labels():
+            info = self.catalog.get(label)
+            if info is None:
+                continue
+            cached = self.season_names.get(info.db_path)
+            if cached is not None and cached[0] == info:
+                season_names[info.db_path] = cached
+            else:
+                season_names[info.db_path] = (info, read_player_names(info.db_path))
+                changed = True
+        changed = changed or season_names.keys() != self.season_names.keys()
+        if changed:
+            self.build(season_names)
+        return changed
+
+    def build(self, season_names: dict[str, tuple[sc.SeasonInfo, list[tuple[str, int | None, str]]]]) -> None:
+        """Merges every season's players into one entry per player and table, then builds the postings\n
+        Players are matched by `player_id`, so a player whose name is spelled differently between
+        seasons is still one entry, under their newest name. Rows without an id fall back to the name.
+        """
+        entries: dict[tuple[str, int | str], PlayerEntry] = {}
+        # Catalog order is newest first, so each entry's name and seasons come from the newest season
+        for info, names in season_names.values():
+            for table_name, player_id, name in names:
+                player_key = (table_name, player_id if player_id is not None else name)
+                entry = entries.get(player_key)
+                if entry is None:
+                    entry = entries[player_key] = PlayerEntry(
+                        name, table_name, player_id, normalize(name))
+                if info.label not in entry.seasons:
+                    entry.seasons.append(info.label)
+
+        entry_list = sorted(entries.values(), key=lambda e: e.key)
+        grams = [trigrams(entry.key) for entry in entry_list]
+        trigram_postings: dict[str, list[int]] = {}
+        prefix_postings: dict[str, list[int]] = {}
+        for i, entry in enumerate(entry_list):
+            for gram in grams[i]:
+                trigram_postings.setdefault(gram, []).append(i)
+            prefixes = {word[:n] for word in entry.key.split()
+                        for n in range(1, MAX_PREFIX_LENGTH + 1)}
+            for prefix in prefixes:
+                prefix_postings.setdefault(prefix, []).append(i)
+
+        with self.lock:
+            self.season_names = season_names
+            self.entries = entry_list
+            self.grams = grams
+            self.trigram_postings = trigram_postings
+            self.prefix_postings = prefix_postings
+
+    def search(self, text: str, table_name: str | None = None, limit: int = 50) -> list[PlayerEntry]:
+        """Finds the players whose names best match what has been typed so far
+
+        Args:
+            text (str): partial or misspelled name (ex. "ovec", "backstrom", "stutz")
+            table_name (str | None, optional): only return players of this table (ex. "goalies"). Defaults to None (all).
+            limit (int, optional): maximum number of matches. Defaults to 50.
+
+        Returns:
+            list[PlayerEntry]: matches, best first
+        """
+        query = normalize(text)
+        if not query:
+            return []
+
+        with self.lock:
+            entries = self.entries
+            if len(query) <= MAX_PREFIX_LENGTH:
+                candidates = dict.fromkeys(self.prefix_postings.get(query, []), 1.0)
+            else:
+                query_grams = trigrams(query)
+                hits = Counter()
+                for gram in query_grams:
+                    hits.update(self.trigram_postings.get(gram, []))
+                candidates = {}
+                for i, shared in hits.items():
+                    # Share of the query found in the name, lightly penalised by the name's extra trigrams
+                    score = shared / len(query_grams) - 0.1 * (1 - shared / len(self.grams[i]))
+                    if score >= MIN_SCORE:
+                        candidates[i] = score
+
+        ranked = []
+        for i, score in candidates.items():
+            entry = entries[i]
+            if table_name is not None and entry.table_name != table_name:
+                continue
+            # Names that start with what was typed rank above fuzzy matches
+            if entry.key.startswith(query):
+                score += 2
+            elif f" {query}" in f" {entry.key}":
+                score += 1
+            ranked.append((-score, entry.key, i))
+        return [entries[i] for _, _, i in heapq.nsmallest(limit, ranked)]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def read_player_names(db_path: str) -> list[tuple[str, int | None, str]]:
+    """Reads the `(table, player_id, name)` of every player in a season database's `INDEXED_TABLES`"""
+    names = []
+    for table_name in INDEXED_TABLES:
+        columns = d.fetch_columns(table_name, db_path)
+        if "name" not in columns:
+            continue
+        name_col = columns.index("name")
+        id_col = columns.index("player_id") if "player_id" in columns else None
+        for row in d.fetch_all(table_name, db_path) or []:
+            if row[name_col]:
+                names.append((table_name, row[id_col] if id_col is not None else None, row[name_col]))
+    return names
+
+
+if __name__ == '__main__':
+    index = PlayerIndex(sc.SeasonCatalog())
+    for text in sys.argv[1:] or ["ovechkin"]:
+        start = time.perf_counter()
+        matches = index.search(text, limit=10)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{text!r}: {len(matches)} matches of {len(index)} players in {elapsed:.3f} ms")
+        for entry in matches:
+            print(f"    {entry.name} ({entry.table_name}: {', '.join(entry.seasons)})")
@@ -0,0 +1,115 @@
+"""This module contains the registry of season databases shared by every window"""
+
+import datetime as dt
+import os
+import pathlib
+import sqlite3 as sq
+import threading
+from dataclasses import dataclass
+import database as d
+import multi_season as m
+
+
+@dataclass(frozen=True)
+class SeasonInfo:
+    """Metadata of a single `stats_YYYY.db`"""
+    season: int
+    label: str
+    db_path: str
+    updated_at: dt.datetime
+    schema_version: int
+    row_counts: dict[str, int]
+
+
+def file_signature(db_path: str) -> tuple[float, ...]:
+    """Modification times of a database and its WAL file, which change on every committed write"""
+    return tuple(os.path.getmtime(path) for path in (db_path, f"{db_path}-wal") if os.path.exists(path))
+
+
+def read_season_info(season: int, db_path: str) -> SeasonInfo:
+    """Reads the metadata of a season database without taking a write lock
+
+    Args:
+        season (int): season in the `team_stats.db` format (ex. 20242025)
+        db_path (str): `[path]/stats_YYYY.db`
+
+    Returns:
+        SeasonInfo: label, last update time, `PRAGMA user_version` and row count per table in `SEASON_TABLES`
+    """
+    row_counts = {}
+    schema_version = 0
+    try:
+        conn = sq.connect(
+            f"{pathlib.Path(db_path).resolve().as_uri()}?mode=ro", uri=True)
+        try:
+            schema_version = conn.execute("PRAGMA user_version").fetchone()[0]
+            tables = {row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for table_name in m.SEASON_TABLES:
+                if table_name in tables:
+                    row_counts[table_name] = conn.execute(
+                        f"SELECT COUNT(*) FROM {d.quote_identifier(table_name)}").fetchone()[0]
+        finally:
+            conn.close()
+    except sq.OperationalError as e:
+        print(f"ERROR: {e}")
+
+    label = f"{str(season)[:4]}-{str(season)[4:]}"
+    updated_at = dt.datetime.fromtimestamp(max(file_signature(db_path)))
+    return SeasonInfo(season, label, db_path, updated_at, schema_version, row_counts)
+
+
+class SeasonCatalog:
+    """Class for keeping one list of the available seasons for the whole app\n
+    Built once at startup; `refresh()` rescans the folder and only re-reads databases whose files changed.
+    """
+
+    def __init__(self, data_dir: str = m.DATA_DIR) -> None:
+        self.data_dir = data_dir
+        self.lock = threading.Lock()
+        self.seasons: dict[str, SeasonInfo] = {}
+        self.signatures: dict[str, tuple[float, ...]] = {}
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """Rescans the data folder for added, removed or updated season databases
+
+        Returns:
+            bool: `True` if anything changed else `False`
+        """
+        seasons = {}
+        signatures = {}
+        # Newest season first
+        for season, db_path in reversed(m.season_databases(self.data_dir).items()):
+            signature = file_signature(db_path)
+            previous = next((info for info in self.seasons.values()
+                             if info.db_path == db_path), None)
+            if previous is not None and self.signatures.get(db_path) == signature:
+                info = previous
+            else:
+                info = read_season_info(season, db_path)
+            seasons[info.label] = info
+            signatures[db_path] = signature
+
+        with self.lock:
+            changed = seasons != self.seasons
+            self.seasons = seasons
+            self.signatures = signatures
+        return changed
+
+    def labels(self) -> list[str]:
+        """Season labels for display (ex. "2024-2025"), newest first"""
+        with self.lock:
+            return list(self.seasons)
+
+    def get(self, label: str) -> SeasonInfo | None:
+        with self.lock:
+            return self.seasons.get(label)
+
+    def __len__(self) -> int:
+        return len(self.seasons)
+
+
+if __name__ == '__main__':
+    for info in SeasonCatalog().seasons.values():
+        print(info)
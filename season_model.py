@@ -0,0 +1,118 @@
+"""This module contains an in-memory copy of a season's tables for the GUI"""
+
+import os
+import threading
+import database as d
+
+# Tables loaded into a model and the columns each one is keyed by
+MODEL_KEYS: dict[str, list[str]] = {
+    "skaters": ["player_id", "name"],
+    "goalies": ["player_id", "name"],
+    "roster": ["player_id", "name"],
+    "games": ["date", "game_id"],
+    "schedule": ["date", "game_id"],
+}
+# Event tables grouped by game, in stored order
+EVENT_TABLES: list[str] = ["game_goals", "game_penalties", "game_stars"]
+
+
+class SeasonModel:
+    """Class for holding every row of a season database in memory\n
+    Rows are the same tuples `database.fetch_all()` returns. Each table in `MODEL_KEYS` is
+    indexed by its key columns, so lookups by player_id, name or date are a dict hit.
+    """
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        self.tables: dict[str, list[tuple]] = {}
+        self.columns: dict[str, list[str]] = {}
+        self.indexes: dict[tuple[str, str], dict] = {}
+        self.events: dict[str, dict[int, list[tuple]]] = {}
+        self.load()
+
+    def load(self) -> None:
+        """Reads every table once and builds the indexes"""
+        for table_name in list(MODEL_KEYS) + EVENT_TABLES:
+            columns = d.fetch_columns(table_name, self.db_path)
+            self.columns[table_name] = columns
+            self.tables[table_name] = (d.fetch_all(
+                table_name, self.db_path) or []) if columns else []
+
+        for table_name, keys in MODEL_KEYS.items():
+            for key in keys:
+                index = {}
+                if key in self.columns[table_name]:
+                    col = self.columns[table_name].index(key)
+                    for row in self.tables[table_name]:
+                        # First row wins, like `select_one()`
+                        index.setdefault(row[col], row)
+                self.indexes[(table_name, key)] = index
+
+        for table_name in EVENT_TABLES:
+            by_game = {}
+            for row in self.tables[table_name]:
+                by_game.setdefault(row[0], []).append(row)
+            self.events[table_name] = by_game
+
+    def rows(self, table_name: str) -> list[tuple]:
+        """Every row of a table, in stored order"""
+        return self.tables.get(table_name, [])
+
+    def row(self, table_name: str, key: str, value) -> tuple | None:
+        """Looks up a row by one of its `MODEL_KEYS` columns (ex. `row("skaters", "name", "Alex Ovechkin")`)
+
+        Returns:
+            tuple|None: the row if found else `None`
+        """
+        return self.indexes.get((table_name, key), {}).get(value)
+
+    def values(self, table_name: str, column: str) -> list:
+        """One column of a table, in stored order (ex. every skater's name)"""
+        if column not in self.columns.get(table_name, []):
+            return []
+        col = self.columns[table_name].index(column)
+        return [row[col] for row in self.tables[table_name]]
+
+    def game_events(self, table_name: str, game_id: int | None) -> list[tuple]:
+        """Rows of an event table in `EVENT_TABLES` for one game"""
+        return self.events.get(table_name, {}).get(game_id, [])
+
+
+# Loaded models keyed by absolute db path
+_models: dict[str, SeasonModel] = {}
+_models_lock = threading.Lock()
+
+
+def get_model(db_path: str) -> SeasonModel:
+    """Returns the model of a season database, loading it on first use
+
+    Args:
+        db_path (str): `[path]/stats_YYYY.db`
+
+    Returns:
+        SeasonModel: the shared model
+    """
+    key = os.path.abspath(db_path)
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            model = _models[key] = SeasonModel(db_path)
+        return model
+
+
+def invalidate(db_path: str | None = None) -> None:
+    """Drops the cached model of a database (or of every database) so the next `get_model()` reloads it
+
+    Args:
+        db_path (str | None, optional): database that was written. Defaults to None (all).
+    """
+    with _models_lock:
+        if db_path is None:
+            _models.clear()
+        else:
+            _models.pop(os.path.abspath(db_path), None)
+
+
+if __name__ == '__main__':
+    model = get_model("data/stats_2425.db")
+    print({table_name: len(rows) for table_name, rows in model.tables.items()})
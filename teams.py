@@ -0,0 +1,20 @@
+"""This module contains the NHL clubs the app knows about"""
+
+# Team name as the API spells it (ex. schedule `home_team`) -> abbreviation
+TEAMS_DICT = {
+    "Anaheim Ducks": "ANA", "Boston Bruins": "BOS", "Buffalo Sabres": "BUF", "Calgary Flames": "CGY", "Carolina Hurricanes": "CAR", "Chicago Blackhawks": "CHI",
+    "Colorado Avalanche": "COL", "Columbus Blue Jackets": "CBJ", "Dallas Stars": "DAL", "Detroit Red Wings": "DET", "Edmonton Oilers": "EDM",
+    "Florida Panthers": "FLA", "Los Angeles Kings": "LAK", "Minnesota Wild": "MIN", "Montreal Canadiens": "MTL", "Montréal Canadiens": "MTL",
+    "Nashville Predators": "NSH", "New Jersey Devils": "NJD", "New York Islanders": "NYI", "New York Rangers": "NYR", "Ottawa Senators": "OTT",
+    "Philadelphia Flyers": "PHI", "Pittsburgh Penguins": "PIT", "San Jose Sharks": "SJS", "Seattle Kraken": "SEA", "St. Louis Blues": "STL",
+    "Tampa Bay Lightning": "TBL", "Toronto Maple Leafs": "TOR", "Utah Hockey Club": "UTA", "Vancouver Canucks": "VAN", "Vegas Golden Knights": "VGK",
+    "Washington Capitals": "WSH", "Winnipeg Jets": "WPG"
+}
+
+# Every club's abbreviation, in the order the league ingestion pulls them
+LEAGUE_TEAMS: list[str] = sorted(set(TEAMS_DICT.values()))
+DEFAULT_TEAM: str = "WSH"
+
+
+if __name__ == '__main__':
+    print(f"{len(LEAGUE_TEAMS)} teams: {", ".join(LEAGUE_TEAMS)}")
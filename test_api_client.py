@@ -0,0 +1,130 @@
+"""Tests for the retries, rate limiting and circuit breaker of `api_client.py`"""
+
+import time
+import pytest
+import requests as r
+import api_client as ac
+
+URL: str = "http://api.test/v1/club-stats/WSH/now"
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, headers: dict[str, str] | None = None) -> None:
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeSession:
+    """Answers each `get()` with the next outcome: a status code, or an exception to raise"""
+
+    def __init__(self, outcomes: list) -> None:
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def get(self, url: str, headers=None, timeout=None) -> FakeResponse:
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(ac, "BACKOFF_BASE", 0.0)
+
+
+def make_client(outcomes: list, max_retries: int = 2, threshold: int = 3, cooldown: float = 60.0) -> tuple[ac.ApiClient, FakeSession]:
+    client = ac.ApiClient(rate_limits={}, max_retries=max_retries)
+    session = FakeSession(outcomes)
+    client.session = lambda: session
+    client.breakers["api.test"] = ac.CircuitBreaker(threshold, cooldown)
+    return client, session
+
+
+def test_retries_until_success():
+    client, session = make_client([503, r.ConnectionError(), 200])
+    assert client.get(URL).status_code == 200
+    assert session.calls == 3
+    assert client.breakers["api.test"].failures == 0
+
+
+def test_gives_up_after_max_retries():
+    client, session = make_client([503])
+    assert client.get(URL).status_code == 503
+    assert session.calls == 3
+
+
+def test_client_errors_are_not_retried():
+    client, session = make_client([404])
+    assert client.get(URL).status_code == 404
+    assert session.calls == 1
+
+
+def test_one_bad_request_does_not_open_the_circuit():
+    client, _ = make_client([503], max_retries=4, threshold=3)
+    client.get(URL)
+    breaker = client.breakers["api.test"]
+    assert breaker.failures == 1
+    assert breaker.opened_at is None
+
+
+def test_circuit_trips_after_threshold_failed_requests():
+    client, session = make_client([503], threshold=3)
+    for _ in range(3):
+        client.get(URL)
+    calls = session.calls
+    with pytest.raises(ac.CircuitOpen):
+        client.get(URL)
+    assert session.calls == calls
+
+
+def test_half_open_trial_failure_reopens_without_retrying():
+    client, session = make_client([503], threshold=1, cooldown=0.0)
+    client.get(URL)
+    calls = session.calls
+    assert client.get(URL).status_code == 503
+    assert session.calls == calls + 1
+    assert client.breakers["api.test"].opened_at is not None
+    assert not client.breakers["api.test"].trial_running
+
+
+def test_half_open_trial_success_closes_the_circuit():
+    client, session = make_client([503, 503, 503, 200], threshold=1, cooldown=0.0)
+    client.get(URL)
+    assert client.get(URL).status_code == 200
+    assert session.calls == 4
+    breaker = client.breakers["api.test"]
+    assert breaker.opened_at is None and breaker.failures == 0
+
+
+def test_unexpected_error_releases_the_trial():
+    client, _ = make_client([503, 503, 503, r.exceptions.ChunkedEncodingError(), 200], threshold=1, cooldown=0.0)
+    client.get(URL)
+    with pytest.raises(r.exceptions.ChunkedEncodingError):
+        client.get(URL)
+    breaker = client.breakers["api.test"]
+    assert not breaker.trial_running
+    # The next cooldown passes and a new trial gets through
+    assert client.get(URL).status_code == 200
+
+
+def test_open_circuit_waits_for_cooldown():
+    breaker = ac.CircuitBreaker(threshold=1, cooldown=60.0)
+    breaker.record_failure()
+    with pytest.raises(ac.CircuitOpen):
+        breaker.check("api.test")
+
+
+def test_retry_after_header_is_honoured():
+    assert ac.backoff_delay(0, FakeResponse(429, {"Retry-After": "3"})) == 3
+    assert ac.backoff_delay(0, FakeResponse(429, {"Retry-After": "3600"})) == ac.BACKOFF_MAX
+
+
+def test_token_bucket_spaces_requests():
+    bucket = ac.TokenBucket(rate=50, burst=2)
+    start = time.monotonic()
+    for _ in range(7):
+        bucket.acquire()
+    # Two tokens are free, the other five wait 1/50 s each
+    assert time.monotonic() - start >= 5 / 50 - 0.01
@@ -0,0 +1,163 @@
+"""Tests for the concurrent fetching, game planning and transaction scope of `api_pull.py`"""
+
+import os
+import random
+import threading
+import time
+import pandas as pd
+import pytest
+import api_pull as a
+import database as d
+import stand_in_server as ss
+
+# Resolved before the tests change into their own folders
+FIXTURE_DIR: str = os.path.abspath(ss.FIXTURE_DIR)
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    yield
+    d.close_connections()
+
+
+def schedule(rows: list[tuple[str, int, str]]) -> pd.DataFrame:
+    return pd.DataFrame([(date, "07:00 PM", "Home", "Away", True, game_id, state) for date, game_id, state in rows],
+                        columns=["date", "time", "home_team", "away_team", "is_home", "game_id", "game_state"])
+
+
+def test_planned_game_ids_match_pending_after_sync(tmp_path):
+    db_path = str(tmp_path / "stats.db")
+    schedule_df = schedule([("2024-10-12", 3, "OFF"), ("2024-10-10", 2, "FINAL"), ("2024-10-08", 1, "OFF"),
+                            ("2024-10-14", 4, "FUT")])
+    # A game loaded before `game_id` existed, still holding its events in the legacy columns
+    d.load_dataframe(pd.DataFrame({"date": ["2024-10-08"], "stars": ["[...]"]}), "games", "replace", db_path)
+
+    pending, legacy = a.planned_game_ids(schedule_df, db_path)
+
+    d.migrate_schema(db_path)
+    d.sync_dataframe(schedule_df, "schedule", ["date"], db_path)
+    d.backfill_game_ids(db_path)
+    assert pending == d.pending_game_ids(db_path) == [2, 3]
+    assert legacy == d.legacy_event_game_ids(db_path) == [1]
+
+
+def test_planned_game_ids_without_games_table(tmp_path):
+    schedule_df = schedule([("2024-10-08", 1, "OFF"), ("2024-10-10", 2, "LIVE")])
+    assert a.planned_game_ids(schedule_df, str(tmp_path / "new.db")) == ([1], [])
+
+
+def test_game_progress_is_reported_once_per_game(monkeypatch):
+    monkeypatch.setattr(a, "get_json", lambda url: {"url": url})
+    reports = []
+    store = a.PayloadStore(progress=lambda stage, done, total: reports.append((stage, done, total)))
+    # One game's landing page is already in the store, so only its other two endpoints are fetched
+    store.get(a.game_urls(1)[0])
+
+    a.fetch_game_payloads(store, [1, 2, 3], legacy_ids=[4, 5])
+
+    games = [report for report in reports if report[0] == "games"]
+    assert games[0] == ("games", 0, 3)
+    assert [done for _, done, _ in games[1:]] == [1, 2, 3]
+    assert {total for _, _, total in games} == {3}
+    assert [report for report in reports if report[0] == "events"][-1] == ("events", 2, 2)
+    assert all(url in store.payloads for game_id in (1, 2, 3) for url in a.game_urls(game_id))
+
+
+@pytest.fixture
+def slow_api(monkeypatch):
+    """Answers each URL with itself after a random delay, recording requests and the most in flight at once"""
+    state = {"requests": [], "in_flight": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def get_json(url):
+        with lock:
+            state["requests"].append(url)
+            state["in_flight"] += 1
+            state["peak"] = max(state["peak"], state["in_flight"])
+        time.sleep(random.uniform(0, 0.01))
+        with lock:
+            state["in_flight"] -= 1
+        return {"url": url}
+
+    monkeypatch.setattr(a, "get_json", get_json)
+    return state
+
+
+def test_get_json_many_keeps_order_and_bounds_workers(slow_api):
+    urls = [a.player_landing_url(player_id) for player_id in range(40)]
+    finished = []
+
+    results = a.get_json_many(urls, max_workers=4, on_result=lambda done, index: finished.append((done, index)))
+
+    assert [result["url"] for result in results] == urls
+    assert 1 < slow_api["peak"] <= 4
+    assert [done for done, _ in finished] == list(range(1, 41))
+    assert sorted(index for _, index in finished) == list(range(40))
+
+
+def test_get_json_many_stops_when_on_result_raises(slow_api):
+    def cancel(done, _):
+        if done == 2:
+            raise a.UpdateCancelled()
+
+    with pytest.raises(a.UpdateCancelled):
+        a.get_json_many([a.player_landing_url(player_id) for player_id in range(200)], max_workers=2,
+                        on_result=cancel)
+    assert len(slow_api["requests"]) < 200
+
+
+def test_payload_store_requests_each_url_once(slow_api):
+    store = a.PayloadStore(max_workers=4)
+    store.get(a.player_landing_url(1))
+    urls = [a.player_landing_url(player_id) for player_id in (1, 2, 2, 3)]
+
+    payloads = store.get_many(urls)
+
+    assert [payload["url"] for payload in payloads] == urls
+    assert sorted(slow_api["requests"]) == sorted(a.player_landing_url(player_id) for player_id in (1, 2, 3))
+
+
+@pytest.fixture
+def api_base(monkeypatch):
+    """Serves the committed fixtures and points `api_pull` at them"""
+    server, base = ss.start_in_background(port=0, fixture_dir=FIXTURE_DIR)
+    original = a.API_BASE
+    a.set_api_base(base)
+    monkeypatch.setattr(a, "USE_HTTP_CACHE", False)
+    yield base
+    a.set_api_base(original)
+    server.shutdown()
+    server.server_close()
+
+
+def table_count(db_path: str, table_name: str) -> int | None:
+    conn = d.get_connection(db_path)
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (table_name,)).fetchone() is None:
+        return None
+    return conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+
+
+def test_bulk_update_loads_every_finished_game(api_base, tmp_path):
+    db_path = str(tmp_path / "stats.db")
+    a.bulk_update(db_path)
+    assert table_count(db_path, "games") == ss.SYNTHETIC_GAMES
+    assert d.pending_game_ids(db_path) == []
+
+    results = a.bulk_update(db_path)
+    assert results["games"]["inserted"] == 0
+    assert table_count(db_path, "games") == ss.SYNTHETIC_GAMES
+
+
+def test_failed_bulk_update_writes_nothing(api_base, tmp_path, monkeypatch):
+    db_path = str(tmp_path / "stats.db")
+
+    def fail(db_path):
+        raise RuntimeError("disk full")
+    # The last write of the run: everything before it must be rolled back
+    monkeypatch.setattr(d, "create_lookup_indexes", fail)
+
+    with pytest.raises(RuntimeError):
+        a.bulk_update(db_path)
+    for table_name in ("skaters", "goalies", "roster", "schedule", "games"):
+        assert table_count(db_path, table_name) is None
@@ -0,0 +1,192 @@
+"""Tests for the connection pool, upserts, DataFrame loading, migrations and transactions in `database.py`"""
+
+import sqlite3 as sq
+import threading
+import pandas as pd
+import pytest
+import database as d
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_dir(tmp_path, monkeypatch):
+    """Runs each test in its own folder (the decorator creates `data/` in the working directory)"""
+    monkeypatch.chdir(tmp_path)
+    yield
+    d.close_connections()
+
+
+def make_marker_db(path: str, marker: str) -> None:
+    d.create_table("marker", ["name TEXT"], path)
+    conn = d.get_connection(path)
+    conn.execute("INSERT INTO marker VALUES (?)", (marker,))
+    conn.commit()
+
+
+def test_threads_each_get_the_database_they_asked_for(tmp_path):
+    paths = {marker: str(tmp_path / f"{marker}.db") for marker in ("a", "b")}
+    for marker, path in paths.items():
+        make_marker_db(path, marker)
+    wrong = []
+
+    def hammer(marker: str) -> None:
+        for _ in range(500):
+            row = d.fetch_one("marker", "1 = 1", paths[marker])
+            if row is None or row[0] != marker:
+                wrong.append(row)
+
+    threads = [threading.Thread(target=hammer, args=(marker,)) for marker in paths for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert wrong == []
+
+
+def test_connections_are_pooled_per_thread(tmp_path):
+    path = str(tmp_path / "pool.db")
+    assert d.get_connection(path) is d.get_connection(path)
+    other = []
+    thread = threading.Thread(target=lambda: other.append(d.get_connection(path)))
+    thread.start()
+    thread.join()
+    assert other[0] is not d.get_connection(path)
+    assert d.get_connection(path).execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def stored_rows(path: str, table_name: str) -> list[tuple]:
+    return sorted(d.get_connection(path).execute(f"SELECT * FROM {table_name}").fetchall())
+
+
+def test_sync_dataframe_writes_only_changes(tmp_path):
+    path = str(tmp_path / "sync.db")
+    first = pd.DataFrame({"player_id": [1, 2, 3], "name": ["A", "B", "C"], "gp": [10, 20, 30]})
+    assert d.sync_dataframe(first, "skaters", ["player_id"], path)["inserted"] == 3
+
+    second = pd.DataFrame({"player_id": [1, 2, 4], "name": ["A", "B2", "D"], "gp": [10, 20, 5]})
+    counts = d.sync_dataframe(second, "skaters", ["player_id"], path)
+    assert counts == {"inserted": 1, "updated": 1, "unchanged": 1, "deleted": 1}
+    assert stored_rows(path, "skaters") == [(1, "A", 10), (2, "B2", 20), (4, "D", 5)]
+
+
+def test_sync_dataframe_keeps_the_last_of_repeated_keys(tmp_path):
+    path = str(tmp_path / "dupes.db")
+    df = pd.DataFrame({"player_id": [1, 1, 2], "name": ["old", "new", "B"]})
+    assert d.sync_dataframe(df, "skaters", ["player_id"], path)["inserted"] == 2
+    assert stored_rows(path, "skaters") == [(1, "new"), (2, "B")]
+
+    counts = d.sync_dataframe(df, "skaters", ["player_id"], path)
+    assert counts == {"inserted": 0, "updated": 0, "unchanged": 2, "deleted": 0}
+    assert stored_rows(path, "skaters") == [(1, "new"), (2, "B")]
+
+
+def test_sync_dataframe_adds_new_columns(tmp_path):
+    path = str(tmp_path / "columns.db")
+    d.sync_dataframe(pd.DataFrame({"player_id": [1], "name": ["A"]}), "roster", ["player_id"], path)
+    counts = d.sync_dataframe(pd.DataFrame({"player_id": [1], "name": ["A"], "team": ["WSH"]}),
+                              "roster", ["player_id"], path)
+    assert counts["updated"] == 1
+    assert stored_rows(path, "roster") == [(1, "A", "WSH")]
+
+
+def test_row_hash_ignores_int_and_float_storage():
+    assert d.row_hash((1, 5, "x")) == d.row_hash((1, 5.0, "x"))
+    assert d.row_hash((1, 5, "x")) != d.row_hash((1, 6, "x"))
+    assert d.row_hash((None, "5")) != d.row_hash((None, 5))
+
+
+def test_load_dataframe_maps_dtypes_and_values(tmp_path):
+    path = str(tmp_path / "load.db")
+    df = pd.DataFrame({"player_id": [1, 2], "sv_pctg": [0.915, float("nan")], "is_home": [True, False],
+                       "date": pd.to_datetime(["2024-10-12", "2024-10-14"]), "stars": [[1, 2], None]})
+
+    assert d.load_dataframe(df, "games", "replace", path) == 2
+
+    conn = d.get_connection(path)
+    types = {row[1]: row[2] for row in conn.execute("PRAGMA table_info(games)")}
+    assert types == {"player_id": "INTEGER", "sv_pctg": "REAL", "is_home": "INTEGER", "date": "TIMESTAMP",
+                     "stars": "TEXT"}
+    assert stored_rows(path, "games") == [(1, 0.915, 1, "2024-10-12 00:00:00", "[1, 2]"),
+                                          (2, None, 0, "2024-10-14 00:00:00", None)]
+
+
+def test_load_dataframe_write_types(tmp_path):
+    path = str(tmp_path / "write_types.db")
+    d.load_dataframe(pd.DataFrame({"player_id": [1, 2]}), "skaters", "replace", path)
+
+    assert d.load_dataframe(pd.DataFrame({"player_id": [3]}), "skaters", "append", path) == 1
+    assert stored_rows(path, "skaters") == [(1,), (2,), (3,)]
+    assert d.load_dataframe(pd.DataFrame({"player_id": [9]}), "skaters", "fail", path) == 0
+    assert d.load_dataframe(pd.DataFrame({"player_id": [4]}), "skaters", "replace", path) == 1
+    assert stored_rows(path, "skaters") == [(4,)]
+
+
+def test_load_dataframe_rolls_back_a_failed_write(tmp_path):
+    path = str(tmp_path / "rollback.db")
+    conn = d.get_connection(path)
+    conn.execute("CREATE TABLE skaters (player_id INTEGER PRIMARY KEY)")
+    conn.execute("INSERT INTO skaters VALUES (1)")
+    conn.commit()
+
+    # Player 2 is inserted before player 1 hits the primary key, and must not be left behind
+    assert d.load_dataframe(pd.DataFrame({"player_id": [2, 1]}), "skaters", "append", path) == 0
+
+    assert stored_rows(path, "skaters") == [(1,)]
+    assert not conn.in_transaction
+
+
+def outside_rows(path: str, table_name: str) -> list[tuple] | None:
+    """Rows another connection sees, or `None` if the table doesn't exist for it"""
+    conn = sq.connect(path)
+    try:
+        return sorted(conn.execute(f"SELECT * FROM {table_name}").fetchall())
+    except sq.OperationalError:
+        return None
+    finally:
+        conn.close()
+
+
+def test_transaction_commits_every_write_at_once(tmp_path):
+    path = str(tmp_path / "season.db")
+    with d.transaction(path):
+        d.load_dataframe(pd.DataFrame({"player_id": [1]}), "skaters", "replace", path)
+        d.sync_dataframe(pd.DataFrame({"player_id": [2]}), "goalies", ["player_id"], path)
+        assert outside_rows(path, "skaters") is None
+    assert outside_rows(path, "skaters") == [(1,)]
+    assert outside_rows(path, "goalies") == [(2,)]
+
+
+def test_transaction_rolls_back_everything_when_the_block_raises(tmp_path):
+    path = str(tmp_path / "season.db")
+    d.load_dataframe(pd.DataFrame({"player_id": [1], "name": ["A"]}), "skaters", "replace", path)
+    with pytest.raises(RuntimeError), d.transaction(path):
+        d.migrate_schema(path)
+        d.sync_dataframe(pd.DataFrame({"player_id": [1], "name": ["B"]}), "skaters", ["player_id"], path)
+        d.load_dataframe(pd.DataFrame({"date": ["2024-10-12"]}), "games", "replace", path)
+        raise RuntimeError("cancelled")
+    assert outside_rows(path, "skaters") == [(1, "A")]
+    assert outside_rows(path, "games") is None
+    assert d.get_connection(path).execute("PRAGMA user_version").fetchone()[0] == 0
+
+
+def test_nested_transactions_join_the_outer_one(tmp_path):
+    path = str(tmp_path / "season.db")
+    with d.transaction(path) as outer:
+        with d.transaction(path) as inner:
+            d.load_dataframe(pd.DataFrame({"player_id": [1]}), "skaters", "replace", path)
+        assert inner is outer and outer.in_transaction
+        assert outside_rows(path, "skaters") is None
+    assert outside_rows(path, "skaters") == [(1,)]
+
+
+def test_migrate_schema_adds_columns_to_existing_tables(tmp_path):
+    path = str(tmp_path / "old.db")
+    d.load_dataframe(pd.DataFrame({"date": ["2024-10-12"], "home_team": ["WSH"]}), "schedule", "replace", path)
+
+    assert d.migrate_schema(path) == d.SCHEMA_VERSION
+    assert d.migrate_schema(path) == d.SCHEMA_VERSION
+
+    conn = d.get_connection(path)
+    assert [row[1] for row in conn.execute("PRAGMA table_info(schedule)")] == \
+        ["date", "home_team", "game_id", "game_state"]
+    # `games` didn't exist yet; it gets `game_id` from its first load
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'games'").fetchone() is None
@@ -0,0 +1,99 @@
+"""Tests for the downloads, links and manifest of `headshots.py`"""
+
+import os
+import pytest
+import requests as r
+import headshots as h
+
+SILHOUETTE: str = "https://assets.nhle.com/mugs/nhl/default-skater.png"
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, content: bytes = b"", etag: str | None = None) -> None:
+        self.status_code = status_code
+        self.content = content
+        self.headers = {"ETag": etag} if etag else {}
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise r.HTTPError(f"{self.status_code}")
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """Serves `url -> bytes`, answering 304 when the request's ETag matches, and records each request"""
+    images: dict[str, bytes] = {}
+    requests: list[tuple[str, dict]] = []
+
+    def get(url: str, headers: dict[str, str] | None = None) -> FakeResponse:
+        requests.append((url, headers or {}))
+        if url not in images:
+            return FakeResponse(404)
+        etag = f'"{hash(images[url])}"'
+        if (headers or {}).get("If-None-Match") == etag:
+            return FakeResponse(304)
+        return FakeResponse(200, images[url], etag)
+
+    monkeypatch.setattr(h.ac, "get", get)
+    return images, requests
+
+
+def test_players_sharing_a_url_download_it_once(server, tmp_path):
+    images, requests = server
+    images[SILHOUETTE] = b"silhouette"
+    images["https://assets.nhle.com/mugs/nhl/8471214.png"] = b"ovi"
+    players = [("Alex Ovechkin", "https://assets.nhle.com/mugs/nhl/8471214.png"),
+               ("Rookie One", SILHOUETTE), ("Rookie Two", SILHOUETTE)]
+
+    counts = h.sync_headshots(players, str(tmp_path))
+
+    assert counts["downloaded"] == 2 and counts["linked"] == 1
+    assert len(requests) == 2
+    assert os.path.samefile(tmp_path / "rookie_one.png", tmp_path / "rookie_two.png")
+
+
+def test_known_url_is_linked_without_a_request(server, tmp_path):
+    images, requests = server
+    images[SILHOUETTE] = b"silhouette"
+    h.sync_headshots([("Rookie One", SILHOUETTE)], str(tmp_path))
+    requests.clear()
+
+    counts = h.sync_headshots([("Rookie One", SILHOUETTE), ("Rookie Two", SILHOUETTE)], str(tmp_path))
+
+    assert requests == []
+    assert counts == {"downloaded": 0, "linked": 1, "unchanged": 0, "skipped": 1, "failed": 0}
+    assert (tmp_path / "rookie_two.png").read_bytes() == b"silhouette"
+    manifest = h.load_manifest(str(tmp_path))["files"]
+    assert manifest["rookie_two.png"] == manifest["rookie_one.png"]
+
+
+def test_revalidate_asks_once_per_url(server, tmp_path):
+    images, requests = server
+    images[SILHOUETTE] = b"silhouette"
+    h.sync_headshots([("Rookie One", SILHOUETTE), ("Rookie Two", SILHOUETTE)], str(tmp_path))
+    requests.clear()
+
+    counts = h.sync_headshots([("Rookie One", SILHOUETTE), ("Rookie Two", SILHOUETTE), ("Rookie Three", SILHOUETTE)],
+                              str(tmp_path), revalidate=True)
+
+    assert len(requests) == 1 and "If-None-Match" in requests[0][1]
+    assert counts["unchanged"] == 2 and counts["linked"] == 1
+
+
+def test_changed_url_is_downloaded(server, tmp_path):
+    images, requests = server
+    images[SILHOUETTE] = b"silhouette"
+    images["https://assets.nhle.com/mugs/nhl/8484000.png"] = b"photo"
+    h.sync_headshots([("Rookie One", SILHOUETTE)], str(tmp_path))
+
+    counts = h.sync_headshots([("Rookie One", "https://assets.nhle.com/mugs/nhl/8484000.png")], str(tmp_path))
+
+    assert counts["downloaded"] == 1
+    assert [url for url, _ in requests] == [SILHOUETTE, "https://assets.nhle.com/mugs/nhl/8484000.png"]
+    assert (tmp_path / "rookie_one.png").read_bytes() == b"photo"
+
+
+def test_failed_url_fails_every_player_sharing_it(server, tmp_path):
+    counts = h.sync_headshots([("Rookie One", SILHOUETTE), ("Rookie Two", SILHOUETTE)], str(tmp_path))
+    assert counts["failed"] == 2
+    assert not (tmp_path / "rookie_one.png").exists()
@@ -0,0 +1,80 @@
+"""Tests for the size accounting, batched access times and revalidation of `http_cache.py`"""
+
+import json
+import pytest
+import http_cache as h
+
+URL: str = "http://api.test/v1/club-stats/WSH/now"
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, payload: dict | None = None) -> None:
+        self.status_code = status_code
+        self.content = json.dumps(payload).encode() if payload is not None else b""
+        self.headers = {"ETag": '"v1"'} if payload is not None else {}
+
+    def raise_for_status(self) -> None:
+        ...
+
+    def json(self) -> dict:
+        return json.loads(self.content)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = h.HttpCache(str(tmp_path / "cache.db"), max_bytes=10_000)
+    yield cache
+    cache.close()
+
+
+def test_running_total_matches_the_stored_sizes(cache):
+    cache.store("a", b"x" * 500, None, None, False)
+    cache.store("b", b"y" * 300, None, None, False)
+    cache.store("a", b"z" * 900, None, None, False)
+    assert cache.total_bytes == cache.stored_bytes()
+
+
+def test_eviction_drops_least_recently_used(cache):
+    for i in range(3):
+        cache.store(f"url{i}", bytes(range(256)) * 16, None, None, False)
+    cache.touch("url0")
+    cache.max_bytes = cache.total_bytes - 1
+    assert cache.evict() == 1
+    assert cache.lookup("url1") is None
+    assert cache.lookup("url0") is not None
+    assert cache.total_bytes == cache.stored_bytes() <= cache.max_bytes
+
+
+def test_touches_are_written_in_batches(cache, monkeypatch):
+    monkeypatch.setattr(h, "TOUCH_BATCH_SIZE", 3)
+    for url in ("a", "b", "c"):
+        cache.store(url, b"{}", None, None, False)
+    stored = dict(cache.conn.execute("SELECT url, last_access FROM responses"))
+
+    cache.touch("a")
+    cache.touch("b")
+    assert dict(cache.conn.execute("SELECT url, last_access FROM responses")) == stored
+    cache.touch("c")
+    assert not cache.pending_touches
+    touched = dict(cache.conn.execute("SELECT url, last_access FROM responses"))
+    assert all(touched[url] >= stored[url] for url in stored)
+
+
+def test_pending_revalidation_is_seen_by_lookup(cache, monkeypatch):
+    cache.store(URL, b"{}", '"v1"', None, False)
+    cache.conn.execute("UPDATE responses SET fetched_at = 0")
+    cache.touch(URL, revalidated=True)
+    assert cache.lookup(URL)[3] > 0
+
+
+def test_not_modified_without_an_entry_is_fetched_in_full(cache, monkeypatch):
+    calls = []
+
+    def get(url, headers=None):
+        calls.append(headers)
+        return FakeResponse(304) if len(calls) == 1 else FakeResponse(200, {"skaters": []})
+    monkeypatch.setattr(h.ac, "get", get)
+
+    assert cache.get_json(URL) == {"skaters": []}
+    assert len(calls) == 2 and calls[1] is None
+    assert cache.lookup(URL) is not None
@@ -0,0 +1,60 @@
+"""Tests for the metrics registry and the `db_call` metric recorded by `database.connect_to_db`"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pytest
+import database as d
+import metrics as mt
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """A fresh shared registry, so tests don't see each other's calls"""
+    fresh = mt.MetricsRegistry()
+    monkeypatch.setattr(mt, "registry", fresh)
+    return fresh
+
+
+def test_collect_leaves_the_shared_totals_alone(registry):
+    mt.record("http_request", {"endpoint": "/a"}, 0.5)
+    with registry.collect() as run:
+        mt.record("http_request", {"endpoint": "/a"}, 0.25, bytes=10)
+    mt.record("http_request", {"endpoint": "/a"}, 1.0)
+
+    shared = registry.snapshot()[("http_request", (("endpoint", "/a"),))]
+    collected = run.snapshot()[("http_request", (("endpoint", "/a"),))]
+    assert (shared.count, shared.seconds) == (3, 1.75)
+    assert (collected.count, collected.seconds, collected.bytes) == (1, 0.25, 10)
+
+
+def test_dump_run_writes_the_given_registry(registry, tmp_path):
+    with registry.collect() as run:
+        mt.record("db_call", {"function": "fetch_all", "table": "skaters"}, 0.1, rows=5)
+    mt.dump_run("test_run", str(tmp_path), source=run)
+    text = (tmp_path / "test_run.prom").read_text()
+    assert 'caps_stats_db_call_rows_total{function="fetch_all",table="skaters"} 5' in text
+
+
+def test_nested_db_calls_are_counted_once(registry, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db_path = str(tmp_path / "stats.db")
+    # The first sync of a table loads it through `load_dataframe()`
+    d.sync_dataframe(pd.DataFrame({"player_id": [1, 2, 3]}), "skaters", ["player_id"], db_path)
+    d.close_connections()
+
+    calls = {labels: metric for (name, labels), metric in registry.snapshot().items() if name == "db_call"}
+    assert list(calls) == [(("function", "sync_dataframe"), ("table", "skaters"))]
+    assert next(iter(calls.values())).rows == 3
+
+
+def test_collect_only_counts_its_own_threads(registry):
+    with registry.collect() as run:
+        other = threading.Thread(target=mt.record, args=("http_request", {"endpoint": "/gui"}, 0.1))
+        other.start()
+        other.join()
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            list(pool.map(mt.carry_context(lambda i: mt.record("http_request", {"endpoint": "/run"}, 0.1)), range(4)))
+
+    assert {labels: metric.count for (_, labels), metric in run.snapshot().items()} == {(("endpoint", "/run"),): 4}
+    assert registry.snapshot()[("http_request", (("endpoint", "/gui"),))].count == 1
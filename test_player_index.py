@@ -0,0 +1,48 @@
+"""Tests for the merging and searching of `player_index.py`"""
+
+import pandas as pd
+import pytest
+import database as d
+import player_index as pi
+import season_catalog as sc
+
+
+@pytest.fixture(autouse=True)
+def close_connections():
+    yield
+    d.close_connections()
+
+
+def write_season(data_dir, season: str, skaters: list[tuple[int | None, str]]) -> None:
+    df = pd.DataFrame(skaters, columns=["player_id", "name"])
+    d.load_dataframe(df, "skaters", "replace", str(data_dir / f"stats_{season}.db"))
+
+
+def test_renamed_player_is_one_entry_under_the_newest_name(tmp_path):
+    write_season(tmp_path, "2324", [(8480000, "Tim Stutzle"), (8471214, "Alex Ovechkin")])
+    write_season(tmp_path, "2425", [(8480000, "Tim Stützle"), (8471214, "Alex Ovechkin")])
+
+    index = pi.PlayerIndex(sc.SeasonCatalog(str(tmp_path)))
+
+    assert len(index) == 2
+    [entry] = index.search("stutzle")
+    assert (entry.name, entry.player_id) == ("Tim Stützle", 8480000)
+    assert entry.seasons == ["2024-2025", "2023-2024"]
+
+
+def test_players_sharing_a_name_stay_apart(tmp_path):
+    write_season(tmp_path, "2425", [(8476880, "Sebastian Aho"), (8480222, "Sebastian Aho")])
+
+    index = pi.PlayerIndex(sc.SeasonCatalog(str(tmp_path)))
+
+    assert sorted(entry.player_id for entry in index.search("aho")) == [8476880, 8480222]
+
+
+def test_rows_without_an_id_merge_by_name(tmp_path):
+    write_season(tmp_path, "2324", [(None, "Nicklas Backstrom")])
+    write_season(tmp_path, "2425", [(None, "Nicklas Backstrom")])
+
+    index = pi.PlayerIndex(sc.SeasonCatalog(str(tmp_path)))
+
+    [entry] = index.search("backstrom")
+    assert entry.player_id is None and entry.seasons == ["2024-2025", "2023-2024"]
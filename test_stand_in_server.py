@@ -0,0 +1,75 @@
+"""Tests for the stand-in NHL API and its committed fixtures"""
+
+import filecmp
+import os
+import pytest
+import api_pull as a
+import database as d
+import stand_in_server as ss
+
+FIXTURE_DIR: str = os.path.abspath(ss.FIXTURE_DIR)
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    yield
+    d.close_connections()
+
+
+@pytest.fixture
+def api_base(monkeypatch):
+    """Serves the committed fixtures and points `api_pull` at them"""
+    server, base = ss.start_in_background(port=0, fixture_dir=FIXTURE_DIR)
+    original = a.API_BASE
+    a.set_api_base(base)
+    monkeypatch.setattr(a, "USE_HTTP_CACHE", False)
+    yield base
+    a.set_api_base(original)
+    server.shutdown()
+    server.server_close()
+
+
+def table_count(db_path: str, table_name: str) -> int | None:
+    conn = d.get_connection(db_path)
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (table_name,)).fetchone() is None:
+        return None
+    return conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+
+
+def test_committed_fixtures_match_the_generator(tmp_path):
+    written = ss.synthesize_fixtures(str(tmp_path))
+    committed = [os.path.join(root, name) for root, _, names in os.walk(FIXTURE_DIR) for name in names]
+    assert written == len(committed)
+    for path in committed:
+        assert filecmp.cmp(path, os.path.join(tmp_path, os.path.relpath(path, FIXTURE_DIR)), shallow=False), path
+
+
+def test_every_endpoint_is_served(api_base):
+    schedule = a.get_json(a.schedule_api)
+    finished = [game for game in schedule["games"] if game["gameState"] == "OFF"]
+    assert len(finished) == ss.SYNTHETIC_GAMES
+    game_id = finished[0]["id"]
+    for url in (f"{a.landing_api_head}{game_id}{a.landing_api_tail}", f"{a.game_story_api_head}{game_id}",
+                f"{a.box_score_api_head}{game_id}{a.box_score_api_tail}"):
+        assert a.get_json(url)["id"] == game_id
+    roster = a.get_json(a.roster_api)
+    assert a.get_json(a.player_landing_url(roster["goalies"][0]["playerId"]))["position"] == "G"
+    assert a.get_json(f"{a.game_api_head}{finished[0]["gameDate"]}")["games"][0]["id"] == game_id
+
+
+def test_benchmark_restores_api_pull_settings(tmp_path):
+    original = a.API_BASE, a.USE_HTTP_CACHE
+    timings = ss.benchmark(str(tmp_path / "missing.db"), runs=1, fixture_dir=FIXTURE_DIR)
+    assert len(timings) == 1
+    assert (a.API_BASE, a.USE_HTTP_CACHE) == original
+
+
+def test_scratch_copy_reloads_the_same_games(api_base, tmp_path):
+    db_path, scratch_db = str(tmp_path / "stats.db"), str(tmp_path / "scratch.db")
+    a.bulk_update(db_path)
+    counts = {table_name: table_count(db_path, table_name) for table_name in ss.BENCHMARK_RESET_TABLES}
+    ss.scratch_copy(db_path, scratch_db)
+    assert all(table_count(scratch_db, table_name) is None for table_name in ss.BENCHMARK_RESET_TABLES)
+    a.bulk_update(scratch_db)
+    assert {table_name: table_count(scratch_db, table_name) for table_name in ss.BENCHMARK_RESET_TABLES} == counts